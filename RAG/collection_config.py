@@ -0,0 +1,471 @@
+"""
+Storage, quantization and HNSW configuration for the KnowMe_chunks collection.
+
+Builds the Qdrant collection parameters from settings (QDRANT_QUANTIZATION,
+QDRANT_VECTORS_ON_DISK, QDRANT_HNSW_* ...), detects drift between settings and an
+existing collection, and provides the migration paths:
+
+    python -m RAG.collection_config status    # settings vs. live collection
+    python -m RAG.collection_config apply     # in-place update (Qdrant re-optimizes in the background)
+    python -m RAG.collection_config migrate   # full rebuild, e.g. to add the bm25 sparse vector
+    python -m RAG.collection_config report    # recall-vs-latency for each storage configuration
+"""
+import json
+import logging
+import os
+import sys
+import time
+from typing import Any, Dict, Iterator, List, Optional
+
+from qdrant_client import QdrantClient
+from qdrant_client.http.models import (
+    BinaryQuantization, BinaryQuantizationConfig, CollectionParamsDiff, CollectionStatus, Disabled,
+    Distance, HnswConfigDiff, Modifier, OptimizersConfigDiff, PointStruct, QuantizationSearchParams,
+    ScalarQuantization, ScalarQuantizationConfig, ScalarType, SearchParams, SparseIndexParams,
+    SparseVector, SparseVectorParams, VectorParams, VectorParamsDiff
+)
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import settings
+from RAG.sparse import SPARSE_VECTOR_NAME, encode_document as encode_sparse_document
+
+logger = logging.getLogger(__name__)
+
+QUANTIZATION_MODES = ("none", "scalar", "binary")
+# Bytes per dimension held in RAM for the searchable (possibly quantized) vectors
+_BYTES_PER_DIM = {"none": 4.0, "scalar": 1.0, "binary": 1 / 8}
+
+
+# =============================================================================
+# Parameter builders
+# =============================================================================
+
+def dense_vector_params(on_disk: Optional[bool] = None) -> VectorParams:
+    return VectorParams(
+        size=settings.EMBEDDING_DIM,
+        distance=Distance.COSINE,
+        on_disk=settings.QDRANT_VECTORS_ON_DISK if on_disk is None else on_disk
+    )
+
+
+def sparse_vectors_config(on_disk: Optional[bool] = None) -> Dict[str, SparseVectorParams]:
+    # BM25 term weights alongside the dense vector; Qdrant applies IDF at query time
+    return {
+        SPARSE_VECTOR_NAME: SparseVectorParams(
+            index=SparseIndexParams(on_disk=settings.QDRANT_VECTORS_ON_DISK if on_disk is None else on_disk),
+            modifier=Modifier.IDF
+        )
+    }
+
+
+def hnsw_config(m: Optional[int] = None, ef_construct: Optional[int] = None) -> HnswConfigDiff:
+    return HnswConfigDiff(
+        m=settings.QDRANT_HNSW_M if m is None else m,
+        ef_construct=settings.QDRANT_HNSW_EF_CONSTRUCT if ef_construct is None else ef_construct,
+        on_disk=settings.QDRANT_HNSW_ON_DISK
+    )
+
+
+def quantization_config(mode: Optional[str] = None):
+    """ScalarQuantization (int8), BinaryQuantization, or None for full-precision vectors."""
+    mode = (mode or settings.QDRANT_QUANTIZATION).lower()
+    if mode not in QUANTIZATION_MODES:
+        raise ValueError(f"QDRANT_QUANTIZATION must be one of {QUANTIZATION_MODES}, got '{mode}'")
+    if mode == "scalar":
+        return ScalarQuantization(scalar=ScalarQuantizationConfig(
+            type=ScalarType.INT8,
+            quantile=settings.QDRANT_SCALAR_QUANTILE,
+            always_ram=settings.QDRANT_QUANTIZATION_ALWAYS_RAM
+        ))
+    if mode == "binary":
+        return BinaryQuantization(binary=BinaryQuantizationConfig(always_ram=settings.QDRANT_QUANTIZATION_ALWAYS_RAM))
+    return None
+
+
+def search_params(
+    hnsw_ef: Optional[int] = None,
+    quantization: Optional[str] = None,
+    exact: bool = False
+) -> Optional[SearchParams]:
+    """
+    Query-time parameters for dense search.
+
+    With quantization enabled, candidates are found on the quantized vectors,
+    oversampled, and rescored against the original vectors when
+    QDRANT_QUANTIZATION_RESCORE is set.
+    """
+    hnsw_ef = settings.QDRANT_SEARCH_EF if hnsw_ef is None else hnsw_ef
+    mode = (quantization or settings.QDRANT_QUANTIZATION).lower()
+    quantization_params = None
+    if mode != "none":
+        quantization_params = QuantizationSearchParams(
+            rescore=settings.QDRANT_QUANTIZATION_RESCORE,
+            oversampling=settings.QDRANT_QUANTIZATION_OVERSAMPLING
+        )
+    if not hnsw_ef and quantization_params is None and not exact:
+        return None
+    return SearchParams(hnsw_ef=hnsw_ef or None, exact=exact, quantization=quantization_params)
+
+
+def create_collection(
+    client: QdrantClient,
+    collection_name: str,
+    quantization: Optional[str] = None,
+    on_disk: Optional[bool] = None,
+    sparse: bool = True,
+    indexing_threshold: Optional[int] = None
+):
+    """Create a collection with the configured storage, quantization and HNSW parameters."""
+    client.create_collection(
+        collection_name=collection_name,
+        vectors_config=dense_vector_params(on_disk),
+        sparse_vectors_config=sparse_vectors_config(on_disk) if sparse else None,
+        hnsw_config=hnsw_config(),
+        quantization_config=quantization_config(quantization),
+        on_disk_payload=settings.QDRANT_PAYLOAD_ON_DISK,
+        optimizers_config=OptimizersConfigDiff(indexing_threshold=indexing_threshold) if indexing_threshold else None
+    )
+    logger.info(
+        f"Created collection {collection_name} (quantization={quantization or settings.QDRANT_QUANTIZATION}, "
+        f"vectors_on_disk={settings.QDRANT_VECTORS_ON_DISK if on_disk is None else on_disk}, "
+        f"hnsw m={settings.QDRANT_HNSW_M} ef_construct={settings.QDRANT_HNSW_EF_CONSTRUCT})"
+    )
+
+
+# =============================================================================
+# Drift detection and in-place update
+# =============================================================================
+
+def _live_quantization_mode(info) -> str:
+    config = info.config.quantization_config
+    if config is None:
+        return "none"
+    if getattr(config, "scalar", None) is not None:
+        return "scalar"
+    if getattr(config, "binary", None) is not None:
+        return "binary"
+    return type(config).__name__.lower()
+
+
+def config_drift(client: QdrantClient, collection_name: str = "KnowMe_chunks") -> Dict[str, Dict[str, Any]]:
+    """Settings that differ from the live collection, as {name: {"live": ..., "configured": ...}}."""
+    info = client.get_collection(collection_name)
+    vectors = info.config.params.vectors
+    dense = vectors.get("") if isinstance(vectors, dict) else vectors
+    live = {
+        "quantization": _live_quantization_mode(info),
+        "vectors_on_disk": bool(dense.on_disk),
+        "payload_on_disk": bool(info.config.params.on_disk_payload),
+        "hnsw_m": info.config.hnsw_config.m,
+        "hnsw_ef_construct": info.config.hnsw_config.ef_construct,
+        "hnsw_on_disk": bool(info.config.hnsw_config.on_disk),
+        "sparse_vector": SPARSE_VECTOR_NAME in (info.config.params.sparse_vectors or {}),
+    }
+    configured = {
+        "quantization": settings.QDRANT_QUANTIZATION.lower(),
+        "vectors_on_disk": settings.QDRANT_VECTORS_ON_DISK,
+        "payload_on_disk": settings.QDRANT_PAYLOAD_ON_DISK,
+        "hnsw_m": settings.QDRANT_HNSW_M,
+        "hnsw_ef_construct": settings.QDRANT_HNSW_EF_CONSTRUCT,
+        "hnsw_on_disk": settings.QDRANT_HNSW_ON_DISK,
+        "sparse_vector": True,
+    }
+    return {
+        name: {"live": live[name], "configured": configured[name]}
+        for name in configured
+        if live[name] != configured[name]
+    }
+
+
+def apply_in_place(client: QdrantClient, collection_name: str = "KnowMe_chunks") -> Dict[str, Dict[str, Any]]:
+    """
+    Push the configured storage, quantization and HNSW parameters to an existing collection.
+
+    Qdrant rebuilds segments in the background; search keeps working meanwhile.
+    A missing sparse vector cannot be added this way (use migrate()).
+
+    Returns:
+        The drift that was applied
+    """
+    drift = config_drift(client, collection_name)
+    if not drift:
+        logger.info(f"Collection {collection_name} already matches settings")
+        return drift
+
+    quantization = quantization_config()
+    client.update_collection(
+        collection_name=collection_name,
+        vectors_config={"": VectorParamsDiff(on_disk=settings.QDRANT_VECTORS_ON_DISK)},
+        hnsw_config=hnsw_config(),
+        quantization_config=quantization if quantization is not None else Disabled.DISABLED,
+        collection_params=CollectionParamsDiff(on_disk_payload=settings.QDRANT_PAYLOAD_ON_DISK)
+    )
+    logger.info(f"Applied collection settings to {collection_name}: {sorted(drift)}")
+    if "sparse_vector" in drift:
+        logger.warning(f"{collection_name} still has no '{SPARSE_VECTOR_NAME}' sparse vector; run migrate to add it")
+    return drift
+
+
+# =============================================================================
+# Full rebuild migration
+# =============================================================================
+
+def _iter_points(client: QdrantClient, collection_name: str, batch_size: int, limit: Optional[int] = None) -> Iterator[List[Any]]:
+    offset = None
+    yielded = 0
+    while True:
+        page_size = batch_size if limit is None else min(batch_size, limit - yielded)
+        if page_size <= 0:
+            return
+        points, offset = client.scroll(
+            collection_name=collection_name,
+            limit=page_size,
+            offset=offset,
+            with_payload=True,
+            with_vectors=True
+        )
+        if points:
+            yield points
+            yielded += len(points)
+        if offset is None:
+            return
+
+
+def _dense_vector(point) -> List[float]:
+    vector = point.vector
+    return vector.get("") if isinstance(vector, dict) else vector
+
+
+def _copy_points(client: QdrantClient, source: str, target: str, batch_size: int, sparse: bool = True) -> int:
+    """Copy points between collections, computing BM25 sparse vectors for points that lack one."""
+    copied = 0
+    for points in _iter_points(client, source, batch_size):
+        batch = []
+        for point in points:
+            vector: Dict[str, Any] = {"": _dense_vector(point)}
+            if sparse:
+                existing = point.vector.get(SPARSE_VECTOR_NAME) if isinstance(point.vector, dict) else None
+                if existing is None:
+                    indices, values = encode_sparse_document(
+                        (point.payload or {}).get("text", ""),
+                        k1=settings.SPARSE_BM25_K1,
+                        b=settings.SPARSE_BM25_B,
+                        avg_doc_tokens=settings.SPARSE_AVG_DOC_TOKENS
+                    )
+                    existing = SparseVector(indices=indices, values=values)
+                vector[SPARSE_VECTOR_NAME] = existing
+            batch.append(PointStruct(id=point.id, vector=vector, payload=point.payload))
+        client.upsert(collection_name=target, points=batch, wait=True)
+        copied += len(batch)
+        logger.info(f"Copied {copied} points from {source} to {target}")
+    return copied
+
+
+def _count(client: QdrantClient, collection_name: str) -> int:
+    return client.count(collection_name=collection_name, exact=True).count
+
+
+def migrate(client: QdrantClient, collection_name: str = "KnowMe_chunks", batch_size: int = 256) -> int:
+    """
+    Rebuild the collection with the configured parameters (and the bm25 sparse vector).
+
+    Points are copied to a staging collection, the original is recreated, and the
+    points are copied back, so point IDs and payloads are preserved. Safe to rerun
+    after an interruption at any step:
+
+    - staging partially filled, original untouched: staging is rebuilt from the original
+    - staging complete, original not yet recreated or partially refilled: the
+      copy-back resumes from staging (upserts are idempotent)
+
+    Staging is only dropped once the rebuilt collection holds at least as many
+    points. Pause ingestion while this runs: writes made during the migration are
+    not carried over.
+
+    Returns:
+        Number of points in the rebuilt collection
+    """
+    from RAG.embedding_and_store import PAYLOAD_INDEX_FIELDS, ensure_payload_indexes
+
+    staging = f"{collection_name}_migration"
+    original_exists = client.collection_exists(collection_name)
+    staging_exists = client.collection_exists(staging)
+
+    if not original_exists and not staging_exists:
+        raise ValueError(f"Neither {collection_name} nor {staging} exists; nothing to migrate")
+
+    if original_exists and staging_exists and config_drift(client, collection_name):
+        # The original is still the old collection, so staging was being filled from it
+        if _count(client, staging) < _count(client, collection_name):
+            logger.info(f"Discarding incomplete {staging}; copying {collection_name} again")
+            client.delete_collection(staging)
+            staging_exists = False
+        else:
+            client.delete_collection(collection_name)
+            original_exists = False
+
+    if not staging_exists:
+        create_collection(client, staging)
+        _copy_points(client, collection_name, staging, batch_size)
+        expected, staged = _count(client, collection_name), _count(client, staging)
+        if staged < expected:
+            raise RuntimeError(f"{staging} has {staged} of {expected} points; {collection_name} left untouched")
+        client.delete_collection(collection_name)
+        original_exists = False
+    else:
+        logger.info(f"Resuming interrupted migration from {staging}")
+
+    if not original_exists:
+        create_collection(client, collection_name)
+    ensure_payload_indexes(client, collection_name, PAYLOAD_INDEX_FIELDS)
+    _copy_points(client, staging, collection_name, batch_size)
+
+    expected, rebuilt = _count(client, staging), _count(client, collection_name)
+    if rebuilt < expected:
+        raise RuntimeError(f"{collection_name} has {rebuilt} of {expected} points; keeping {staging} for a rerun")
+    client.delete_collection(staging)
+    logger.info(f"Migrated {collection_name}: {rebuilt} points")
+    return rebuilt
+
+
+# =============================================================================
+# Recall-vs-latency report
+# =============================================================================
+
+# Storage configurations compared by the report: (name, quantization, vectors on disk)
+REPORT_CONFIGS = (
+    ("float32_ram", "none", False),
+    ("float32_disk", "none", True),
+    ("int8_scalar", "scalar", True),
+    ("binary", "binary", True),
+)
+
+
+def _wait_until_indexed(client: QdrantClient, collection_name: str, timeout: float = 600.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        info = client.get_collection(collection_name)
+        if info.status == CollectionStatus.GREEN and (info.indexed_vectors_count or 0) >= (info.points_count or 0):
+            return
+        time.sleep(0.5)
+    logger.warning(f"{collection_name} not fully indexed after {timeout}s; results may reflect brute-force search")
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def recall_latency_report(
+    client: QdrantClient,
+    collection_name: str = "KnowMe_chunks",
+    sample_size: int = 5000,
+    num_queries: int = 100,
+    top_k: int = 10,
+    ef_values: tuple = (32, 64, 128, 256)
+) -> List[Dict[str, Any]]:
+    """
+    Measure recall@k and search latency for each storage configuration.
+
+    A sample of points is loaded into one temporary collection per configuration in
+    REPORT_CONFIGS; held-out points serve as queries. Ground truth is exact
+    (brute-force) float32 search. Temporary collections are always removed.
+
+    Returns:
+        One row per (configuration, hnsw_ef) with recall, p50/p95 latency in ms
+        and the estimated RAM for the searchable vectors
+    """
+    points = [p for batch in _iter_points(client, collection_name, 256, limit=sample_size + num_queries) for p in batch]
+    if len(points) <= num_queries:
+        raise ValueError(f"{collection_name} has {len(points)} points; need more than {num_queries} for a report")
+    queries = [_dense_vector(p) for p in points[:num_queries]]
+    corpus = [PointStruct(id=p.id, vector={"": _dense_vector(p)}, payload={}) for p in points[num_queries:]]
+
+    rows = []
+    truth: List[set] = []
+    for name, quantization, on_disk in REPORT_CONFIGS:
+        bench = f"{collection_name}_bench_{name}"
+        if client.collection_exists(bench):
+            client.delete_collection(bench)
+        try:
+            # Tiny indexing threshold so the HNSW graph is built even for small samples
+            create_collection(client, bench, quantization=quantization, on_disk=on_disk, sparse=False, indexing_threshold=1)
+            for start in range(0, len(corpus), 256):
+                client.upsert(collection_name=bench, points=corpus[start:start + 256], wait=True)
+            _wait_until_indexed(client, bench)
+
+            if not truth:
+                truth = [
+                    {hit.id for hit in client.query_points(
+                        collection_name=bench, query=q, limit=top_k, search_params=SearchParams(exact=True)
+                    ).points}
+                    for q in queries
+                ]
+
+            for ef in ef_values:
+                params = search_params(hnsw_ef=ef, quantization=quantization)
+                latencies, recalls = [], []
+                for q, expected in zip(queries, truth):
+                    start = time.perf_counter()
+                    hits = client.query_points(collection_name=bench, query=q, limit=top_k, search_params=params).points
+                    latencies.append((time.perf_counter() - start) * 1000)
+                    recalls.append(len({hit.id for hit in hits} & expected) / max(len(expected), 1))
+                rows.append({
+                    "config": name,
+                    "quantization": quantization,
+                    "vectors_on_disk": on_disk,
+                    "hnsw_ef": ef,
+                    "recall_at_k": round(sum(recalls) / len(recalls), 4),
+                    "p50_ms": round(_percentile(latencies, 50), 2),
+                    "p95_ms": round(_percentile(latencies, 95), 2),
+                    # Originals on disk leave only the quantized copy (if any) in RAM
+                    "est_vector_ram_mb": round(
+                        len(corpus) * settings.EMBEDDING_DIM
+                        * (_BYTES_PER_DIM[quantization] if quantization != "none" or not on_disk else 0) / 1e6, 2
+                    ),
+                })
+                logger.info(f"Report {name} ef={ef}: {rows[-1]}")
+        finally:
+            client.delete_collection(bench)
+
+    return rows
+
+
+if __name__ == "__main__":
+    import argparse
+
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Manage KnowMe_chunks storage, quantization and HNSW settings")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("status", help="Show settings that differ from the live collection")
+    sub.add_parser("apply", help="Update the live collection in place")
+    migrate_cmd = sub.add_parser("migrate", help="Rebuild the collection (adds the bm25 sparse vector)")
+    migrate_cmd.add_argument("--batch-size", type=int, default=256)
+    report_cmd = sub.add_parser("report", help="Recall-vs-latency report for each storage configuration")
+    report_cmd.add_argument("--sample-size", type=int, default=5000)
+    report_cmd.add_argument("--queries", type=int, default=100)
+    report_cmd.add_argument("--top-k", type=int, default=10)
+    report_cmd.add_argument("--ef", default="32,64,128,256", help="Comma-separated hnsw_ef values")
+    args = parser.parse_args()
+
+    qdrant = QdrantClient(
+        host=settings.QDRANT_HOST,
+        port=settings.QDRANT_PORT,
+        grpc_port=settings.QDRANT_GRPC_PORT,
+        prefer_grpc=settings.QDRANT_PREFER_GRPC,
+        timeout=300
+    )
+    if args.command == "status":
+        print(json.dumps(config_drift(qdrant), indent=2) or "{}")
+    elif args.command == "apply":
+        print(json.dumps(apply_in_place(qdrant), indent=2))
+    elif args.command == "migrate":
+        print(f"Migrated {migrate(qdrant, batch_size=args.batch_size)} points")
+    else:
+        rows = recall_latency_report(
+            qdrant,
+            sample_size=args.sample_size,
+            num_queries=args.queries,
+            top_k=args.top_k,
+            ef_values=tuple(int(ef) for ef in args.ef.split(","))
+        )
+        print(json.dumps(rows, indent=2))
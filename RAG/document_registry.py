@@ -0,0 +1,277 @@
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+from contextlib import closing
+from typing import Dict, Any, List, Optional, Tuple
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# Columns added after the first schema version; created on open if missing
+CATALOG_COLUMNS = {
+    "page_count": "INTEGER NOT NULL DEFAULT 0",
+    "chunk_count": "INTEGER NOT NULL DEFAULT 0",
+    "size_bytes": "INTEGER NOT NULL DEFAULT 0",
+}
+
+
+class DocumentRegistry:
+    """
+    SQLite-backed per-user catalog of fully ingested documents, keyed by (user_id, source).
+
+    Each row stores the SHA-256 fingerprint of the uploaded bytes (so identical
+    re-uploads can be skipped before parsing) plus page count, chunk count, size
+    and ingest time, so documents can be listed without touching vector payloads.
+    Rows are only written after a successful ingestion and removed on delete.
+
+    It also holds each user's index generation (see src.cache.IndexGenerations),
+    so every process sharing the file sees the same counter, and the leased
+    claims that let only one job at a time ingest a given (user_id, doc_hash).
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS documents (
+                    user_id TEXT NOT NULL,
+                    source TEXT NOT NULL,
+                    doc_hash TEXT NOT NULL,
+                    ingested_at REAL NOT NULL,
+                    PRIMARY KEY (user_id, source)
+                )
+                """
+            )
+            existing = {row["name"] for row in conn.execute("PRAGMA table_info(documents)")}
+            for column, definition in CATALOG_COLUMNS.items():
+                if column not in existing:
+                    conn.execute(f"ALTER TABLE documents ADD COLUMN {column} {definition}")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_documents_hash ON documents (user_id, doc_hash)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_documents_ingested ON documents (user_id, ingested_at)")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS ingest_claims (
+                    user_id TEXT NOT NULL,
+                    doc_hash TEXT NOT NULL,
+                    source TEXT NOT NULL,
+                    owner TEXT NOT NULL,
+                    expires_at REAL NOT NULL,
+                    PRIMARY KEY (user_id, doc_hash)
+                )
+                """
+            )
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS generations (
+                    user_id TEXT PRIMARY KEY,
+                    generation INTEGER NOT NULL
+                )
+                """
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        # One short-lived connection per call keeps this safe across worker threads
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def find_by_hash(self, user_id: str, doc_hash: str) -> Optional[Dict[str, Any]]:
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT * FROM documents WHERE user_id = ? AND doc_hash = ? LIMIT 1",
+                (user_id, doc_hash)
+            ).fetchone()
+        return dict(row) if row else None
+
+    def get(self, user_id: str, source: str) -> Optional[Dict[str, Any]]:
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT * FROM documents WHERE user_id = ? AND source = ?",
+                (user_id, source)
+            ).fetchone()
+        return dict(row) if row else None
+
+    def list(self, user_id: str, limit: int = 50, offset: int = 0) -> List[Dict[str, Any]]:
+        """A page of the user's documents, most recently ingested first."""
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                "SELECT * FROM documents WHERE user_id = ? ORDER BY ingested_at DESC, source LIMIT ? OFFSET ?",
+                (user_id, limit, offset)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def count(self, user_id: str) -> int:
+        with closing(self._connect()) as conn:
+            return conn.execute("SELECT COUNT(*) FROM documents WHERE user_id = ?", (user_id,)).fetchone()[0]
+
+    def record(
+        self,
+        user_id: str,
+        source: str,
+        doc_hash: str,
+        page_count: int = 0,
+        chunk_count: int = 0,
+        size_bytes: int = 0,
+        ingested_at: Optional[float] = None
+    ):
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                """
+                INSERT OR REPLACE INTO documents
+                    (user_id, source, doc_hash, ingested_at, page_count, chunk_count, size_bytes)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                (user_id, source, doc_hash, ingested_at or time.time(), page_count, chunk_count, size_bytes)
+            )
+        logger.info(f"Registered document '{source}' ({doc_hash[:12]}) for user {user_id}")
+
+    def delete(self, user_id: str, source: str) -> bool:
+        with closing(self._connect()) as conn, conn:
+            cursor = conn.execute(
+                "DELETE FROM documents WHERE user_id = ? AND source = ?",
+                (user_id, source)
+            )
+        return cursor.rowcount > 0
+
+    def claim(
+        self,
+        user_id: str,
+        doc_hash: str,
+        source: str,
+        owner: str,
+        lease_seconds: float
+    ) -> Tuple[Optional[Dict[str, Any]], bool]:
+        """
+        Atomically check for an ingested copy of the document and claim it for ingestion.
+
+        Returns (catalog row, False) if the user already has the document, (None, True)
+        if `owner` now holds the claim, and (None, False) while another job holds an
+        unexpired claim on the same bytes.
+        """
+        now = time.time()
+        with closing(self._connect()) as conn:
+            # IMMEDIATE takes the write lock up front, so the check and the claim cannot interleave
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(
+                    "SELECT * FROM documents WHERE user_id = ? AND doc_hash = ? LIMIT 1",
+                    (user_id, doc_hash)
+                ).fetchone()
+                claimed = False
+                if row is None:
+                    conn.execute(
+                        "DELETE FROM ingest_claims WHERE user_id = ? AND doc_hash = ? AND expires_at < ?",
+                        (user_id, doc_hash, now)
+                    )
+                    cursor = conn.execute(
+                        "INSERT OR IGNORE INTO ingest_claims (user_id, doc_hash, source, owner, expires_at) "
+                        "VALUES (?, ?, ?, ?, ?)",
+                        (user_id, doc_hash, source, owner, now + lease_seconds)
+                    )
+                    claimed = cursor.rowcount == 1
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+        return (dict(row) if row else None), claimed
+
+    def renew_claim(self, user_id: str, doc_hash: str, owner: str, lease_seconds: float):
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "UPDATE ingest_claims SET expires_at = ? WHERE user_id = ? AND doc_hash = ? AND owner = ?",
+                (time.time() + lease_seconds, user_id, doc_hash, owner)
+            )
+
+    def release_claim(self, user_id: str, doc_hash: str, owner: str):
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "DELETE FROM ingest_claims WHERE user_id = ? AND doc_hash = ? AND owner = ?",
+                (user_id, doc_hash, owner)
+            )
+
+    def get_generation(self, user_id: str) -> int:
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT generation FROM generations WHERE user_id = ?", (user_id,)).fetchone()
+        return row[0] if row else 0
+
+    def bump_generation(self, user_id: str) -> int:
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                """
+                INSERT INTO generations (user_id, generation) VALUES (?, 1)
+                ON CONFLICT (user_id) DO UPDATE SET generation = generation + 1
+                """,
+                (user_id,)
+            )
+            return conn.execute("SELECT generation FROM generations WHERE user_id = ?", (user_id,)).fetchone()[0]
+
+
+def backfill_from_qdrant(registry: "DocumentRegistry", batch_size: int = 1000) -> int:
+    """
+    One-off migration: add catalog rows for documents ingested before the catalog existed.
+
+    Scrolls the collection once, reading only the small payload fields, and records
+    (user_id, source) pairs that have no catalog row yet. Returns the number added.
+    """
+    from RAG.embedding_and_store import get_vector_store
+
+    store = get_vector_store()
+    found: Dict[tuple, Dict[str, Any]] = {}
+    offset = None
+    while True:
+        points, offset = store.scroll(
+            limit=batch_size,
+            offset=offset,
+            with_payload=["user_id", "source", "doc_hash", "page"]
+        )
+        for point in points:
+            payload = point.payload or {}
+            key = (payload.get("user_id", "anonymous"), payload.get("source", "unknown"))
+            entry = found.setdefault(key, {"doc_hash": payload.get("doc_hash") or "", "chunks": 0, "max_page": 0})
+            entry["chunks"] += 1
+            entry["max_page"] = max(entry["max_page"], int(payload.get("page") or 0))
+        if offset is None:
+            break
+
+    added = 0
+    for (user_id, source), entry in found.items():
+        if registry.get(user_id, source) is None:
+            registry.record(
+                user_id, source, entry["doc_hash"],
+                page_count=entry["max_page"], chunk_count=entry["chunks"]
+            )
+            added += 1
+    return added
+
+
+_document_registry: Optional[DocumentRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_document_registry() -> DocumentRegistry:
+    """Return the shared DocumentRegistry, creating its SQLite file on first use."""
+    global _document_registry
+    if _document_registry is None:
+        with _registry_lock:
+            if _document_registry is None:
+                _document_registry = DocumentRegistry(settings.DOCUMENT_REGISTRY_PATH)
+    return _document_registry
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Document catalog maintenance")
+    parser.add_argument("command", choices=["backfill"], help="backfill: catalog documents already in Qdrant")
+    args = parser.parse_args()
+
+    print(f"Added {backfill_from_qdrant(get_document_registry())} documents to the catalog")
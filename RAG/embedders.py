@@ -0,0 +1,216 @@
+"""
+Pluggable text embedders.
+
+Both backends produce the same e5 mean-pooled, L2-normalized vectors:
+- SentenceTransformerEmbedder: full-precision PyTorch reference model.
+- OnnxEmbedder: ONNX Runtime session over an exported (optionally int8
+  dynamically quantized) copy of the same model, for CPU-only nodes.
+
+Use `python -m RAG.embedders export` to produce the quantized model and
+`python -m RAG.embedders parity` to measure cosine drift against the reference.
+"""
+import logging
+import os
+import sys
+from typing import Dict, List, Optional, Sequence, Union
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class Embedder:
+    """Common interface: encode a string (1-D result) or a list of strings (2-D result)."""
+
+    name: str
+    dim: int
+    batch_size: int = 32
+
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        raise NotImplementedError
+
+    def encode(self, texts: Union[str, Sequence[str]], batch_size: Optional[int] = None) -> np.ndarray:
+        single = isinstance(texts, str)
+        items = [texts] if single else list(texts)
+        if not items:
+            return np.zeros((0, self.dim), dtype=np.float32)
+
+        batch_size = batch_size or self.batch_size
+        vectors = np.vstack([
+            self._encode_batch(items[i:i + batch_size])
+            for i in range(0, len(items), batch_size)
+        ])
+        return vectors[0] if single else vectors
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dim
+
+
+class SentenceTransformerEmbedder(Embedder):
+    def __init__(self, model_name: str, batch_size: int = 32, threads: int = 0):
+        from sentence_transformers import SentenceTransformer
+
+        if threads > 0:
+            import torch
+            torch.set_num_threads(threads)
+
+        self.model = SentenceTransformer(model_name)
+        self.name = model_name
+        self.dim = self.model.get_sentence_embedding_dimension()
+        self.batch_size = batch_size
+
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        return self.model.encode(texts, batch_size=len(texts), normalize_embeddings=True)
+
+
+class OnnxEmbedder(Embedder):
+    def __init__(self, model_name: str, onnx_path: str, batch_size: int = 32, threads: int = 0, max_length: int = 512):
+        try:
+            import onnxruntime as ort
+            from transformers import AutoTokenizer
+        except ImportError as e:
+            raise ImportError(
+                "EMBEDDING_BACKEND=onnx requires 'onnxruntime' and 'transformers' (pip install onnxruntime)"
+            ) from e
+
+        if not os.path.exists(onnx_path):
+            raise FileNotFoundError(
+                f"ONNX model not found at {onnx_path}. Export it with: python -m RAG.embedders export"
+            )
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads > 0:
+            options.intra_op_num_threads = threads
+            options.inter_op_num_threads = 1
+
+        self.session = ort.InferenceSession(onnx_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+        # Prefer the tokenizer saved next to the exported model
+        tokenizer_dir = os.path.dirname(onnx_path)
+        if not os.path.exists(os.path.join(tokenizer_dir, "tokenizer_config.json")):
+            tokenizer_dir = model_name
+        self.tokenizer = AutoTokenizer.from_pretrained(tokenizer_dir)
+
+        self.name = f"{model_name}@onnx:{os.path.splitext(os.path.basename(onnx_path))[0]}"
+        self.batch_size = batch_size
+        self.max_length = max_length
+        self.dim = self._encode_batch(["dimension probe"]).shape[1]
+
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        tokens = self.tokenizer(
+            texts, padding=True, truncation=True, max_length=self.max_length, return_tensors="np"
+        )
+        inputs = {k: v.astype(np.int64) for k, v in tokens.items() if k in self.input_names}
+        hidden = self.session.run(None, inputs)[0]
+
+        # Mean pooling over real tokens, then L2 normalization (matches the e5 pipeline)
+        mask = tokens["attention_mask"][..., None].astype(np.float32)
+        pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        norms = np.linalg.norm(pooled, axis=1, keepdims=True)
+        return (pooled / np.clip(norms, 1e-12, None)).astype(np.float32)
+
+
+def create_embedder() -> Embedder:
+    """Build the embedder selected by settings.EMBEDDING_BACKEND."""
+    backend = settings.EMBEDDING_BACKEND.lower()
+    if backend == "onnx":
+        embedder = OnnxEmbedder(
+            settings.EMBEDDING_MODEL,
+            settings.EMBEDDING_ONNX_PATH,
+            batch_size=settings.EMBED_BATCH_SIZE,
+            threads=settings.EMBEDDING_THREADS
+        )
+    elif backend in ("sentence-transformers", "sentence_transformers", "torch"):
+        embedder = SentenceTransformerEmbedder(
+            settings.EMBEDDING_MODEL,
+            batch_size=settings.EMBED_BATCH_SIZE,
+            threads=settings.EMBEDDING_THREADS
+        )
+    else:
+        raise ValueError(f"Unknown EMBEDDING_BACKEND: {settings.EMBEDDING_BACKEND}")
+
+    logger.info(f"Loaded embedder '{embedder.name}' ({embedder.dim} dims)")
+    return embedder
+
+
+def export_quantized_onnx(model_name: str, output_dir: str, quantize: bool = True) -> str:
+    """
+    Export `model_name` to ONNX (plus tokenizer) in `output_dir`, optionally with
+    int8 dynamic quantization. Requires `optimum[onnxruntime]`.
+
+    Returns:
+        Path of the ONNX file to use as EMBEDDING_ONNX_PATH.
+    """
+    from optimum.onnxruntime import ORTModelForFeatureExtraction, ORTQuantizer
+    from optimum.onnxruntime.configuration import AutoQuantizationConfig
+    from transformers import AutoTokenizer
+
+    model = ORTModelForFeatureExtraction.from_pretrained(model_name, export=True)
+    model.save_pretrained(output_dir)
+    AutoTokenizer.from_pretrained(model_name).save_pretrained(output_dir)
+    if not quantize:
+        return os.path.join(output_dir, "model.onnx")
+
+    quantizer = ORTQuantizer.from_pretrained(output_dir)
+    qconfig = AutoQuantizationConfig.avx2(is_static=False, per_channel=False)
+    quantizer.quantize(save_dir=output_dir, quantization_config=qconfig)
+    return os.path.join(output_dir, "model_quantized.onnx")
+
+
+def parity_check(candidate: Embedder, reference: Embedder, texts: Sequence[str]) -> Dict[str, float]:
+    """
+    Compare two embedders on the same texts.
+
+    Returns:
+        Mean/min cosine similarity between paired vectors and the max drift (1 - cosine).
+    """
+    a = candidate.encode(list(texts))
+    b = reference.encode(list(texts))
+    a = a / np.linalg.norm(a, axis=1, keepdims=True)
+    b = b / np.linalg.norm(b, axis=1, keepdims=True)
+    cosines = (a * b).sum(axis=1)
+    return {
+        "texts": len(texts),
+        "mean_cosine": float(cosines.mean()),
+        "min_cosine": float(cosines.min()),
+        "max_drift": float(1.0 - cosines.min())
+    }
+
+
+PARITY_SAMPLE_TEXTS = [
+    "passage: Invoice INV-2024-0042 is due on 15 March and totals $12,400.",
+    "passage: The employee is entitled to 24 days of paid annual leave per year.",
+    "passage: Experience: Senior backend engineer, 2019-2024, Python and FastAPI.",
+    "query: what is my notice period",
+    "query: summarize my resume",
+    "passage: | Item | Qty | Price |\n|-|-|-|\n| Widget | 4 | 9.99 |",
+]
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Export or validate the ONNX embedding backend")
+    sub = parser.add_subparsers(dest="command", required=True)
+    export_cmd = sub.add_parser("export", help="Export the model to ONNX (int8 quantized by default)")
+    export_cmd.add_argument("--output-dir", default=os.path.dirname(settings.EMBEDDING_ONNX_PATH))
+    export_cmd.add_argument("--no-quantize", action="store_true")
+    parity_cmd = sub.add_parser("parity", help="Report cosine drift of the ONNX model against SentenceTransformer")
+    parity_cmd.add_argument("--onnx-path", default=settings.EMBEDDING_ONNX_PATH)
+    args = parser.parse_args()
+
+    if args.command == "export":
+        path = export_quantized_onnx(settings.EMBEDDING_MODEL, args.output_dir, quantize=not args.no_quantize)
+        print(f"Exported ONNX model to {path}")
+    else:
+        report = parity_check(
+            OnnxEmbedder(settings.EMBEDDING_MODEL, args.onnx_path, threads=settings.EMBEDDING_THREADS),
+            SentenceTransformerEmbedder(settings.EMBEDDING_MODEL, threads=settings.EMBEDDING_THREADS),
+            PARITY_SAMPLE_TEXTS
+        )
+        print(report)
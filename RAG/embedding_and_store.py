@@ -1,13 +1,13 @@
 import logging
 import os
+import threading
 import uuid
-from typing import List
-from qdrant_client import QdrantClient
-from qdrant_client.http.models import Distance, VectorParams, PointStruct, Filter, FieldCondition, MatchValue
-from sentence_transformers import SentenceTransformer
+from hashlib import md5, sha256
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+from qdrant_client import AsyncQdrantClient, QdrantClient
+from qdrant_client.http.models import PayloadSchemaType
 
 # === Configure logging ===
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # === Initialize Qdrant client and models ===
@@ -15,54 +15,366 @@ import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from config import settings
+from src.utils import normalize_content, source_name
+from RAG.embedding_cache import EmbeddingCache
+from RAG.embedders import Embedder, create_embedder
+from RAG.sparse import SPARSE_VECTOR_NAME, encode_document as encode_sparse_document
+from RAG.collection_config import config_drift, create_collection
+from RAG.vector_store import EmbeddedVectorStore, QdrantVectorStore, VectorPoint, VectorStore
+from src.logging_setup import chunk_log_sampler
+from src.metrics import EMBED_BATCH_SECONDS, EMBEDDED_VECTORS, EMBEDDING_CACHE_LOOKUPS
 
-client = QdrantClient(host=settings.QDRANT_HOST, port=settings.QDRANT_PORT)
-embed_model = SentenceTransformer("intfloat/e5-base-v2")
+EMBEDDING_CACHE_HITS = EMBEDDING_CACHE_LOOKUPS.labels("hit")
+EMBEDDING_CACHE_MISSES = EMBEDDING_CACHE_LOOKUPS.labels("miss")
 
-# === Recreate collection if not exists ===
-if not client.collection_exists("KnowMe_chunks"):
-    client.create_collection(
-        collection_name="KnowMe_chunks",
-        vectors_config=VectorParams(size=768, distance=Distance.COSINE)
-    )
+# Resources are created on first use (or by the app lifespan hook), so importing
+# this module never connects to Qdrant or loads the model.
+_client: Optional[QdrantClient] = None
+_async_client: Optional[AsyncQdrantClient] = None
+_embed_model: Optional[Embedder] = None
+_embedding_cache: Optional[EmbeddingCache] = None
+_vector_store: Optional[VectorStore] = None
+_client_lock = threading.Lock()
+_model_lock = threading.Lock()
 
-# === Core Function to Embed and Store PDF Data ===
-def embed_and_store_pdf(chunks: List[dict], user_id: str = "anonymous") -> List[PointStruct]:
+# === Keyword payload indexes for tenant and document filters ===
+PAYLOAD_INDEX_FIELDS = ("user_id", "source", "type", "doc_hash")
+
+
+def ensure_collection(client: QdrantClient):
+    """Create the collection and its payload indexes if they do not exist yet."""
+    if not client.collection_exists("KnowMe_chunks"):
+        # Storage, quantization and HNSW parameters come from settings (see RAG.collection_config)
+        create_collection(client, "KnowMe_chunks")
+    else:
+        drift = config_drift(client, "KnowMe_chunks")
+        if drift:
+            logger.warning(
+                f"Collection KnowMe_chunks differs from settings: {drift}. "
+                "Run `python -m RAG.collection_config apply` (or `migrate`) to update it"
+            )
+
+    sparse_vectors = client.get_collection("KnowMe_chunks").config.params.sparse_vectors or {}
+    if SPARSE_VECTOR_NAME not in sparse_vectors:
+        logger.warning(
+            f"Collection KnowMe_chunks has no '{SPARSE_VECTOR_NAME}' sparse vector; "
+            "hybrid retrieval is disabled until the collection is migrated"
+        )
+
+    ensure_payload_indexes(client, "KnowMe_chunks", PAYLOAD_INDEX_FIELDS)
+
+
+def ensure_payload_indexes(client: QdrantClient, collection_name: str, field_names: Iterable[str]):
+    """Create any missing keyword payload indexes."""
+    existing_indexes = client.get_collection(collection_name).payload_schema or {}
+    for field_name in field_names:
+        if field_name not in existing_indexes:
+            client.create_payload_index(
+                collection_name=collection_name,
+                field_name=field_name,
+                field_schema=PayloadSchemaType.KEYWORD
+            )
+            logger.info(f"Created keyword payload index on '{field_name}'")
+
+
+def get_qdrant_client() -> QdrantClient:
     """
-    embeds and stores the given PDF into Qdrant.
-    
-    Args:
-        chunks (List[dict]): List of text chunks to embed and store.
-        user_id (str): User identifier for data isolation.
+    Return the shared sync Qdrant client, connecting and bootstrapping the
+    collection on first call. Used by ingestion, which runs in worker threads.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                client = QdrantClient(**_client_kwargs())
+                ensure_collection(client)
+                _client = client
+    return _client
 
-    Returns:
-        List[PointStruct]: Points that were embedded and stored.
+
+def _client_kwargs() -> Dict:
+    return {
+        "host": settings.QDRANT_HOST,
+        "port": settings.QDRANT_PORT,
+        "grpc_port": settings.QDRANT_GRPC_PORT,
+        "prefer_grpc": settings.QDRANT_PREFER_GRPC
+    }
+
+
+def get_async_qdrant_client() -> AsyncQdrantClient:
     """
+    Return the app-wide AsyncQdrantClient used by routes and rag_search.
+
+    It reuses its connections across requests and never blocks the event loop.
+    Collection bootstrap stays on the sync client (see get_qdrant_client).
+    """
+    global _async_client
+    if _async_client is None:
+        _async_client = AsyncQdrantClient(**_client_kwargs())
+    return _async_client
+
+
+async def close_async_qdrant_client():
+    global _async_client
+    if _async_client is not None:
+        await _async_client.close()
+        _async_client = None
+
+
+def get_vector_store() -> VectorStore:
+    """
+    Return the configured chunk store: the Qdrant collection (default) or, with
+    VECTOR_STORE_BACKEND=embedded, the in-process store under EMBEDDED_STORE_DIR.
+    """
+    global _vector_store
+    if _vector_store is None:
+        with _client_lock:
+            if _vector_store is None:
+                if settings.VECTOR_STORE_BACKEND == "embedded":
+                    _vector_store = EmbeddedVectorStore(
+                        settings.EMBEDDED_STORE_DIR,
+                        dim=settings.EMBEDDING_DIM,
+                        resident=settings.EMBEDDED_STORE_RESIDENT
+                    )
+                elif settings.VECTOR_STORE_BACKEND == "qdrant":
+                    _vector_store = QdrantVectorStore(get_qdrant_client, get_async_qdrant_client)
+                else:
+                    raise ValueError(f"Unknown VECTOR_STORE_BACKEND: '{settings.VECTOR_STORE_BACKEND}'")
+    return _vector_store
+
+
+async def close_vector_store():
+    global _vector_store
+    if _vector_store is not None:
+        await _vector_store.aclose()
+        _vector_store = None
+    await close_async_qdrant_client()
+
+
+def get_embed_model() -> Embedder:
+    """Return the shared embedder, loading it (and the embedding cache) on first call."""
+    global _embed_model, _embedding_cache
+    if _embed_model is None:
+        with _model_lock:
+            if _embed_model is None:
+                model = create_embedder()
+                if model.dim != settings.EMBEDDING_DIM:
+                    logger.warning(
+                        f"Embedder '{model.name}' produces {model.dim} dims but EMBEDDING_DIM is {settings.EMBEDDING_DIM}"
+                    )
+                # === Persistent embedding cache keyed by normalized chunk hash ===
+                if settings.EMBEDDING_CACHE_ENABLED:
+                    _embedding_cache = EmbeddingCache(
+                        directory=settings.EMBEDDING_CACHE_DIR,
+                        model_name=model.name,
+                        dim=model.dim,
+                        capacity=settings.EMBEDDING_CACHE_CAPACITY,
+                        dtype=settings.EMBEDDING_CACHE_DTYPE
+                    )
+                _embed_model = model
+    return _embed_model
+
+
+def get_embedding_cache() -> Optional[EmbeddingCache]:
+    get_embed_model()
+    return _embedding_cache
+
+
+# === Deterministic Point IDs ===
+# Fixed namespace so the same (user, document, chunk) always maps to the same point
+POINT_ID_NAMESPACE = uuid.UUID("5f0c6a0e-8d3b-4f6a-9a57-3c1d2b7e9f41")
+
+
+def chunk_hash(chunk: dict) -> str:
+    """Content hash of a chunk, as computed by the chunker (normalized md5)."""
+    metadata = chunk.get("metadata", {})
+    if metadata.get("content_hash"):
+        return metadata["content_hash"]
+    return md5(normalize_content(chunk.get("page_content", "")).encode()).hexdigest()
+
+
+def point_id(user_id: str, doc_hash: str, content_hash: str) -> str:
+    """Deterministic point ID so re-ingesting a document overwrites instead of duplicating."""
+    return str(uuid.uuid5(POINT_ID_NAMESPACE, f"{user_id}:{doc_hash}:{content_hash}"))
 
-    # === Create Embeddings ===
+
+# === Point Construction ===
+def _embed_chunks(chunks: List[dict], cache_stats: Optional[Dict[str, int]] = None) -> List[Optional[List[float]]]:
+    """Embed chunk texts, serving repeated content from the embedding cache."""
+    data = [chunk.get("page_content", "") for chunk in chunks]
+    embed_model = get_embed_model()
+    embedding_cache = get_embedding_cache()
+    if embedding_cache is None:
+        with EMBED_BATCH_SECONDS.time():
+            vectors = embed_model.encode(data, batch_size=settings.EMBED_BATCH_SIZE).tolist()
+        EMBEDDED_VECTORS.inc(len(data))
+        return vectors
+
+    hashes = [chunk_hash(chunk) for chunk in chunks]
+    cached = embedding_cache.get_many(hashes)
+    # Empty chunks are never stored, so they are neither encoded nor counted
+    wanted = [i for i, text in enumerate(data) if text.strip()]
+    missing = [i for i in wanted if hashes[i] not in cached]
+
+    EMBEDDING_CACHE_HITS.inc(len(wanted) - len(missing))
+    EMBEDDING_CACHE_MISSES.inc(len(missing))
+    if missing:
+        with EMBED_BATCH_SECONDS.time():
+            encoded = embed_model.encode([data[i] for i in missing], batch_size=settings.EMBED_BATCH_SIZE)
+        EMBEDDED_VECTORS.inc(len(missing))
+        new_vectors = {hashes[i]: vector for i, vector in zip(missing, encoded)}
+        cached.update(new_vectors)
+        embedding_cache.put_many(new_vectors)
+
+    if cache_stats is not None:
+        cache_stats["hits"] = cache_stats.get("hits", 0) + len(wanted) - len(missing)
+        cache_stats["misses"] = cache_stats.get("misses", 0) + len(missing)
+
+    return [cached[h].tolist() if h in cached else None for h in hashes]
+
+
+def _build_points(
+    chunks: List[dict],
+    user_id: str,
+    doc_hash: str,
+    cache_stats: Optional[Dict[str, int]] = None
+) -> List[VectorPoint]:
+    """Embed a batch of chunks and build the vector store points for the non-empty ones."""
     data = [chunk.get("page_content", "") for chunk in chunks]
-    embeddings = embed_model.encode(data).tolist()
+    embeddings = _embed_chunks(chunks, cache_stats)
+    with_sparse = get_vector_store().supports_sparse
 
-    # === Build + Upsert Points to Qdrant ===
     points = []
     for emb, chunk, text in zip(embeddings, chunks, data):
         if text.strip():
             metadata = chunk.get("metadata", {})
-            point = PointStruct(
-                id=str(uuid.uuid4()),
+            content_hash = chunk_hash(chunk)
+            sparse = None
+            if with_sparse:
+                sparse = encode_sparse_document(
+                    text,
+                    k1=settings.SPARSE_BM25_K1,
+                    b=settings.SPARSE_BM25_B,
+                    avg_doc_tokens=settings.SPARSE_AVG_DOC_TOKENS
+                )
+            point = VectorPoint(
+                id=point_id(user_id, doc_hash, content_hash),
                 vector=emb,
+                sparse=sparse,
                 payload={
                     "text": text,
                     "page": metadata.get("page_number", 1),
-                    "source": os.path.basename(metadata.get("source", "unknown")),
+                    "source": source_name(metadata.get("source", "unknown")),
                     "type": metadata.get("type", "text"),
-                    "user_id": user_id  # Add user ID for data isolation
+                    "user_id": user_id,  # Add user ID for data isolation
+                    "doc_hash": doc_hash,
+                    "content_hash": content_hash
                 }
             )
             points.append(point)
-            logger.info(f"Embedded chunk: {text[:100]}... with metadata: {point.payload}")
+            if chunk_log_sampler.should_log(logger):
+                logger.debug(f"Embedded chunk: {text[:100]}... with metadata: {point.payload}")
+    return points
+
+
+# === Core Function to Embed and Store PDF Data ===
+def embed_and_store_pdf(chunks: List[dict], user_id: str = "anonymous", doc_hash: Optional[str] = None) -> List[VectorPoint]:
+    """
+    embeds and stores the given PDF into the vector store.
+    
+    Args:
+        chunks (List[dict]): List of text chunks to embed and store.
+        user_id (str): User identifier for data isolation.
+        doc_hash (str): Document fingerprint used for point IDs. Defaults to a
+            hash of the chunk contents.
+
+    Returns:
+        List[VectorPoint]: Points that were embedded and stored.
+    """
+    if doc_hash is None:
+        doc_hash = sha256("".join(chunk_hash(chunk) for chunk in chunks).encode()).hexdigest()
+    points = _build_points(chunks, user_id, doc_hash)
+
+    get_vector_store().upsert(points)
+    logger.info(f"📦 Stored {len(points)} chunks into the vector store for user {user_id}.")
+
+    return points  # Useful for testing or future chaining (e.g. rerank preview
+
+
+# === Streaming Variant with Bounded Memory ===
+def _with_sentinel(items: Iterable[dict]) -> Iterator[Optional[dict]]:
+    """Yield every item, then a trailing None marking the end of the stream."""
+    yield from items
+    yield None
+
+
+def embed_and_store_stream(
+    chunks: Iterable[dict],
+    user_id: str,
+    doc_hash: str,
+    on_batch: Optional[Callable[[int, int], None]] = None,
+    cache_stats: Optional[Dict[str, int]] = None
+) -> int:
+    """
+    Embed and upsert chunks from an iterable in fixed-size micro-batches.
+
+    At most EMBED_BATCH_SIZE chunks and UPSERT_BATCH_SIZE points are held at once,
+    so memory does not grow with document size.
+
+    Args:
+        chunks: Iterable (typically a generator) of chunk dicts.
+        user_id: User identifier for data isolation.
+        doc_hash: Document fingerprint used for deterministic point IDs.
+        on_batch: Optional callback receiving (chunks_embedded, points_upserted)
+            after every embed batch and every upsert.
+        cache_stats: Optional dict updated in place with embedding cache
+            "hits" and "misses".
+
+    Returns:
+        int: Total number of points upserted.
+    """
+    embed_batch_size = max(1, settings.EMBED_BATCH_SIZE)
+    upsert_batch_size = max(1, settings.UPSERT_BATCH_SIZE)
+    chunk_batch: List[dict] = []
+    pending_points: List[VectorPoint] = []
+    chunks_embedded = 0
+    points_upserted = 0
+
+    for chunk in _with_sentinel(chunks):
+        if chunk is not None:
+            chunk_batch.append(chunk)
+            if len(chunk_batch) < embed_batch_size:
+                continue
+
+        # Embed a full micro-batch (or the remainder once the stream is exhausted)
+        if chunk_batch:
+            pending_points.extend(_build_points(chunk_batch, user_id, doc_hash, cache_stats))
+            chunks_embedded += len(chunk_batch)
+            chunk_batch = []
+
+        # Upsert full batches; the final partial batch goes out at end of stream
+        while len(pending_points) >= upsert_batch_size or (chunk is None and pending_points):
+            batch = pending_points[:upsert_batch_size]
+            pending_points = pending_points[upsert_batch_size:]
+            get_vector_store().upsert(batch)
+            points_upserted += len(batch)
+
+        if on_batch:
+            on_batch(chunks_embedded, points_upserted)
+
+    logger.info(f"📦 Streamed {points_upserted} chunks into the vector store for user {user_id}.")
+    return points_upserted
+
+
+# === Remove Points From Previous Versions of a Document ===
+def delete_stale_points(user_id: str, source: str, doc_hash: str):
+    """Delete a user's points for `source` that do not belong to the current `doc_hash`."""
+    get_vector_store().delete(
+        match={"source": source, "user_id": user_id},
+        exclude={"doc_hash": doc_hash}
+    )
 
-    client.upsert(collection_name='KnowMe_chunks', points=points)
-    logger.info(f"📦 Stored {len(points)} chunks into Qdrant for user {user_id}.")
 
-    return points  # Useful for testing or future chaining (e.g. rerank preview
\ No newline at end of file
+def delete_document_points(user_id: str, source: str, doc_hash: str):
+    """Delete a user's points for `source` that belong to `doc_hash` (e.g. from a failed ingestion)."""
+    get_vector_store().delete(match={"source": source, "user_id": user_id, "doc_hash": doc_hash})
@@ -0,0 +1,148 @@
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingCache:
+    """
+    Disk-backed LRU cache of chunk embeddings.
+
+    Vectors live in a fixed-capacity memory-mapped array (float16 by default) and
+    a SQLite index maps each key to its row and last-use time. When the array is
+    full, the least recently used row is overwritten. Keys are the normalized
+    chunk content hash; each model gets its own directory, so vectors from
+    different models never mix.
+
+    Several processes (uvicorn workers, the backfill CLI) may share a directory:
+    every read and write runs inside a SQLite `BEGIN IMMEDIATE` transaction, whose
+    write lock is held across the slot lookup/allocation and the memmap row
+    access, so two processes are never handed the same slot.
+    """
+
+    def __init__(self, directory: str, model_name: str, dim: int, capacity: int, dtype: str = "float16"):
+        self.model_name = model_name
+        self.dim = dim
+        self.capacity = max(1, capacity)
+        self.dtype = np.dtype(dtype)
+
+        model_dir = os.path.join(directory, re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name))
+        os.makedirs(model_dir, exist_ok=True)
+        # Layout parameters are part of the file names; changing them starts a fresh cache
+        layout = f"{self.capacity}x{self.dim}_{self.dtype.name}"
+        vectors_path = os.path.join(model_dir, f"vectors_{layout}.bin")
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(model_dir, f"index_{layout}.db"), timeout=30, check_same_thread=False)
+        with self._transaction():
+            # Checked under the write lock, so two processes starting together cannot both create (and zero) the file
+            mode = "r+" if os.path.exists(vectors_path) else "w+"
+            self._vectors = np.memmap(vectors_path, dtype=self.dtype, mode=mode, shape=(self.capacity, self.dim))
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS entries (
+                    key TEXT PRIMARY KEY,
+                    slot INTEGER NOT NULL UNIQUE,
+                    last_used REAL NOT NULL
+                )
+                """
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_last_used ON entries (last_used)")
+            if mode == "w+":
+                # Fresh vector file: any surviving index rows would point at zeroed rows
+                self._conn.execute("DELETE FROM entries")
+
+    @contextmanager
+    def _transaction(self):
+        """Hold this process's lock and SQLite's write lock (shared with other processes) until commit."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield
+                self._conn.commit()
+            except BaseException:
+                self._conn.rollback()
+                raise
+
+    def _key(self, content_hash: str) -> str:
+        return f"{self.model_name}:{content_hash}"
+
+    def get_many(self, content_hashes: List[str]) -> Dict[str, np.ndarray]:
+        """Return cached float32 vectors for the hashes that are present."""
+        if not content_hashes:
+            return {}
+        keys = {self._key(h): h for h in set(content_hashes)}
+        found: Dict[str, np.ndarray] = {}
+        with self._transaction():
+            placeholders = ",".join("?" * len(keys))
+            rows = self._conn.execute(
+                f"SELECT key, slot FROM entries WHERE key IN ({placeholders})", list(keys)
+            ).fetchall()
+            now = time.time()
+            for key, slot in rows:
+                found[keys[key]] = np.asarray(self._vectors[slot], dtype=np.float32)
+            if rows:
+                self._conn.executemany(
+                    "UPDATE entries SET last_used = ? WHERE key = ?", [(now, key) for key, _ in rows]
+                )
+        return found
+
+    def put_many(self, vectors: Dict[str, np.ndarray]):
+        """Store vectors keyed by content hash, evicting least recently used rows when full."""
+        if not vectors:
+            return
+        slots: List[int] = []
+        try:
+            with self._transaction():
+                now = time.time()
+                for content_hash, vector in vectors.items():
+                    key = self._key(content_hash)
+                    row = self._conn.execute("SELECT slot FROM entries WHERE key = ?", (key,)).fetchone()
+                    slot = row[0] if row else self._allocate_slot()
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO entries (key, slot, last_used) VALUES (?, ?, ?)", (key, slot, now)
+                    )
+                    slots.append(slot)
+                    self._vectors[slot] = np.asarray(vector, dtype=self.dtype)
+                self._vectors.flush()
+        except BaseException:
+            # The rollback restores evicted keys whose rows may already be overwritten; drop them
+            if slots:
+                with self._transaction():
+                    self._conn.executemany("DELETE FROM entries WHERE slot = ?", [(slot,) for slot in slots])
+            raise
+
+    def _allocate_slot(self) -> int:
+        count, highest = self._conn.execute("SELECT COUNT(*), MAX(slot) FROM entries").fetchone()
+        if count < self.capacity:
+            if highest is None or highest + 1 == count:
+                # Slots 0..count-1 are all taken, so the next one is free
+                return count
+            # A failed put_many left holes; hand out the lowest free slot
+            return self._conn.execute(
+                """
+                SELECT 0 WHERE NOT EXISTS (SELECT 1 FROM entries WHERE slot = 0)
+                UNION ALL
+                SELECT e.slot + 1 FROM entries e
+                WHERE e.slot + 1 < ? AND NOT EXISTS (SELECT 1 FROM entries WHERE slot = e.slot + 1)
+                ORDER BY 1 LIMIT 1
+                """,
+                (self.capacity,),
+            ).fetchone()[0]
+        key, slot = self._conn.execute(
+            "SELECT key, slot FROM entries ORDER BY last_used ASC LIMIT 1"
+        ).fetchone()
+        self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+        return slot
+
+    def __len__(self) -> int:
+        with self._transaction():
+            return self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
@@ -1,16 +1,24 @@
 # new fallback pipeline with llamaparser used as fallback parser
 import os
 import re
+import time
 import logging
+import multiprocessing
+import threading
 import pdfplumber
 import pytesseract
+from collections import deque
 from hashlib import md5
-from typing import List, Dict
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from llama_parse import LlamaParse
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from src.utils import PdfExtractionResult, PageText
+from src.utils import PdfExtractionResult, PageText, normalize_content
+from src.metrics import CHUNKING_SECONDS, CHUNKS_CREATED, observe_extract_timings
+from src.logging_setup import chunk_log_sampler, correlation_id, setup_worker_logging
 from config import settings
 
 logger = logging.getLogger(__name__)
@@ -26,78 +34,262 @@ if os.name == 'nt':
 # === Parsing & Extraction ===
 # ===========================
 
-def extract(filename: str) -> PdfExtractionResult:
+def _extract_page(page, page_num: int, filename: str, timings: Optional[Dict[str, Any]] = None) -> Optional[PageText]:
+    """
+    Extract text (with OCR fallback) and tables from a single pdfplumber page.
+
+    If `timings` is given, it is filled with per-step seconds ("text", "ocr",
+    "tables", "page") and the "method" that produced the text.
+    """
+    timings = {} if timings is None else timings
+    page_start = time.perf_counter()
+    text = ""
+    method_used = ""
+
+    # Step 1: Try direct text extraction
+    step_start = page_start
+    try:
+        text = page.extract_text(layout=True)
+        if text and len(text.strip()) >= 50:
+            logger.debug(f"✅ Parsed text from page {page_num} using pdfplumber.")
+            method_used = "pdfplumber"
+        else:
+            raise ValueError("Text too short or missing")
+    except Exception as e:
+        logger.warning(f"⚠️ pdfplumber extract_text failed for page {page_num}: {e}")
+        text = ""
+    timings["text"] = time.perf_counter() - step_start
+
+    # Step 2: Try OCR using page.to_image()
+    if not text:
+        step_start = time.perf_counter()
+        try:
+            logger.debug(f"🔁 Attempting OCR with pdfplumber.to_image on page {page_num}...")
+            image = page.to_image(resolution=300).original
+            text = pytesseract.image_to_string(image, config='--oem 3 --psm 6')
+            if text and len(text.strip()) >= 50:
+                logger.debug(f"✅ OCR succeeded for page {page_num} with pdfplumber.to_image.")
+                method_used = "ocr:plumber"
+            else:
+                raise ValueError("OCR result too short")
+        except Exception as e:
+            logger.warning(f"⚠️ OCR via pdfplumber.to_image failed for page {page_num}: {e}")
+            text = ""
+        timings["ocr"] = time.perf_counter() - step_start
+
+    # Extract tables (only from pdfplumber)
+    table_text = ""
+    step_start = time.perf_counter()
+    try:
+        tables = page.extract_tables() or []
+        for table in tables:
+            table_text += "\n\nTable:\n" + "\n".join(
+                " | ".join(str(cell) if cell is not None else "" for cell in row)
+                for row in table
+            )
+    except Exception as e:
+        logger.warning(f"⚠️ Table extraction failed on page {page_num}: {e}")
+    timings["tables"] = time.perf_counter() - step_start
+    timings["page"] = time.perf_counter() - page_start
+    timings["method"] = method_used
+
+    # Clean and combine
+    cleaned_text = "\n".join(line.strip() for line in (text or "").splitlines() if line.strip())
+    full_text = cleaned_text + table_text
+
+    if not full_text.strip():
+        return None
+
+    return PageText(
+        page_number=page_num,
+        text=full_text,
+        filename=os.path.basename(filename)
+    )
+
+
+def _extract_page_range(
+    filename: str,
+    start: int,
+    end: int,
+    parent_correlation_id: str = "-"
+) -> Tuple[List[PageText], List[Dict[str, Any]]]:
+    """
+    Worker entry point: extract pages [start, end) of a PDF in a pool process.
+
+    Returns the pages plus every page's step timings, which the parent process
+    records (metrics registered in a worker process would never be scraped).
+    """
+    # Pool processes outlive a single job, so the job's ID travels with each task
+    correlation_id.set(parent_correlation_id)
+    pages_data = []
+    page_timings = []
+    with pdfplumber.open(filename) as pdf:
+        for i in range(start, end):
+            page = pdf.pages[i]
+            timings: Dict[str, Any] = {}
+            page_text = _extract_page(page, i + 1, filename, timings)
+            page.close()
+            page_timings.append(timings)
+            if page_text:
+                pages_data.append(page_text)
+    return pages_data, page_timings
+
+
+def _new_pool(workers: int) -> ProcessPoolExecutor:
+    # Spawned rather than forked: the parent has live threads (log writer, HTTP
+    # clients, torch pools) whose locks a forked child would inherit mid-acquire
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=setup_worker_logging
+    )
+
+
+def extract_pool_size() -> int:
+    """EXTRACT_WORKERS, or when it is 0 the CPU count shared evenly among the API_WORKERS processes."""
+    if settings.EXTRACT_WORKERS > 0:
+        return settings.EXTRACT_WORKERS
+    return max(1, (os.cpu_count() or 1) // max(1, settings.API_WORKERS))
+
+
+_extract_pool: Optional[ProcessPoolExecutor] = None
+_extract_pool_lock = threading.Lock()
+
+
+def get_extract_pool() -> ProcessPoolExecutor:
+    """
+    Return the shared extraction pool, creating it on first use.
+
+    pdfplumber parsing is GIL-bound Python, so ingestion jobs always extract in
+    these extract_pool_size() processes instead of on API-process threads, where
+    they would take CPU from the event loop.
+    """
+    global _extract_pool
+    if _extract_pool is None:
+        with _extract_pool_lock:
+            if _extract_pool is None:
+                _extract_pool = _new_pool(extract_pool_size())
+    return _extract_pool
+
+
+def shutdown_extract_pool():
+    """Stop the shared extraction pool, cancelling ranges that have not started."""
+    global _extract_pool
+    with _extract_pool_lock:
+        if _extract_pool is not None:
+            _extract_pool.shutdown(wait=False, cancel_futures=True)
+            _extract_pool = None
+
+
+def _discard_broken_pool(executor: ProcessPoolExecutor):
+    """A pool whose worker died rejects all further work; let the next job start a fresh one."""
+    global _extract_pool
+    with _extract_pool_lock:
+        if _extract_pool is executor:
+            _extract_pool = None
+    executor.shutdown(wait=False)
+
+
+def _iter_parallel(filename: str, total_pages: int, executor: ProcessPoolExecutor, workers: int) -> Iterator[PageText]:
+    """
+    Spread page ranges across a process pool and yield pages in document order.
+
+    At most two ranges per worker are in flight, so pages never pile up in
+    memory when the consumer (embedding) is slower than extraction.
+    """
+    pages_per_task = max(1, settings.EXTRACT_PAGES_PER_TASK)
+    starts = list(range(0, total_pages, pages_per_task))
+    ends = [min(start + pages_per_task, total_pages) for start in starts]
+    window = 2 * max(1, workers)
+
+    logger.info(f"Extracting {total_pages} pages in {len(starts)} ranges with {workers} workers")
+
+    pending = deque()
+    submitted = 0
+    try:
+        while submitted < len(starts) or pending:
+            while submitted < len(starts) and len(pending) < window:
+                pending.append(executor.submit(
+                    _extract_page_range, filename, starts[submitted], ends[submitted], correlation_id.get()
+                ))
+                submitted += 1
+            # Results are taken in submission order, so pages stay sorted
+            range_pages, range_timings = pending.popleft().result()
+            for timings in range_timings:
+                observe_extract_timings(timings)
+            yield from range_pages
+    finally:
+        # Also reached when the consumer stops early: drop ranges not yet started
+        for future in pending:
+            future.cancel()
+
+
+def iter_extract(
+    filename: str,
+    workers: Optional[int] = None,
+    on_total_pages: Optional[Callable[[int], None]] = None
+) -> Iterator[PageText]:
+    """
+    Stream extracted pages of a PDF in document order, falling back to LLaMAParse.
+
+    Pages are yielded as soon as they are parsed and their pdfplumber caches are
+    released, so memory stays flat regardless of document length.
+
+    Args:
+        filename: Path to the PDF file.
+        workers: None (the default) extracts in the shared pool of
+            extract_pool_size() processes; a number starts a dedicated
+            pool of that size, and 0 extracts serially in the calling process.
+        on_total_pages: Optional callback receiving the PDF page count once known.
+
+    Yields:
+        PageText for every page with non-empty content.
+    """
     if os.path.splitext(filename)[1].lower() != ".pdf":
         raise ValueError("Unsupported file type")
 
-    pages_data = []
+    last_page = 0
     fallback_triggered = False
 
     try:
         with pdfplumber.open(filename) as pdf:
-            logger.info(f"Total pages in PDF: {len(pdf.pages)}")
-
-            for i, page in enumerate(pdf.pages):
-                page_num = i + 1
-                text = ""
-                method_used = ""
-
-                # Step 1: Try direct text extraction
-                try:
-                    text = page.extract_text(layout=True)
-                    if text and len(text.strip()) >= 50:
-                        logger.info(f"✅ Parsed text from page {page_num} using pdfplumber.")
-                        method_used = "pdfplumber"
-                    else:
-                        raise ValueError("Text too short or missing")
-                except Exception as e:
-                    logger.warning(f"⚠️ pdfplumber extract_text failed for page {page_num}: {e}")
-                    text = ""
-
-                # Step 2: Try OCR using page.to_image()
-                if not text:
-                    try:
-                        logger.info(f"🔁 Attempting OCR with pdfplumber.to_image on page {page_num}...")
-                        image = page.to_image(resolution=300).original
-                        text = pytesseract.image_to_string(image, config='--oem 3 --psm 6')
-                        if text and len(text.strip()) >= 50:
-                            logger.info(f"✅ OCR succeeded for page {page_num} with pdfplumber.to_image.")
-                            method_used = "ocr:plumber"
-                        else:
-                            raise ValueError("OCR result too short")
-                    except Exception as e:
-                        logger.warning(f"⚠️ OCR via pdfplumber.to_image failed for page {page_num}: {e}")
-                        text = ""
-
-                # Extract tables (only from pdfplumber)
-                table_text = ""
-                try:
-                    tables = page.extract_tables() or []
-                    for table in tables:
-                        table_text += "\n\nTable:\n" + "\n".join(
-                            " | ".join(str(cell) if cell is not None else "" for cell in row)
-                            for row in table
-                        )
-                except Exception as e:
-                    logger.warning(f"⚠️ Table extraction failed on page {page_num}: {e}")
-
-                # Clean and combine
-                cleaned_text = "\n".join(line.strip() for line in (text or "").splitlines() if line.strip())
-                full_text = cleaned_text + table_text
-
-                if full_text.strip():
-                    pages_data.append(PageText(
-                        page_number=page_num,
-                        text=full_text,
-                        filename=os.path.basename(filename)
-                    ))
+            total_pages = len(pdf.pages)
+            logger.info(f"Total pages in PDF: {total_pages}")
+            if on_total_pages:
+                on_total_pages(total_pages)
+
+            if workers == 0:
+                for i, page in enumerate(pdf.pages):
+                    timings: Dict[str, Any] = {}
+                    page_text = _extract_page(page, i + 1, filename, timings)
+                    page.close()  # drop cached layout objects before moving on
+                    observe_extract_timings(timings)
+                    if page_text:
+                        last_page = page_text.page_number
+                        yield page_text
+
+        if workers != 0:
+            if workers is None:
+                executor, pool_size = get_extract_pool(), extract_pool_size()
+            else:
+                executor, pool_size = _new_pool(workers), workers
+            try:
+                for page_text in _iter_parallel(filename, total_pages, executor, pool_size):
+                    last_page = page_text.page_number
+                    yield page_text
+            except BrokenProcessPool:
+                _discard_broken_pool(executor)
+                raise
+            finally:
+                if workers is not None:
+                    executor.shutdown(wait=True, cancel_futures=True)
 
     except Exception as e:
         logger.error(f"❌ Error using pdfplumber combo pipeline: {e}")
         fallback_triggered = True
 
-    # If no valid pages parsed, fallback to LLaMAParse
-    if not pages_data or fallback_triggered:
+    # If no valid pages parsed, fallback to LLaMAParse for whatever was not yielded yet
+    if not last_page or fallback_triggered:
         logger.info("⚠️ Falling back to LLaMAParse due to insufficient content or failure.")
         try:
             parser = LlamaParse(api_key=LLAMAPARSE_API_KEY)
@@ -105,17 +297,50 @@ def extract(filename: str) -> PdfExtractionResult:
             documents = job.get_text_documents()
 
             for i, doc in enumerate(documents):
-                pages_data.append(PageText(
+                if i + 1 <= last_page:
+                    continue
+                yield PageText(
                     page_number=i + 1,
                     text=doc.text,
                     filename=os.path.basename(filename)
-                ))
+                )
 
             logger.info("✅ Fallback to LLaMAParse succeeded.")
         except Exception as e:
             logger.error(f"❌ LLaMAParse fallback failed: {e}")
 
-    return PdfExtractionResult(pages=pages_data)
+
+def extract(filename: str, workers: Optional[int] = None) -> PdfExtractionResult:
+    """
+    Extract page text and tables from a PDF, falling back to LLaMAParse.
+
+    Args:
+        filename: Path to the PDF file.
+        workers: Extraction pool, as for iter_extract(): None uses the shared
+            pool, a number a dedicated pool of that size, 0 extracts in-process.
+
+    Returns:
+        PdfExtractionResult with pages in document order.
+    """
+    counts = {"total_pages": 0}
+    start_time = time.perf_counter()
+
+    pages_data = list(iter_extract(
+        filename,
+        workers=workers,
+        on_total_pages=lambda n: counts.update(total_pages=n)
+    ))
+
+    result = PdfExtractionResult(
+        pages=pages_data,
+        total_pages=counts["total_pages"] or len(pages_data),
+        elapsed_seconds=time.perf_counter() - start_time
+    )
+    logger.info(
+        f"Extracted {result.total_pages} pages in {result.elapsed_seconds:.2f}s "
+        f"({result.pages_per_second:.2f} pages/sec)"
+    )
+    return result
 
 # ===========================
 # === Chunking Logic =========
@@ -173,13 +398,16 @@ def create_table_chunk(table: Dict, source: str) -> List[Dict]:
             }
         }]
 
-def normalize_content(content: str) -> str:
-    """Normalize content for deduplication by removing extra whitespace and converting to lowercase."""
-    return re.sub(r'\s+', ' ', content.strip().lower())
+def iter_chunks(pages: Iterable[Dict]) -> Iterator[Dict]:
+    """
+    Stream chunks from page dicts as they arrive.
 
-def chunk_pdfplumber_parsed_data(pages: List[Dict]) -> List[Dict]:
-    chunks = []
+    Only content hashes are retained between pages (for deduplication), so the
+    chunker can consume a page generator without materializing the document.
+    """
     seen_content = set()
+    skipped_duplicates = 0
+    first_source = None
     current_table = None
     text_limit = 1500
     flex_limit = 1600
@@ -187,6 +415,8 @@ def chunk_pdfplumber_parsed_data(pages: List[Dict]) -> List[Dict]:
     for page in pages:
         page_num = page["metadata"]["page_number"]
         source = page["metadata"]["source"]
+        if first_source is None:
+            first_source = source
 
         # Process tables
         for table in page.get("tables", []):
@@ -204,10 +434,14 @@ def chunk_pdfplumber_parsed_data(pages: List[Dict]) -> List[Dict]:
                             content_hash = md5(normalize_content(chunk["page_content"]).encode()).hexdigest()
                             if content_hash not in seen_content:
                                 seen_content.add(content_hash)
-                                chunks.append(chunk)
-                                logger.info(f"Created table chunk: {chunk['page_content'][:50]}... with metadata: {chunk['metadata']}")
+                                chunk["metadata"]["content_hash"] = content_hash
+                                yield chunk
+                                if chunk_log_sampler.should_log(logger):
+                                    logger.debug(f"Created table chunk: {chunk['page_content'][:50]}... with metadata: {chunk['metadata']}")
                             else:
-                                logger.warning(f"Skipped duplicate table chunk: {chunk['page_content'][:50]}...")
+                                skipped_duplicates += 1
+                                if chunk_log_sampler.should_log(logger):
+                                    logger.debug(f"Skipped duplicate table chunk: {chunk['page_content'][:50]}...")
                     current_table = {
                         "header": header,
                         "rows": table[1:],
@@ -233,17 +467,21 @@ def chunk_pdfplumber_parsed_data(pages: List[Dict]) -> List[Dict]:
                         content_hash = md5(normalize_content(para).encode()).hexdigest()
                         if content_hash not in seen_content:
                             seen_content.add(content_hash)
-                            chunks.append({
+                            yield {
                                 "page_content": para,
                                 "metadata": {
                                     "page_number": page_num,
                                     "source": source or "unknown",
-                                    "type": section_type
+                                    "type": section_type,
+                                    "content_hash": content_hash
                                 }
-                            })
-                            logger.info(f"Created text chunk: {para[:50]}... with metadata: page={page_num}, type={section_type}")
+                            }
+                            if chunk_log_sampler.should_log(logger):
+                                logger.debug(f"Created text chunk: {para[:50]}... with metadata: page={page_num}, type={section_type}")
                         else:
-                            logger.warning(f"Skipped duplicate text chunk: {para[:50]}...")
+                            skipped_duplicates += 1
+                            if chunk_log_sampler.should_log(logger):
+                                logger.debug(f"Skipped duplicate text chunk: {para[:50]}...")
                     else:
                         sentences = re.split(r'(?<=[.!?])\s+', para)
                         temp_chunk = ""
@@ -255,44 +493,65 @@ def chunk_pdfplumber_parsed_data(pages: List[Dict]) -> List[Dict]:
                                     content_hash = md5(normalize_content(temp_chunk.strip()).encode()).hexdigest()
                                     if content_hash not in seen_content:
                                         seen_content.add(content_hash)
-                                        chunks.append({
+                                        yield {
                                             "page_content": temp_chunk.strip(),
                                             "metadata": {
                                                 "page_number": page_num,
                                                 "source": source or "unknown",
-                                                "type": section_type
+                                                "type": section_type,
+                                                "content_hash": content_hash
                                             }
-                                        })
-                                        logger.info(f"Created text chunk: {temp_chunk[:50]}... with metadata: page={page_num}, type={section_type}")
+                                        }
+                                        if chunk_log_sampler.should_log(logger):
+                                            logger.debug(f"Created text chunk: {temp_chunk[:50]}... with metadata: page={page_num}, type={section_type}")
                                     else:
-                                        logger.warning(f"Skipped duplicate text chunk: {temp_chunk[:50]}...")
+                                        skipped_duplicates += 1
+                                        if chunk_log_sampler.should_log(logger):
+                                            logger.debug(f"Skipped duplicate text chunk: {temp_chunk[:50]}...")
                                     temp_chunk = sentence + " "
                         if temp_chunk:
                             content_hash = md5(normalize_content(temp_chunk.strip()).encode()).hexdigest()
                             if content_hash not in seen_content:
                                 seen_content.add(content_hash)
-                                chunks.append({
+                                yield {
                                     "page_content": temp_chunk.strip(),
                                     "metadata": {
                                         "page_number": page_num,
                                         "source": source or "unknown",
-                                        "type": section_type
+                                        "type": section_type,
+                                        "content_hash": content_hash
                                     }
-                                })
-                                logger.info(f"Created text chunk: {temp_chunk[:50]}... with metadata: page={page_num}, type={section_type}")
+                                }
+                                if chunk_log_sampler.should_log(logger):
+                                    logger.debug(f"Created text chunk: {temp_chunk[:50]}... with metadata: page={page_num}, type={section_type}")
                             else:
-                                logger.warning(f"Skipped duplicate text chunk: {temp_chunk[:50]}...")
+                                skipped_duplicates += 1
+                                if chunk_log_sampler.should_log(logger):
+                                    logger.debug(f"Skipped duplicate text chunk: {temp_chunk[:50]}...")
 
     # Finalize any remaining table
     if current_table:
-        table_chunks = create_table_chunk(current_table, pages[0]["metadata"]["source"])
+        table_chunks = create_table_chunk(current_table, first_source)
         for chunk in table_chunks:
             content_hash = md5(normalize_content(chunk["page_content"]).encode()).hexdigest()
             if content_hash not in seen_content:
                 seen_content.add(content_hash)
-                chunks.append(chunk)
-                logger.info(f"Created table chunk: {chunk['page_content'][:50]}... with metadata: {chunk['metadata']}")
+                chunk["metadata"]["content_hash"] = content_hash
+                yield chunk
+                if chunk_log_sampler.should_log(logger):
+                    logger.debug(f"Created table chunk: {chunk['page_content'][:50]}... with metadata: {chunk['metadata']}")
             else:
-                logger.warning(f"Skipped duplicate table chunk: {chunk['page_content'][:50]}...")
+                skipped_duplicates += 1
+                if chunk_log_sampler.should_log(logger):
+                    logger.debug(f"Skipped duplicate table chunk: {chunk['page_content'][:50]}...")
 
-    return chunks
\ No newline at end of file
+    if skipped_duplicates:
+        logger.info(f"Skipped {skipped_duplicates} duplicate chunks from {first_source}")
+
+
+def chunk_pdfplumber_parsed_data(pages: List[Dict]) -> List[Dict]:
+    start_time = time.perf_counter()
+    chunks = list(iter_chunks(pages))
+    CHUNKING_SECONDS.observe(time.perf_counter() - start_time)
+    CHUNKS_CREATED.inc(len(chunks))
+    return chunks
@@ -0,0 +1,178 @@
+import logging
+import os
+import sys
+import time
+import uuid
+from hashlib import sha256
+from typing import Callable, Dict, Iterable, Iterator, Optional
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import settings
+from src.utils import IngestionStats, PageText
+from src.cache import index_generations
+from src.metrics import CHUNKING_SECONDS, CHUNKS_CREATED, StageTimer
+from RAG.parsing_and_chunking import iter_extract, iter_chunks
+from RAG.embedding_and_store import embed_and_store_stream, delete_stale_points, delete_document_points
+from RAG.document_registry import get_document_registry
+
+logger = logging.getLogger(__name__)
+
+
+def file_fingerprint(path: str, block_size: int = 1 << 20) -> str:
+    """SHA-256 of the file's bytes, read in blocks."""
+    digest = sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _page_dicts(
+    pages: Iterable[PageText],
+    source: str,
+    stats: IngestionStats,
+    on_page: Callable[[], None] = lambda: None
+) -> Iterator[Dict]:
+    """Convert extracted pages to the chunker's dict format, counting them as they pass."""
+    for page in pages:
+        stats.pages_parsed += 1
+        on_page()
+        yield {
+            "text": page.text,
+            "metadata": {
+                "page_number": page.page_number,
+                "source": source,
+                "type": "text"
+            }
+        }
+
+
+def _counted(chunks: Iterable[Dict], stats: IngestionStats) -> Iterator[Dict]:
+    for chunk in chunks:
+        stats.chunks_created += 1
+        CHUNKS_CREATED.inc()
+        yield chunk
+
+
+def ingest_pdf(
+    path: str,
+    source: str,
+    user_id: str = "anonymous",
+    stats: Optional[IngestionStats] = None,
+    on_progress: Optional[Callable[[IngestionStats], None]] = None
+) -> IngestionStats:
+    """
+    Stream a PDF through extract -> chunk -> embed -> upsert.
+
+    Every stage is a generator, so only one page, one embedding micro-batch and
+    one upsert batch are resident at a time.
+
+    Point IDs are derived from (user_id, document hash, chunk hash). If ingestion
+    fails or is cancelled part-way, the points already upserted for this version
+    are deleted before the error propagates, so the previous version stays the
+    only searchable one. A byte-identical document that was already ingested for
+    the user is skipped before parsing. The (user_id, hash) pair is claimed in the
+    registry first, so a concurrent upload of the same bytes waits for this one
+    and is then skipped (or ingests itself if this one failed) rather than
+    deleting this job's points on its own failure.
+
+    Args:
+        path: Path to the PDF on disk.
+        source: Original filename stored in the chunk payloads.
+        user_id: User identifier for data isolation.
+        stats: Optional stats object to update in place (e.g. for progress reporting).
+        on_progress: Optional callback invoked after every embed/upsert batch.
+
+    Returns:
+        IngestionStats with page, chunk and point counts.
+    """
+    stats = stats or IngestionStats(filename=source, user_id=user_id)
+    start_time = time.perf_counter()
+
+    stats.doc_hash = file_fingerprint(path)
+    registry = get_document_registry()
+    owner = uuid.uuid4().hex
+    lease_seconds = settings.INGEST_CLAIM_LEASE_SECONDS
+    while True:
+        existing, claimed = registry.claim(user_id, stats.doc_hash, source, owner, lease_seconds)
+        if existing:
+            stats.skipped = True
+            stats.duplicate_of = existing["source"]
+            stats.elapsed_seconds = time.perf_counter() - start_time
+            logger.info(f"Skipping '{source}' for user {user_id}: identical to already ingested '{existing['source']}'")
+            return stats
+        if claimed:
+            break
+        # Another job is ingesting the same bytes; its outcome decides whether this one runs
+        time.sleep(settings.INGEST_POLL_INTERVAL_SECONDS)
+
+    last_renewed = time.monotonic()
+
+    def keep_claim():
+        nonlocal last_renewed
+        if time.monotonic() - last_renewed >= lease_seconds / 4:
+            registry.renew_claim(user_id, stats.doc_hash, owner, lease_seconds)
+            last_renewed = time.monotonic()
+
+    def on_total_pages(total: int):
+        stats.total_pages = total
+
+    cache_stats = {"hits": 0, "misses": 0}
+
+    def on_batch(chunks_embedded: int, points_upserted: int):
+        stats.chunks_embedded = chunks_embedded
+        stats.points_upserted = points_upserted
+        stats.embedding_cache_hits = cache_stats["hits"]
+        stats.embedding_cache_misses = cache_stats["misses"]
+        stats.elapsed_seconds = time.perf_counter() - start_time
+        keep_claim()
+        if on_progress:
+            on_progress(stats)
+
+    pages = iter_extract(path, on_total_pages=on_total_pages)
+    # Chunker time excludes the extraction it pulls from
+    chunk_timer = StageTimer()
+    chunks = _counted(
+        chunk_timer.output(iter_chunks(chunk_timer.input(_page_dicts(pages, source, stats, keep_claim)))),
+        stats
+    )
+    try:
+        embed_and_store_stream(chunks, user_id, stats.doc_hash, on_batch=on_batch, cache_stats=cache_stats)
+
+        # Extraction failures (e.g. a failed LlamaParse fallback) surface as an empty
+        # document; fail the job before touching the previous version or the registry
+        if stats.pages_parsed == 0 or stats.points_upserted == 0:
+            raise ValueError(
+                f"No content extracted from '{source}' ({stats.pages_parsed} pages, "
+                f"{stats.points_upserted} chunks stored); previous version left in place"
+            )
+
+        # Drop points left by an earlier version of this file, then mark it ingested
+        delete_stale_points(user_id, source, stats.doc_hash)
+        registry.record(
+            user_id, source, stats.doc_hash,
+            page_count=stats.total_pages,
+            chunk_count=stats.points_upserted,
+            size_bytes=os.path.getsize(path)
+        )
+    except BaseException:
+        # Nothing records the partial upload; remove it instead of leaving it searchable
+        try:
+            delete_document_points(user_id, source, stats.doc_hash)
+        except Exception as e:
+            logger.error(f"Could not remove partial points for '{source}' ({stats.doc_hash[:12]}): {e}")
+        raise
+    finally:
+        # Released after the catalog row is written, so a waiting duplicate sees it
+        registry.release_claim(user_id, stats.doc_hash, owner)
+        # Even a partial run changed what the user's searches can return
+        index_generations.bump(user_id)
+        CHUNKING_SECONDS.observe(chunk_timer.seconds)
+
+    stats.elapsed_seconds = time.perf_counter() - start_time
+    logger.info(
+        f"Ingested '{source}' for user {user_id}: {stats.pages_parsed} pages, "
+        f"{stats.chunks_embedded} chunks, {stats.points_upserted} points in {stats.elapsed_seconds:.2f}s "
+        f"(embedding cache hit rate {stats.embedding_cache_hit_rate:.1%})"
+    )
+    return stats
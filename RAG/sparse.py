@@ -0,0 +1,91 @@
+"""
+BM25-style sparse vectors for exact-term retrieval.
+
+Tokens are hashed to stable 31-bit indices. Documents carry the BM25 term-frequency
+component; the IDF component is applied server-side by Qdrant (Modifier.IDF), so
+document vectors never need recomputing as the corpus grows. Compound tokens such
+as invoice numbers ("INV-2024-0042") are kept whole and also split into parts.
+"""
+import re
+import zlib
+from collections import Counter
+from typing import Dict, List, Set, Tuple
+
+SPARSE_VECTOR_NAME = "bm25"
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:[-_./][a-z0-9]+)*")
+# Same shape as _TOKEN_RE, matched against the original case
+_WORD_RE = re.compile(r"[A-Za-z0-9]+(?:[-_./][A-Za-z0-9]+)*")
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the this to was were "
+    "what when where which who why will with my me i you your our we do does did how".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    tokens = []
+    for match in _TOKEN_RE.findall(text.lower()):
+        parts = re.split(r"[-_./]", match)
+        if len(parts) > 1:
+            tokens.append(match)
+        tokens.extend(p for p in parts if p and p not in _STOPWORDS)
+    return tokens
+
+
+def _token_index(token: str) -> int:
+    return zlib.crc32(token.encode()) & 0x7FFFFFFF
+
+
+def _to_sparse(weights: Dict[str, float]) -> Tuple[List[int], List[float]]:
+    # Hash collisions are merged by summing their weights
+    merged: Dict[int, float] = {}
+    for token, weight in weights.items():
+        index = _token_index(token)
+        merged[index] = merged.get(index, 0.0) + weight
+    indices = sorted(merged)
+    return indices, [merged[i] for i in indices]
+
+
+def encode_document(text: str, k1: float = 1.2, b: float = 0.75, avg_doc_tokens: float = 200.0) -> Tuple[List[int], List[float]]:
+    """BM25 term-frequency weights for a chunk, as (indices, values)."""
+    counts = Counter(tokenize(text))
+    doc_len = sum(counts.values())
+    norm = k1 * (1 - b + b * doc_len / max(avg_doc_tokens, 1.0))
+    return _to_sparse({token: tf * (k1 + 1) / (tf + norm) for token, tf in counts.items()})
+
+
+def _starts_sentence(text: str, position: int) -> bool:
+    before = text[:position].rstrip(" \t\"'(")
+    return not before or before[-1] in ".!?:\n\r"
+
+
+def identifier_terms(text: str) -> Set[str]:
+    """
+    Entity-like tokens that should count as an exact match on their own, lowercased:
+
+    - identifiers (invoice numbers, SKUs, codes): letters and digits mixed,
+      e.g. "INV-2024-0042" or "A7X", or runs of 5+ digits such as "20240042";
+    - names: capitalized words that do not start a sentence, e.g. "Acme" and
+      "Smith" in "contract between Acme and John Smith".
+
+    Plain lowercase words, sentence-initial words and short bare numbers such as
+    years are excluded; they are too common to count on their own.
+    """
+    terms = set()
+    for match in _WORD_RE.finditer(text):
+        token = match.group()
+        lower = token.lower()
+        if any(c.isdigit() for c in token):
+            if any(c.isalpha() for c in token):
+                if len(token) >= 3:
+                    terms.add(lower)
+            elif sum(c.isdigit() for c in token) >= 5:
+                terms.add(lower)
+        elif token[0].isupper() and len(token) >= 2 and lower not in _STOPWORDS and not _starts_sentence(text, match.start()):
+            terms.add(lower)
+    return terms
+
+
+def encode_query(text: str) -> Tuple[List[int], List[float]]:
+    """Unit weight for every distinct query term, as (indices, values)."""
+    return _to_sparse({token: 1.0 for token in set(tokenize(text))})
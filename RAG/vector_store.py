@@ -0,0 +1,576 @@
+"""
+Vector store backends behind one interface.
+
+- QdrantVectorStore: the KnowMe_chunks collection on a Qdrant server (dense +
+  optional BM25 sparse vectors).
+- EmbeddedVectorStore: in-process NumPy search over memory-mapped float16 vectors,
+  with payloads and filter fields in SQLite. No external process; meant for
+  small single-tenant deployments, CI and benchmarks.
+
+Filters are equality matches on payload fields, e.g. {"user_id": "u1", "source": "a.pdf"},
+with an optional `exclude` of the same shape (used to drop stale document versions).
+"""
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Sequence, Set, Tuple, Union
+
+import numpy as np
+
+from RAG.sparse import SPARSE_VECTOR_NAME
+from src.metrics import VECTOR_STORE_POINTS, VECTOR_STORE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+SparseQuery = Tuple[List[int], List[float]]
+
+
+@dataclass
+class VectorPoint:
+    id: str
+    vector: List[float]
+    payload: Dict[str, Any]
+    # BM25 term weights as (indices, values); ignored by backends without sparse support
+    sparse: Optional[SparseQuery] = None
+
+
+@dataclass
+class SearchHit:
+    id: Any
+    score: float
+    payload: Dict[str, Any] = field(default_factory=dict)
+
+
+class VectorStore:
+    """
+    Common interface for the chunk store.
+
+    Async methods default to running the sync ones in a worker thread; backends
+    with a native async client override them.
+    """
+
+    name = "base"
+
+    def _timed(self, operation: str):
+        """Context manager observing one operation's latency in VECTOR_STORE_SECONDS."""
+        return VECTOR_STORE_SECONDS.labels(self.name, operation).time()
+
+    def open(self):
+        """Connect / load eagerly (called at startup). Accessors also open lazily."""
+
+    def close(self):
+        """Release resources."""
+
+    @property
+    def supports_sparse(self) -> bool:
+        return False
+
+    def upsert(self, points: Sequence[VectorPoint]):
+        raise NotImplementedError
+
+    def search(self, vector: Sequence[float], match: Dict[str, Any], limit: int) -> List[SearchHit]:
+        """Top `limit` points by cosine similarity among those matching `match`."""
+        raise NotImplementedError
+
+    def scroll(
+        self,
+        match: Optional[Dict[str, Any]] = None,
+        limit: int = 100,
+        offset: Any = None,
+        with_payload: Union[bool, List[str]] = True
+    ) -> Tuple[List[SearchHit], Any]:
+        """Page through matching points; returns (hits, next offset or None)."""
+        raise NotImplementedError
+
+    def delete(self, match: Dict[str, Any], exclude: Optional[Dict[str, Any]] = None):
+        """Delete points matching `match` and not matching `exclude`."""
+        raise NotImplementedError
+
+    async def asupports_sparse(self) -> bool:
+        return self.supports_sparse
+
+    async def asearch(self, vector: Sequence[float], match: Dict[str, Any], limit: int) -> List[SearchHit]:
+        return await asyncio.to_thread(self.search, vector, match, limit)
+
+    async def asearch_hybrid(
+        self,
+        vector: Sequence[float],
+        sparse: SparseQuery,
+        match: Dict[str, Any],
+        limit: int
+    ) -> Tuple[List[SearchHit], List[SearchHit]]:
+        """Dense and sparse top-`limit` hits in one call, for rank fusion by the caller."""
+        raise NotImplementedError(f"{self.name} vector store has no sparse vectors")
+
+    async def ascroll(
+        self,
+        match: Optional[Dict[str, Any]] = None,
+        limit: int = 100,
+        offset: Any = None,
+        with_payload: Union[bool, List[str]] = True
+    ) -> Tuple[List[SearchHit], Any]:
+        return await asyncio.to_thread(self.scroll, match, limit, offset, with_payload)
+
+    async def adelete(self, match: Dict[str, Any], exclude: Optional[Dict[str, Any]] = None):
+        await asyncio.to_thread(self.delete, match, exclude)
+
+    async def aclose(self):
+        await asyncio.to_thread(self.close)
+
+
+# =============================================================================
+# Qdrant
+# =============================================================================
+
+class QdrantVectorStore(VectorStore):
+    """The KnowMe_chunks collection on a Qdrant server, via the shared sync and async clients."""
+
+    name = "qdrant"
+
+    def __init__(
+        self,
+        client_factory: Callable[[], Any],
+        async_client_factory: Callable[[], Any],
+        collection_name: str = "KnowMe_chunks"
+    ):
+        self._client_factory = client_factory
+        self._async_client_factory = async_client_factory
+        self.collection_name = collection_name
+        self._sparse: Optional[bool] = None
+
+    def open(self):
+        self._client_factory()
+        self._async_client_factory()
+
+    @staticmethod
+    def _filter(match: Optional[Dict[str, Any]], exclude: Optional[Dict[str, Any]] = None):
+        from qdrant_client.http.models import FieldCondition, Filter, MatchValue
+
+        def conditions(fields):
+            return [FieldCondition(key=k, match=MatchValue(value=v)) for k, v in (fields or {}).items()]
+
+        if not match and not exclude:
+            return None
+        return Filter(must=conditions(match) or None, must_not=conditions(exclude) or None)
+
+    @staticmethod
+    def _hit(point) -> SearchHit:
+        return SearchHit(id=point.id, score=float(getattr(point, "score", 0.0) or 0.0), payload=point.payload or {})
+
+    def _has_sparse(self, info) -> bool:
+        self._sparse = SPARSE_VECTOR_NAME in (info.config.params.sparse_vectors or {})
+        return self._sparse
+
+    @property
+    def supports_sparse(self) -> bool:
+        if self._sparse is None:
+            return self._has_sparse(self._client_factory().get_collection(self.collection_name))
+        return self._sparse
+
+    async def asupports_sparse(self) -> bool:
+        if self._sparse is None:
+            return self._has_sparse(await self._async_client_factory().get_collection(self.collection_name))
+        return self._sparse
+
+    def upsert(self, points: Sequence[VectorPoint]):
+        from qdrant_client.http.models import PointStruct, SparseVector
+
+        sparse = self.supports_sparse
+        structs = []
+        for point in points:
+            vector: Any = point.vector
+            if sparse and point.sparse is not None:
+                indices, values = point.sparse
+                vector = {"": point.vector, SPARSE_VECTOR_NAME: SparseVector(indices=indices, values=values)}
+            structs.append(PointStruct(id=point.id, vector=vector, payload=point.payload))
+        with self._timed("upsert"):
+            self._client_factory().upsert(collection_name=self.collection_name, points=structs)
+        VECTOR_STORE_POINTS.labels(self.name).inc(len(structs))
+
+    def search(self, vector: Sequence[float], match: Dict[str, Any], limit: int) -> List[SearchHit]:
+        from RAG.collection_config import search_params
+
+        with self._timed("search"):
+            hits = self._client_factory().search(
+                collection_name=self.collection_name,
+                query_vector=list(vector),
+                query_filter=self._filter(match),
+                search_params=search_params(),
+                limit=limit
+            )
+        return [self._hit(hit) for hit in hits]
+
+    async def asearch(self, vector: Sequence[float], match: Dict[str, Any], limit: int) -> List[SearchHit]:
+        from RAG.collection_config import search_params
+
+        with self._timed("search"):
+            hits = await self._async_client_factory().search(
+                collection_name=self.collection_name,
+                query_vector=list(vector),
+                query_filter=self._filter(match),
+                search_params=search_params(),
+                limit=limit
+            )
+        return [self._hit(hit) for hit in hits]
+
+    async def asearch_hybrid(
+        self,
+        vector: Sequence[float],
+        sparse: SparseQuery,
+        match: Dict[str, Any],
+        limit: int
+    ) -> Tuple[List[SearchHit], List[SearchHit]]:
+        from qdrant_client.http.models import QueryRequest, SparseVector
+        from RAG.collection_config import search_params
+
+        search_filter = self._filter(match)
+        requests = [QueryRequest(
+            query=list(vector),
+            filter=search_filter,
+            params=search_params(),
+            limit=limit,
+            with_payload=True
+        )]
+        indices, values = sparse
+        if indices:
+            requests.append(QueryRequest(
+                query=SparseVector(indices=indices, values=values),
+                using=SPARSE_VECTOR_NAME,
+                filter=search_filter,
+                limit=limit,
+                with_payload=True
+            ))
+
+        # One round trip for both retrievers
+        with self._timed("search_hybrid"):
+            responses = await self._async_client_factory().query_batch_points(
+                collection_name=self.collection_name,
+                requests=requests
+            )
+        dense_hits = [self._hit(p) for p in responses[0].points]
+        sparse_hits = [self._hit(p) for p in responses[1].points] if len(responses) > 1 else []
+        return dense_hits, sparse_hits
+
+    def scroll(self, match=None, limit=100, offset=None, with_payload=True):
+        with self._timed("scroll"):
+            points, next_offset = self._client_factory().scroll(
+                collection_name=self.collection_name,
+                scroll_filter=self._filter(match),
+                limit=limit,
+                offset=offset,
+                with_payload=with_payload,
+                with_vectors=False
+            )
+        return [self._hit(p) for p in points], next_offset
+
+    async def ascroll(self, match=None, limit=100, offset=None, with_payload=True):
+        with self._timed("scroll"):
+            points, next_offset = await self._async_client_factory().scroll(
+                collection_name=self.collection_name,
+                scroll_filter=self._filter(match),
+                limit=limit,
+                offset=offset,
+                with_payload=with_payload,
+                with_vectors=False
+            )
+        return [self._hit(p) for p in points], next_offset
+
+    def delete(self, match: Dict[str, Any], exclude: Optional[Dict[str, Any]] = None):
+        with self._timed("delete"):
+            self._client_factory().delete(
+                collection_name=self.collection_name,
+                points_selector=self._filter(match, exclude)
+            )
+
+    async def adelete(self, match: Dict[str, Any], exclude: Optional[Dict[str, Any]] = None):
+        with self._timed("delete"):
+            await self._async_client_factory().delete(
+                collection_name=self.collection_name,
+                points_selector=self._filter(match, exclude)
+            )
+
+    async def aclose(self):
+        # The shared clients are closed by their owner (RAG.embedding_and_store)
+        pass
+
+
+# =============================================================================
+# Embedded (NumPy + memmap + SQLite)
+# =============================================================================
+
+def _lock_directory(directory: str):
+    """Exclusive, non-blocking lock on `directory`/store.lock, held until the returned file is closed."""
+    lock_file = open(os.path.join(directory, "store.lock"), "a+")
+    try:
+        if os.name == "nt":
+            import msvcrt
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        raise RuntimeError(
+            f"Embedded vector store at {directory} is already open in another process; "
+            "it supports a single process (run one worker, or use VECTOR_STORE_BACKEND=qdrant)"
+        )
+    return lock_file
+
+
+class EmbeddedVectorStore(VectorStore):
+    """
+    In-process vector store: brute-force cosine search over a float16 memmap.
+
+    Vectors are L2-normalized on write, so search is one matrix-vector product over
+    the candidate rows. Rows are selected through in-memory inverted indexes on
+    FILTER_FIELDS, so a user's search only touches that user's vectors. Payloads
+    live in SQLite and are read only for the returned hits. The vector file grows
+    by doubling; deleted rows are reused.
+
+    With `resident=True` a float32 copy of the matrix is kept in RAM as well:
+    twice the memory of float32 alone, but search skips the per-query float16
+    conversion, which dominates latency without F16C-accelerated NumPy.
+
+    Single-process only: the slot allocator and indexes live in this process's
+    memory, so a second writer would overwrite rows. Opening takes an exclusive
+    lock on `store.lock` and raises if another process (a second uvicorn worker,
+    the backfill CLI, ...) already has the directory open.
+    """
+
+    name = "embedded"
+    FILTER_FIELDS = ("user_id", "source", "doc_hash")
+
+    def __init__(self, directory: str, dim: int, initial_capacity: int = 1024, resident: bool = True):
+        self.directory = directory
+        self.dim = dim
+        self.resident = resident
+        self._resident: Optional[np.ndarray] = None
+        os.makedirs(directory, exist_ok=True)
+        self._lock_file = _lock_directory(directory)
+        self._vectors_path = os.path.join(directory, f"vectors_{dim}_float16.bin")
+        self._lock = threading.RLock()
+
+        row_bytes = dim * np.dtype(np.float16).itemsize
+        existing_rows = os.path.getsize(self._vectors_path) // row_bytes if os.path.exists(self._vectors_path) else 0
+        self._capacity = max(existing_rows, initial_capacity, 1)
+        self._open_vectors(self._capacity)
+
+        self._conn = sqlite3.connect(os.path.join(directory, "points.db"), check_same_thread=False)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS points (
+                id TEXT PRIMARY KEY,
+                slot INTEGER NOT NULL UNIQUE,
+                user_id TEXT,
+                source TEXT,
+                doc_hash TEXT,
+                payload TEXT NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_points_user_source ON points (user_id, source)")
+        self._conn.commit()
+
+        # slot -> id, slot -> filter fields, id -> slot, and field -> value -> slots
+        self._ids: List[Optional[str]] = []
+        self._fields: List[Optional[Dict[str, Any]]] = []
+        self._slot_of: Dict[str, int] = {}
+        self._index: Dict[str, Dict[Any, Set[int]]] = {f: {} for f in self.FILTER_FIELDS}
+        rows = self._conn.execute("SELECT id, slot, user_id, source, doc_hash FROM points").fetchall()
+        for point_id, slot, *values in rows:
+            self._track(point_id, slot, dict(zip(self.FILTER_FIELDS, values)))
+        self._free = [slot for slot, point_id in enumerate(self._ids) if point_id is None]
+        logger.info(f"Embedded vector store opened at {directory} with {len(self._slot_of)} points")
+
+    # -------------------------------------------------------------------------
+    # Storage helpers
+    # -------------------------------------------------------------------------
+    def _open_vectors(self, capacity: int):
+        if os.path.exists(self._vectors_path):
+            with open(self._vectors_path, "r+b") as f:
+                f.truncate(capacity * self.dim * np.dtype(np.float16).itemsize)
+            mode = "r+"
+        else:
+            mode = "w+"
+        self._vectors = np.memmap(self._vectors_path, dtype=np.float16, mode=mode, shape=(capacity, self.dim))
+        if self.resident:
+            self._resident = np.asarray(self._vectors, dtype=np.float32)
+
+    def _grow(self, needed: int):
+        capacity = self._capacity
+        while capacity < needed:
+            capacity *= 2
+        if capacity != self._capacity:
+            self._vectors.flush()
+            del self._vectors
+            self._open_vectors(capacity)
+            self._capacity = capacity
+
+    def _track(self, point_id: str, slot: int, fields: Dict[str, Any]):
+        while len(self._ids) <= slot:
+            self._ids.append(None)
+            self._fields.append(None)
+        self._ids[slot] = point_id
+        self._fields[slot] = fields
+        self._slot_of[point_id] = slot
+        for name in self.FILTER_FIELDS:
+            self._index[name].setdefault(fields.get(name), set()).add(slot)
+
+    def _untrack(self, slot: int):
+        point_id, fields = self._ids[slot], self._fields[slot] or {}
+        self._ids[slot] = None
+        self._fields[slot] = None
+        self._slot_of.pop(point_id, None)
+        for name in self.FILTER_FIELDS:
+            slots = self._index[name].get(fields.get(name))
+            if slots is not None:
+                slots.discard(slot)
+                if not slots:
+                    del self._index[name][fields.get(name)]
+
+    def _payloads(self, slots: Sequence[int]) -> Dict[int, Dict[str, Any]]:
+        if not slots:
+            return {}
+        rows = self._conn.execute(
+            f"SELECT slot, payload FROM points WHERE slot IN ({','.join('?' * len(slots))})", list(slots)
+        ).fetchall()
+        return {slot: json.loads(payload) for slot, payload in rows}
+
+    def _matching_slots(self, match: Optional[Dict[str, Any]], exclude: Optional[Dict[str, Any]] = None) -> Set[int]:
+        for name in list(match or {}) + list(exclude or {}):
+            if name not in self.FILTER_FIELDS:
+                raise ValueError(f"Embedded vector store can only filter on {self.FILTER_FIELDS}, not '{name}'")
+        if match:
+            sets = [self._index[name].get(value, set()) for name, value in match.items()]
+            slots = set.intersection(*sorted(sets, key=len)) if sets else set()
+        else:
+            slots = set(self._slot_of.values())
+        for name, value in (exclude or {}).items():
+            # must_not semantics: drop points whose field equals the value
+            slots = slots - self._index[name].get(value, set())
+        return slots
+
+    # -------------------------------------------------------------------------
+    # VectorStore interface
+    # -------------------------------------------------------------------------
+    def upsert(self, points: Sequence[VectorPoint]):
+        if not points:
+            return
+        with self._timed("upsert"), self._lock:
+            rows = []
+            for point in points:
+                slot = self._slot_of.get(point.id)
+                if slot is not None:
+                    self._untrack(slot)
+                elif self._free:
+                    slot = self._free.pop()
+                else:
+                    slot = len(self._ids)
+                    self._grow(slot + 1)
+
+                vector = np.asarray(point.vector, dtype=np.float32)
+                norm = np.linalg.norm(vector)
+                vector = vector / norm if norm else vector
+                self._vectors[slot] = vector
+                if self._resident is not None:
+                    self._resident[slot] = self._vectors[slot]
+
+                fields = {name: point.payload.get(name) for name in self.FILTER_FIELDS}
+                self._track(point.id, slot, fields)
+                rows.append((
+                    point.id, slot, fields["user_id"], fields["source"], fields["doc_hash"],
+                    json.dumps(point.payload, ensure_ascii=False)
+                ))
+
+            # Vectors reach disk before the rows that point at them
+            self._vectors.flush()
+            self._conn.executemany("INSERT OR REPLACE INTO points VALUES (?, ?, ?, ?, ?, ?)", rows)
+            self._conn.commit()
+        VECTOR_STORE_POINTS.labels(self.name).inc(len(rows))
+
+    def search(self, vector: Sequence[float], match: Dict[str, Any], limit: int) -> List[SearchHit]:
+        query = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm:
+            query = query / norm
+
+        with self._timed("search"), self._lock:
+            candidates = self._matching_slots(match)
+            if not candidates or limit <= 0:
+                return []
+            slots = np.fromiter(candidates, dtype=np.int64, count=len(candidates))
+            slots.sort()
+            if self._resident is None:
+                scores = self._vectors[slots].astype(np.float32) @ query
+            elif len(slots) * 4 >= len(self._ids):
+                # Most rows match: scoring every row beats gathering the candidates first
+                scores = (self._resident[:len(self._ids)] @ query)[slots]
+            else:
+                scores = self._resident[slots] @ query
+
+            k = min(limit, len(slots))
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            top_slots = [int(slots[i]) for i in top]
+            payloads = self._payloads(top_slots)
+            return [
+                SearchHit(id=self._ids[slot], score=float(scores[i]), payload=payloads.get(slot, {}))
+                for slot, i in zip(top_slots, top)
+            ]
+
+    def scroll(self, match=None, limit=100, offset=None, with_payload=True):
+        for name in match or {}:
+            if name not in self.FILTER_FIELDS:
+                raise ValueError(f"Embedded vector store can only filter on {self.FILTER_FIELDS}, not '{name}'")
+        where = [f"{name} = ?" for name in match or {}]
+        params: List[Any] = list((match or {}).values())
+        if offset is not None:
+            where.append("id > ?")
+            params.append(offset)
+        sql = "SELECT id, payload FROM points"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY id LIMIT ?"
+        params.append(limit + 1)
+
+        with self._timed("scroll"), self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+
+        next_offset = rows[limit - 1][0] if len(rows) > limit else None
+        hits = []
+        for point_id, payload in rows[:limit]:
+            data = json.loads(payload) if with_payload else {}
+            if isinstance(with_payload, list):
+                data = {k: v for k, v in data.items() if k in with_payload}
+            hits.append(SearchHit(id=point_id, score=0.0, payload=data))
+        return hits, next_offset
+
+    def delete(self, match: Dict[str, Any], exclude: Optional[Dict[str, Any]] = None):
+        with self._timed("delete"), self._lock:
+            slots = self._matching_slots(match, exclude)
+            if not slots:
+                return
+            ids = [self._ids[slot] for slot in slots]
+            for slot in slots:
+                self._untrack(slot)
+                self._free.append(slot)
+            for start in range(0, len(ids), 500):
+                part = ids[start:start + 500]
+                self._conn.execute(f"DELETE FROM points WHERE id IN ({','.join('?' * len(part))})", part)
+            self._conn.commit()
+            logger.info(f"Deleted {len(ids)} points from embedded vector store")
+
+    def close(self):
+        with self._lock:
+            self._vectors.flush()
+            self._conn.close()
+            # Closing the file releases the process lock
+            self._lock_file.close()
+
+    def count(self) -> int:
+        return len(self._slot_of)
@@ -1,9 +1,13 @@
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import Optional, List, Dict, Any
-from services.gemini_service import gemini_service
+from typing import Optional, List, Dict, Any, AsyncIterator
+import json
+import logging
+from services.gemini_service import get_gemini_service
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
 
 class ChatRequest(BaseModel):
     message: str
@@ -19,7 +23,7 @@ async def chat(request: ChatRequest):
     """Chat endpoint with Gemini function calling"""
     try:
         # Get response from Gemini (no history for stateless operation)
-        response = await gemini_service.chat(
+        response = await get_gemini_service().chat(
             user_message=request.message,
             user_id=request.user_id or "anonymous"
         )
@@ -33,3 +37,36 @@ async def chat(request: ChatRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Chat error: {str(e)}")
 
+
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    """Format one server-sent event."""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+async def _chat_event_stream(request: ChatRequest) -> AsyncIterator[str]:
+    try:
+        async for item in get_gemini_service().chat_stream(
+            user_message=request.message,
+            user_id=request.user_id or "anonymous"
+        ):
+            yield _sse(item["event"], item["data"])
+    except Exception as e:
+        # Headers are already sent, so errors are reported in-band
+        logger.exception("Streaming chat failed")
+        yield _sse("error", {"detail": f"Chat error: {str(e)}"})
+
+
+@router.post("/chat/stream")
+async def chat_stream(request: ChatRequest):
+    """
+    Streaming chat endpoint (server-sent events).
+
+    Emits `tool_call_start` / `tool_call_end` while tools run, `token` deltas of
+    the answer as Gemini generates it, and a final `done` event with the same
+    text/tool_calls/usage as /chat.
+    """
+    return StreamingResponse(
+        _chat_event_stream(request),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
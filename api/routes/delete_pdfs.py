@@ -1,55 +1,49 @@
 from fastapi import APIRouter, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from typing import Dict
-import os
-from qdrant_client import QdrantClient
-from qdrant_client.http import models
-from qdrant_client.http.models import Filter, FieldCondition, MatchValue
+from RAG.embedding_and_store import get_vector_store
+from RAG.document_registry import get_document_registry
+from src.cache import index_generations
+from src.utils import source_name
 
 router = APIRouter()
-client = QdrantClient()
 
 @router.delete("/pdfs/{pdf_name}")
 async def delete_pdf(pdf_name: str, user_id: str = "anonymous") -> Dict[str, str]:
     """
-    Delete a PDF's associated chunks from Qdrant by its original filename.
+    Delete a PDF's associated chunks from the vector store and its catalog entry by its original filename.
+
+    A catalog entry without chunks (e.g. left by a failed ingestion) is removed too.
     """
     try:
-        # Normalize pdf_name (remove path prefixes, ensure consistent extension)
-        pdf_name = os.path.basename(pdf_name.strip())
+        # Same normalization as at upload (remove path prefixes)
+        pdf_name = source_name(pdf_name)
         if not pdf_name:
             raise HTTPException(status_code=400, detail="Invalid PDF name")
 
-        # Check if chunks exist in Qdrant
-        search_result = client.scroll(
-            collection_name="KnowMe_chunks",
-            scroll_filter=Filter(
-                must=[
-                    FieldCondition(key="source", match=MatchValue(value=pdf_name)),
-                    FieldCondition(key="user_id", match=MatchValue(value=user_id))
-                ]
-            ),
-            limit=1
-        )
+        store = get_vector_store()
+        match = {"source": pdf_name, "user_id": user_id}
+
+        # Check if chunks exist in the vector store
+        search_result = await store.ascroll(match=match, limit=1, with_payload=False)
         chunks_exist = len(search_result[0]) > 0
 
-        if not chunks_exist:
-            raise HTTPException(status_code=404, detail=f"No PDF or chunks found for: {pdf_name}")
+        # Delete chunks from the vector store, then the catalog entry
+        if chunks_exist:
+            await store.adelete(match=match)
+        registry = await run_in_threadpool(get_document_registry)
+        row_deleted = await run_in_threadpool(registry.delete, user_id, pdf_name)
 
-        # Delete chunks from Qdrant
-        client.delete(
-            collection_name="KnowMe_chunks",
-            points_selector=Filter(
-                must=[
-                    FieldCondition(key="source", match=MatchValue(value=pdf_name)),
-                    FieldCondition(key="user_id", match=MatchValue(value=user_id))
-                ]
-            )
-        )
+        if not chunks_exist and not row_deleted:
+            raise HTTPException(status_code=404, detail=f"No PDF or chunks found for: {pdf_name}")
+        await run_in_threadpool(index_generations.bump, user_id)
 
         return {
-            "message": f"Successfully deleted all chunks for PDF '{pdf_name}' from Qdrant."
+            "message": f"Successfully deleted all chunks for PDF '{pdf_name}' from the vector store."
         }
 
+    except HTTPException:
+        raise
     except ValueError as ve:
         raise HTTPException(status_code=400, detail=f"Invalid input: {str(ve)}")
     except Exception as e:
@@ -1,26 +1,36 @@
-from fastapi import APIRouter, HTTPException
-from qdrant_client import QdrantClient
-from qdrant_client.http import models
-from qdrant_client.http.models import Filter, FieldCondition, MatchValue
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from RAG.document_registry import get_document_registry
 
 router = APIRouter()
-client = QdrantClient()
 
 @router.get("/pdfs/")
-async def list_pdfs(user_id: str = "anonymous"):
-    '''Gets the name of Pdf files uploaded and stored in qdrant db for a specific user.'''
+async def list_pdfs(
+    user_id: str = "anonymous",
+    limit: int = Query(50, ge=1, le=500),
+    offset: int = Query(0, ge=0)
+):
+    '''Lists a user's uploaded PDFs from the document catalog (never scans vector payloads).'''
     try:
-        res = client.scroll(
-            collection_name="KnowMe_chunks",
-            limit=1000,
-            with_payload=True,
-            scroll_filter=Filter(must=[FieldCondition(key="user_id", match=MatchValue(value=user_id))])
-        )
-        pdfs = set()
-        for point in res[0]:
-            source = point.payload.get("source")
-            if source:
-                pdfs.add(source)
-        return {"pdfs": list(pdfs)}
+        registry = await run_in_threadpool(get_document_registry)
+        documents = await run_in_threadpool(registry.list, user_id, limit, offset)
+        total = await run_in_threadpool(registry.count, user_id)
+        return {
+            "pdfs": [doc["source"] for doc in documents],
+            "documents": [
+                {
+                    "filename": doc["source"],
+                    "doc_hash": doc["doc_hash"],
+                    "page_count": doc["page_count"],
+                    "chunk_count": doc["chunk_count"],
+                    "size_bytes": doc["size_bytes"],
+                    "ingested_at": doc["ingested_at"]
+                }
+                for doc in documents
+            ],
+            "total": total,
+            "limit": limit,
+            "offset": offset
+        }
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
@@ -1,5 +1,11 @@
 from fastapi import APIRouter
 from typing import Dict
+from services.lifecycle import startup_timings
+from services.answer_cache import get_answer_cache
+from services.webhook_outbox import get_webhook_outbox
+from services.rate_limiter import gemini_rate_limiter
+from src.logging_setup import dropped_records
+from fastapi.concurrency import run_in_threadpool
 
 router = APIRouter()
 
@@ -11,7 +17,12 @@ async def health_check() -> Dict:
         "status": "healthy",
         "services": {
             "api": "operational"
-        }
+        },
+        "startup": startup_timings,
+        "answer_cache": get_answer_cache().stats(),
+        "webhook_outbox": await run_in_threadpool(lambda: get_webhook_outbox().stats()),
+        "gemini_rate_limiter": gemini_rate_limiter.stats(),
+        "logging": {"dropped_records": dropped_records()}
     }
 
 
@@ -0,0 +1,19 @@
+from fastapi import APIRouter, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from typing import Dict, Any
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from services.ingestion_jobs import ingestion_jobs
+
+router = APIRouter()
+
+
+@router.get("/ingest-jobs/{job_id}")
+async def get_ingest_job(job_id: str) -> Dict[str, Any]:
+    """Report progress (pages parsed, chunks embedded, points upserted) and result of an ingestion job."""
+    job = await run_in_threadpool(ingestion_jobs.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Ingestion job not found: {job_id}")
+    return job.to_dict()
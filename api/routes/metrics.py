@@ -0,0 +1,16 @@
+from fastapi import APIRouter, Response
+from fastapi.concurrency import run_in_threadpool
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+
+from services.webhook_outbox import get_webhook_outbox
+from src.metrics import metrics_registry
+
+router = APIRouter()
+
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics() -> Response:
+    """Prometheus scrape endpoint: per-stage latency histograms and throughput counters (all workers)"""
+    await run_in_threadpool(lambda: get_webhook_outbox().update_queue_depth_metric())
+    content = await run_in_threadpool(lambda: generate_latest(metrics_registry()))
+    return Response(content=content, media_type=CONTENT_TYPE_LATEST)
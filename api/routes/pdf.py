@@ -1,67 +1,53 @@
 from fastapi import APIRouter, UploadFile, File, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from typing import Optional
 import os
+import shutil
 import tempfile
 import sys
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
-from RAG.parsing_and_chunking import extract, chunk_pdfplumber_parsed_data
-from RAG.embedding_and_store import embed_and_store_pdf
+from services.ingestion_jobs import ingestion_jobs
+from src.utils import source_name
 
 router = APIRouter()
 
 
-@router.post("/upload-pdf")
+def _save_upload(file: UploadFile) -> str:
+    """Copy the upload to a temp file in blocks and return its path."""
+    with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp_file:
+        shutil.copyfileobj(file.file, tmp_file)
+        return tmp_file.name
+
+
+@router.post("/upload-pdf", status_code=202)
 async def upload_pdf(
     file: UploadFile = File(...),
     user_id: Optional[str] = "anonymous"
 ):
-    """Upload and process PDF file for RAG"""
+    """Upload a PDF and enqueue it for background ingestion into RAG"""
     try:
+        # Clients may send a path; the catalog, chunk payloads and delete route all use the bare name
+        filename = source_name(file.filename or "")
+        
         # Validate file type
-        if not file.filename.endswith('.pdf'):
+        if not filename.endswith('.pdf'):
             raise HTTPException(status_code=400, detail="Only PDF files are supported")
         
-        # Save uploaded file temporarily
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp_file:
-            content = await file.read()
-            tmp_file.write(content)
-            tmp_path = tmp_file.name
+        tmp_path = await run_in_threadpool(_save_upload, file)
         
-        try:
-            # Extract PDF content
-            extraction_result = extract(tmp_path)
-            
-            # Convert to dict format for chunking
-            pages_dict = []
-            for page in extraction_result.pages:
-                pages_dict.append({
-                    "text": page.text,
-                    "metadata": {
-                        "page_number": page.page_number,
-                        "source": file.filename,
-                        "type": "text"
-                    }
-                })
-            
-            # Chunk the extracted content
-            chunks = chunk_pdfplumber_parsed_data(pages_dict)
-            
-            # Embed and store in Qdrant
-            stored_points = embed_and_store_pdf(chunks, user_id)
-            
-            return {
-                "message": "PDF processed successfully",
-                "chunks_stored": len(stored_points),
-                "filename": file.filename,
-                "user_id": user_id
-            }
+        # The job owns tmp_path from here and removes it when done
+        job = await run_in_threadpool(ingestion_jobs.submit, tmp_path, filename, user_id)
         
-        finally:
-            # Clean up temp file
-            if os.path.exists(tmp_path):
-                os.unlink(tmp_path)
+        return {
+            "message": "PDF queued for processing",
+            "job_id": job.id,
+            "status": job.status,
+            "filename": filename,
+            "user_id": user_id
+        }
     
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing PDF: {str(e)}")
-
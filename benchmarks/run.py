@@ -0,0 +1,376 @@
+"""
+End-to-end ingestion and retrieval benchmarks.
+
+    python -m benchmarks.run run --pages 30 --sizes 1000,10000,50000
+    python -m benchmarks.run compare benchmarks/results/a.json benchmarks/results/b.json
+
+Runs against a generated PDF corpus (see benchmarks.synthetic_pdf) and the embedded
+vector store in a temporary directory, so no Qdrant server or API keys for external
+tools are needed. Measures:
+
+- extract:    pages/sec per page kind (text, table, scanned) and for a mixed document
+- chunking:   chunks/sec for chunk_pdfplumber_parsed_data
+- embedding:  vectors/sec for the configured embedder (embedding cache disabled)
+- ingest:     chunks/sec for embed_and_store_pdf (embedding + upsert)
+- upsert:     points/sec into the vector store at each corpus size
+- rag_search: p50/p95/p99 latency at each corpus size, end to end and store-only
+
+Results are written as JSON (default: benchmarks/results/bench-<timestamp>.json).
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import random
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import settings
+from benchmarks.synthetic_pdf import PAGE_KINDS, mixed_kinds, write_pdf
+
+logger = logging.getLogger(__name__)
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+BENCH_USER = "benchmark"
+
+
+def _percentiles(samples_ms: List[float]) -> Dict[str, float]:
+    values = np.asarray(samples_ms, dtype=np.float64)
+    return {
+        "p50_ms": round(float(np.percentile(values, 50)), 3),
+        "p95_ms": round(float(np.percentile(values, 95)), 3),
+        "p99_ms": round(float(np.percentile(values, 99)), 3),
+        "mean_ms": round(float(values.mean()), 3),
+    }
+
+
+def _rate(count: int, seconds: float) -> float:
+    return round(count / seconds, 2) if seconds > 0 else 0.0
+
+
+def _timed(fn: Callable[[], Any]) -> Tuple[Any, float]:
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(RESULTS_DIR), capture_output=True, text=True, timeout=10
+        ).stdout.strip() or None
+    except Exception:
+        return None
+
+
+# =============================================================================
+# Stages
+# =============================================================================
+
+def bench_extract(workdir: str, pages: int, workers: Optional[int]) -> Tuple[Dict[str, Any], list]:
+    """Pages/sec per page kind and for a mixed document; returns the mixed document's pages."""
+    from RAG.parsing_and_chunking import extract
+
+    results: Dict[str, Any] = {}
+    for kind in PAGE_KINDS:
+        if kind == "scanned" and not shutil.which("tesseract"):
+            # Without OCR every page is empty and extraction falls back to LLaMAParse
+            results[kind] = {"skipped": "tesseract not installed"}
+            continue
+        path = os.path.join(workdir, f"{kind}.pdf")
+        write_pdf(path, [kind] * pages, seed=1)
+        extracted = extract(path, workers=workers)
+        results[kind] = {
+            "pages": extracted.total_pages,
+            "pages_with_text": len(extracted.pages),
+            "seconds": round(extracted.elapsed_seconds, 3),
+            "pages_per_sec": round(extracted.pages_per_second, 2),
+        }
+
+    kinds = mixed_kinds(pages, seed=2)
+    if not shutil.which("tesseract"):
+        kinds = [kind for kind in kinds if kind != "scanned"] or ["text"]
+    path = os.path.join(workdir, "mixed.pdf")
+    write_pdf(path, kinds, seed=2)
+    extracted = extract(path, workers=workers)
+    results["mixed"] = {
+        "pages": extracted.total_pages,
+        "kinds": {kind: kinds.count(kind) for kind in PAGE_KINDS},
+        "seconds": round(extracted.elapsed_seconds, 3),
+        "pages_per_sec": round(extracted.pages_per_second, 2),
+    }
+    return results, extracted.pages
+
+
+def bench_chunking(pages: list, repeat: int) -> Tuple[Dict[str, Any], List[dict]]:
+    from src.utils import IngestionStats
+    from RAG.pipeline import _page_dicts
+    from RAG.parsing_and_chunking import chunk_pdfplumber_parsed_data
+
+    page_dicts = list(_page_dicts(pages, "mixed.pdf", IngestionStats(filename="mixed.pdf", user_id=BENCH_USER)))
+    chunks: List[dict] = []
+    elapsed = 0.0
+    for _ in range(repeat):
+        chunks, seconds = _timed(lambda: chunk_pdfplumber_parsed_data(page_dicts))
+        elapsed += seconds
+    return {
+        "pages": len(page_dicts),
+        "chunks": len(chunks),
+        "repeat": repeat,
+        "seconds": round(elapsed, 4),
+        "chunks_per_sec": _rate(len(chunks) * repeat, elapsed),
+    }, chunks
+
+
+def bench_embedding(chunks: List[dict]) -> Tuple[Dict[str, Any], np.ndarray]:
+    from RAG.embedding_and_store import get_embed_model
+
+    model, load_seconds = _timed(get_embed_model)
+    texts = [chunk["page_content"] for chunk in chunks]
+    model.encode(texts[:settings.EMBED_BATCH_SIZE], batch_size=settings.EMBED_BATCH_SIZE)  # warm-up
+    vectors, seconds = _timed(lambda: model.encode(texts, batch_size=settings.EMBED_BATCH_SIZE))
+    return {
+        "model": model.name,
+        "dim": model.dim,
+        "load_seconds": round(load_seconds, 3),
+        "vectors": len(texts),
+        "seconds": round(seconds, 3),
+        "vectors_per_sec": _rate(len(texts), seconds),
+    }, np.asarray(vectors, dtype=np.float32)
+
+
+def bench_ingest(chunks: List[dict]) -> Dict[str, Any]:
+    from RAG.embedding_and_store import embed_and_store_pdf
+
+    points, seconds = _timed(lambda: embed_and_store_pdf(chunks, user_id=f"{BENCH_USER}-ingest", doc_hash="bench"))
+    return {"chunks": len(points), "seconds": round(seconds, 3), "chunks_per_sec": _rate(len(points), seconds)}
+
+
+def _synthetic_points(chunks: List[dict], vectors: np.ndarray, start: int, count: int, rng: np.random.Generator):
+    """Corpus rows beyond the real chunks: real vectors plus noise, with the source text copied."""
+    from RAG.vector_store import VectorPoint
+
+    points = []
+    for i in range(start, start + count):
+        base = i % len(chunks)
+        vector = vectors[base] if i < len(chunks) else vectors[base] + rng.normal(0, 0.05, vectors.shape[1]).astype(np.float32)
+        vector = vector / (np.linalg.norm(vector) or 1.0)
+        points.append(VectorPoint(
+            id=f"00000000-0000-4000-8000-{i:012d}",
+            vector=vector.tolist(),
+            payload={
+                "text": chunks[base]["page_content"],
+                "page": chunks[base]["metadata"].get("page_number", 1),
+                "source": f"bench-{i // 1000}.pdf",
+                "type": chunks[base]["metadata"].get("type", "text"),
+                "user_id": BENCH_USER,
+                "doc_hash": "bench",
+            },
+        ))
+    return points
+
+
+def _queries(chunks: List[dict], count: int, seed: int) -> List[Tuple[str, str]]:
+    """(query, expected substring) pairs built from invoice IDs present in the corpus."""
+    rng = random.Random(seed)
+    ids = sorted({m for chunk in chunks for m in re.findall(r"INV-2024-\d{4}", chunk["page_content"])})
+    if not ids:
+        return [(f"{rng.choice(['invoice', 'payment', 'refund'])} status report {i}", "") for i in range(count)]
+    templates = ["What is the status of invoice {}?", "Which customer is billed on {}?", "Find the record for {}"]
+    return [(rng.choice(templates).format(ident), ident) for ident in (rng.choice(ids) for _ in range(count))]
+
+
+def bench_retrieval(
+    chunks: List[dict],
+    vectors: np.ndarray,
+    sizes: List[int],
+    num_queries: int,
+    top_k: int
+) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """Grow the store through `sizes`, measuring upsert throughput and rag_search latency at each size."""
+    from RAG.embedding_and_store import get_vector_store
+    from src.cache import index_generations
+    from services import rag_service
+
+    store = get_vector_store()
+    rng = np.random.default_rng(0)
+    upsert_rows, search_rows = [], []
+    loaded = 0
+
+    for size in sorted(sizes):
+        # Upsert in the same batch size ingestion uses
+        new_points = _synthetic_points(chunks, vectors, loaded, size - loaded, rng)
+        start = time.perf_counter()
+        for i in range(0, len(new_points), settings.UPSERT_BATCH_SIZE):
+            store.upsert(new_points[i:i + settings.UPSERT_BATCH_SIZE])
+        seconds = time.perf_counter() - start
+        upsert_rows.append({
+            "corpus_size": size,
+            "points": len(new_points),
+            "seconds": round(seconds, 3),
+            "points_per_sec": _rate(len(new_points), seconds),
+        })
+        loaded = size
+        index_generations.bump(BENCH_USER)
+
+        queries = _queries(chunks, num_queries + 1, seed=size)
+        rag_service.query_embedding_cache.clear()
+        rag_service.rag_result_cache.clear()
+
+        async def run_queries():
+            await rag_service.rag_search(queries[0][0], top_k, BENCH_USER)  # warm-up
+            latencies, hits = [], 0
+            for query, expected in queries[1:]:
+                start = time.perf_counter()
+                result = await rag_service.rag_search(query, top_k, BENCH_USER)
+                latencies.append((time.perf_counter() - start) * 1000)
+                if expected and any(expected in r["text"] for r in result.get("results", [])):
+                    hits += 1
+            return latencies, hits
+
+        latencies, hits = asyncio.run(run_queries())
+
+        # Store-only latency, isolating search from query embedding and result formatting
+        query_vectors = [vectors[i % len(vectors)] for i in range(num_queries)]
+        store_latencies = []
+        for vector in query_vectors:
+            start = time.perf_counter()
+            store.search(vector, {"user_id": BENCH_USER}, top_k)
+            store_latencies.append((time.perf_counter() - start) * 1000)
+
+        search_rows.append({
+            "corpus_size": size,
+            "queries": num_queries,
+            "top_k": top_k,
+            "hit_rate": round(hits / num_queries, 3) if num_queries else 0.0,
+            "rag_search": _percentiles(latencies),
+            "store_search": _percentiles(store_latencies),
+        })
+        print(f"corpus_size={size}: rag_search {search_rows[-1]['rag_search']}")
+
+    return upsert_rows, search_rows
+
+
+# =============================================================================
+# Entry points
+# =============================================================================
+
+def run(args) -> Dict[str, Any]:
+    workdir = tempfile.mkdtemp(prefix="knowme-bench-")
+    # Stand-in vector store and raw embedder throughput; set before first use
+    settings.VECTOR_STORE_BACKEND = "embedded"
+    settings.EMBEDDED_STORE_DIR = os.path.join(workdir, "vector_store")
+    settings.EMBEDDING_CACHE_ENABLED = False
+    # Index generation bumps (and any catalog writes) must not touch the real data/documents.db
+    settings.DOCUMENT_REGISTRY_PATH = os.path.join(workdir, "documents.db")
+
+    try:
+        report: Dict[str, Any] = {
+            "meta": {
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                "git_commit": _git_commit(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "cpu_count": os.cpu_count(),
+                "settings": {
+                    name: getattr(settings, name) for name in (
+                        "EMBEDDING_BACKEND", "EMBEDDING_MODEL", "EMBED_BATCH_SIZE", "UPSERT_BATCH_SIZE",
+                        "EXTRACT_WORKERS", "EXTRACT_PAGES_PER_TASK", "RAG_RETRIEVAL_MODE",
+                        "VECTOR_STORE_BACKEND", "EMBEDDED_STORE_RESIDENT",
+                    )
+                },
+                "pages": args.pages,
+            }
+        }
+        report["extract"], pages = bench_extract(workdir, args.pages, args.workers)
+        report["chunking"], chunks = bench_chunking(pages, args.chunk_repeat)
+        if not chunks:
+            raise RuntimeError("Synthetic corpus produced no chunks")
+        report["embedding"], vectors = bench_embedding(chunks)
+        report["ingest"] = bench_ingest(chunks)
+        report["upsert"], report["rag_search"] = bench_retrieval(
+            chunks, vectors, [int(s) for s in args.sizes.split(",")], args.queries, args.top_k
+        )
+        return report
+    finally:
+        from RAG.embedding_and_store import close_vector_store
+
+        asyncio.run(close_vector_store())
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def _flatten(value: Any, prefix: str = "") -> Dict[str, float]:
+    flat: Dict[str, float] = {}
+    if isinstance(value, dict):
+        for key, item in value.items():
+            if key != "meta":
+                flat.update(_flatten(item, f"{prefix}{key}."))
+    elif isinstance(value, list):
+        for item in value:
+            if isinstance(item, dict) and "corpus_size" in item:
+                flat.update(_flatten(item, f"{prefix}{item['corpus_size']}."))
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        flat[prefix.rstrip(".")] = float(value)
+    return flat
+
+
+def compare(baseline_path: str, candidate_path: str) -> List[Dict[str, Any]]:
+    """Per-metric change between two result files (positive pct = candidate is larger)."""
+    with open(baseline_path) as f:
+        baseline = _flatten(json.load(f))
+    with open(candidate_path) as f:
+        candidate = _flatten(json.load(f))
+    rows = []
+    for metric in sorted(baseline.keys() & candidate.keys()):
+        if not metric.endswith(("_per_sec", "_ms", "hit_rate")):
+            continue
+        old, new = baseline[metric], candidate[metric]
+        rows.append({
+            "metric": metric,
+            "baseline": old,
+            "candidate": new,
+            "change_pct": round((new - old) / old * 100, 1) if old else None,
+        })
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ingestion and retrieval benchmarks")
+    sub = parser.add_subparsers(dest="command", required=True)
+    run_cmd = sub.add_parser("run", help="Run the benchmark suite and write a JSON report")
+    run_cmd.add_argument("--pages", type=int, default=30, help="Pages per synthetic document")
+    run_cmd.add_argument("--workers", type=int, default=None, help="Extraction workers (default: the shared pool, EXTRACT_WORKERS or one per CPU)")
+    run_cmd.add_argument("--chunk-repeat", type=int, default=5)
+    run_cmd.add_argument("--sizes", default="1000,10000,50000", help="Comma-separated corpus sizes for retrieval")
+    run_cmd.add_argument("--queries", type=int, default=200)
+    run_cmd.add_argument("--top-k", type=int, default=5)
+    run_cmd.add_argument("--output", default=None, help="Output JSON path")
+    run_cmd.add_argument("--verbose", action="store_true", help="Keep INFO logs from the pipeline")
+    compare_cmd = sub.add_parser("compare", help="Compare two JSON reports")
+    compare_cmd.add_argument("baseline")
+    compare_cmd.add_argument("candidate")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO if getattr(args, "verbose", False) else logging.WARNING)
+    if args.command == "compare":
+        for row in compare(args.baseline, args.candidate):
+            change = "n/a" if row["change_pct"] is None else f"{row['change_pct']:+.1f}%"
+            print(f"{row['metric']:<48} {row['baseline']:>12.3f} -> {row['candidate']:>12.3f}  {change}")
+    else:
+        report = run(args)
+        output = args.output or os.path.join(RESULTS_DIR, f"bench-{time.strftime('%Y%m%d-%H%M%S')}.json")
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        with open(output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote benchmark results to {output}")
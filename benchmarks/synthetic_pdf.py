@@ -0,0 +1,225 @@
+"""
+Deterministic synthetic PDF corpus for benchmarks.
+
+Writes PDFs with three page kinds, using a minimal PDF writer (no extra dependencies
+beyond Pillow, which the OCR path already requires):
+
+- text:    dense paragraphs in a real text layer (pdfplumber fast path)
+- table:   ruled tables with a repeated header (table extraction + cross-page merging)
+- scanned: a JPEG image of rendered text with no text layer (OCR path)
+
+Paragraphs embed unique identifiers (e.g. "INV-2024-0042") so benchmark queries
+have known answers.
+"""
+import io
+import random
+from typing import List, Optional, Sequence, Tuple
+
+PAGE_WIDTH, PAGE_HEIGHT = 612, 792  # US Letter, in points
+PAGE_KINDS = ("text", "table", "scanned")
+
+_WORDS = (
+    "account balance budget contract customer delivery department invoice ledger "
+    "payment policy procurement quarter receipt refund region report revenue schedule "
+    "service shipment statement supplier tax total transfer vendor warehouse audit "
+    "approval compliance forecast inventory margin order pricing renewal subscription"
+).split()
+_TABLE_HEADER = ["Invoice", "Customer", "Region", "Amount", "Status"]
+_REGIONS = ["North", "South", "East", "West", "Central"]
+_STATUSES = ["Paid", "Pending", "Overdue", "Refunded"]
+
+
+def invoice_id(n: int) -> str:
+    return f"INV-2024-{n:04d}"
+
+
+def _sentence(rng: random.Random, ident: Optional[str] = None) -> str:
+    words = [rng.choice(_WORDS) for _ in range(rng.randint(8, 16))]
+    if ident:
+        words.insert(rng.randint(1, len(words) - 1), ident)
+    words[0] = words[0].capitalize()
+    return " ".join(words) + "."
+
+
+def paragraph_lines(rng: random.Random, first_id: int, width: int = 95, lines: int = 52) -> List[str]:
+    """Wrapped prose for one page, mentioning one invoice ID per sentence."""
+    text = " ".join(_sentence(rng, invoice_id(first_id + i)) for i in range(lines))
+    out, line = [], ""
+    for word in text.split():
+        if len(line) + len(word) + 1 > width:
+            out.append(line)
+            line = word
+            if len(out) == lines:
+                break
+        else:
+            line = f"{line} {word}".strip()
+    return out
+
+
+def table_rows(rng: random.Random, first_id: int, rows: int = 24) -> List[List[str]]:
+    return [
+        [
+            invoice_id(first_id + i),
+            f"{rng.choice(_WORDS).capitalize()} {rng.choice(_WORDS).capitalize()} Ltd",
+            rng.choice(_REGIONS),
+            f"{rng.uniform(100, 99999):.2f}",
+            rng.choice(_STATUSES),
+        ]
+        for i in range(rows)
+    ]
+
+
+# =============================================================================
+# Minimal PDF writer
+# =============================================================================
+
+def _escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def _text_stream(lines: Sequence[str], x: int = 50, y: int = 750, size: int = 9, leading: int = 13) -> bytes:
+    ops = [f"BT /F1 {size} Tf {leading} TL {x} {y} Td"]
+    ops.extend(f"({_escape(line)}) Tj T*" for line in lines)
+    ops.append("ET")
+    return "\n".join(ops).encode("latin-1", "replace")
+
+
+def _table_stream(rows: List[List[str]], x: int = 40, y: int = 740, row_height: int = 22) -> bytes:
+    col_widths = [100, 170, 80, 90, 92]
+    width = sum(col_widths)
+    ops = ["0.5 w"]
+    # Ruled grid, so pdfplumber's line-based table finder picks it up
+    for r in range(len(rows) + 1):
+        ops.append(f"{x} {y - r * row_height} m {x + width} {y - r * row_height} l S")
+    col_x = x
+    for w in col_widths + [0]:
+        ops.append(f"{col_x} {y} m {col_x} {y - len(rows) * row_height} l S")
+        col_x += w
+    ops.append("BT /F1 9 Tf")
+    for r, row in enumerate(rows):
+        col_x = x
+        for cell, w in zip(row, col_widths):
+            ops.append(f"1 0 0 1 {col_x + 4} {y - (r + 1) * row_height + 7} Tm ({_escape(cell)}) Tj")
+            col_x += w
+    ops.append("ET")
+    return "\n".join(ops).encode("latin-1", "replace")
+
+
+def _scanned_jpeg(lines: Sequence[str], dpi: int = 150) -> Tuple[bytes, int, int]:
+    from PIL import Image, ImageDraw, ImageFont
+
+    width, height = PAGE_WIDTH * dpi // 72, PAGE_HEIGHT * dpi // 72
+    image = Image.new("L", (width, height), color=255)
+    draw = ImageDraw.Draw(image)
+    try:
+        font = ImageFont.load_default(size=dpi // 6)
+    except TypeError:
+        # Pillow < 10.1: fixed-size bitmap font
+        font = ImageFont.load_default()
+    line_height = dpi // 4
+    for i, line in enumerate(lines[: (height - 2 * dpi) // line_height]):
+        draw.text((dpi // 2, dpi // 2 + i * line_height), line, fill=0, font=font)
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=80)
+    return buffer.getvalue(), width, height
+
+
+class _PdfWriter:
+    def __init__(self):
+        self.objects: List[bytes] = []
+
+    def reserve(self) -> int:
+        self.objects.append(b"")
+        return len(self.objects)
+
+    def set(self, obj_id: int, body: bytes):
+        self.objects[obj_id - 1] = body
+
+    def add(self, body: bytes) -> int:
+        obj_id = self.reserve()
+        self.set(obj_id, body)
+        return obj_id
+
+    def add_stream(self, data: bytes, extra: str = "") -> int:
+        return self.add(f"<< {extra} /Length {len(data)} >>\nstream\n".encode() + data + b"\nendstream")
+
+    def write(self, path: str, root_id: int):
+        out = io.BytesIO()
+        out.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        offsets = []
+        for i, body in enumerate(self.objects, start=1):
+            offsets.append(out.tell())
+            out.write(f"{i} 0 obj\n".encode() + body + b"\nendobj\n")
+        xref = out.tell()
+        out.write(f"xref\n0 {len(self.objects) + 1}\n0000000000 65535 f \n".encode())
+        for offset in offsets:
+            out.write(f"{offset:010d} 00000 n \n".encode())
+        out.write(f"trailer\n<< /Size {len(self.objects) + 1} /Root {root_id} 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode())
+        with open(path, "wb") as f:
+            f.write(out.getvalue())
+
+
+def write_pdf(path: str, kinds: Sequence[str], seed: int = 0) -> int:
+    """
+    Write a synthetic PDF with one page per entry in `kinds`.
+
+    Args:
+        path: Output file path
+        kinds: Page kinds in order, each one of PAGE_KINDS
+        seed: RNG seed; the same seed and kinds always produce the same document
+
+    Returns:
+        Number of invoice IDs allocated (text pages may truncate before mentioning all of theirs)
+    """
+    rng = random.Random(seed)
+    writer = _PdfWriter()
+    catalog_id, pages_id = writer.reserve(), writer.reserve()
+    font_id = writer.add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>")
+
+    page_ids = []
+    next_id = 0
+    for kind in kinds:
+        xobjects = ""
+        if kind == "text":
+            lines = paragraph_lines(rng, next_id)
+            next_id += len(lines)
+            content = _text_stream(lines)
+        elif kind == "table":
+            rows = table_rows(rng, next_id)
+            next_id += len(rows)
+            content = _table_stream([_TABLE_HEADER] + rows)
+        elif kind == "scanned":
+            lines = paragraph_lines(rng, next_id, width=70, lines=40)
+            next_id += len(lines)
+            jpeg, width, height = _scanned_jpeg(lines)
+            image_id = writer.add_stream(
+                jpeg,
+                f"/Type /XObject /Subtype /Image /Width {width} /Height {height} "
+                "/ColorSpace /DeviceGray /BitsPerComponent 8 /Filter /DCTDecode"
+            )
+            xobjects = f"/XObject << /Im1 {image_id} 0 R >>"
+            content = f"q {PAGE_WIDTH} 0 0 {PAGE_HEIGHT} 0 0 cm /Im1 Do Q".encode()
+        else:
+            raise ValueError(f"Unknown page kind '{kind}', expected one of {PAGE_KINDS}")
+
+        content_id = writer.add_stream(content)
+        page_ids.append(writer.add(
+            f"<< /Type /Page /Parent {pages_id} 0 R /MediaBox [0 0 {PAGE_WIDTH} {PAGE_HEIGHT}] "
+            f"/Resources << /Font << /F1 {font_id} 0 R >> {xobjects} >> /Contents {content_id} 0 R >>".encode()
+        ))
+
+    kids = " ".join(f"{page_id} 0 R" for page_id in page_ids)
+    writer.set(pages_id, f"<< /Type /Pages /Kids [{kids}] /Count {len(page_ids)} >>".encode())
+    writer.set(catalog_id, f"<< /Type /Catalog /Pages {pages_id} 0 R >>".encode())
+    writer.write(path, catalog_id)
+    return next_id
+
+
+def mixed_kinds(pages: int, mix: Tuple[float, float, float] = (0.6, 0.3, 0.1), seed: int = 0) -> List[str]:
+    """Page kinds for a mixed document; table pages come in runs so headers repeat across pages."""
+    rng = random.Random(seed)
+    kinds: List[str] = []
+    while len(kinds) < pages:
+        kind = rng.choices(PAGE_KINDS, weights=mix)[0]
+        kinds.extend([kind] * (rng.randint(2, 3) if kind == "table" else 1))
+    return kinds[:pages]
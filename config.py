@@ -1,27 +1,152 @@
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import Dict, Optional
 from dotenv import load_dotenv
 
 load_dotenv()
 
 class Settings(BaseSettings):
+    # Server: uvicorn worker processes started by main.py. Per-process limits that must
+    # hold across the whole server (the Gemini rate limiter) are divided by this.
+    API_WORKERS: int = 1
+    # Per-worker Prometheus files when API_WORKERS > 1 (exported as PROMETHEUS_MULTIPROC_DIR to the workers)
+    METRICS_MULTIPROC_DIR: str = "data/prometheus_multiproc"
+    
     # Google Gemini
     GOOGLE_API_KEY: str
     GEMINI_MODEL: Optional[str] = "gemini-2.0-flash"
+    GEMINI_RPM: int = 60  # requests per minute for the whole server (split across API_WORKERS); 0 disables
+    GEMINI_TPM: int = 1000000  # prompt tokens per minute for the whole server; 0 disables
+    GEMINI_MAX_CONCURRENCY: int = 8
+    GEMINI_MIN_CONCURRENCY: int = 1
+    GEMINI_MAX_RETRIES: int = 3
+    GEMINI_RETRY_BASE_SECONDS: float = 1.0
     
     # LLaMAParse
     LLAMAPARSE_API_KEY: str
     
+    # PDF extraction
+    EXTRACT_WORKERS: int = 0  # shared extraction pool size; 0 = CPU count / API_WORKERS (ingestion never parses in the API process)
+    EXTRACT_PAGES_PER_TASK: int = 8
+    
+    # Ingestion batching
+    EMBED_BATCH_SIZE: int = 32  # chunks per embedder call (also the encoder batch size)
+    UPSERT_BATCH_SIZE: int = 128
+    
+    # Background ingestion jobs (rows are shared through the document registry's SQLite file,
+    # so INGEST_MAX_CONCURRENCY bounds running jobs across all uvicorn workers)
+    INGEST_MAX_CONCURRENCY: int = 2
+    INGEST_JOB_TTL_SECONDS: int = 3600
+    INGEST_POLL_INTERVAL_SECONDS: float = 1.0  # slot polling and progress/lease heartbeat
+    INGEST_JOB_LEASE_SECONDS: float = 60.0  # jobs of a worker that stops renewing are marked failed
+    INGEST_SHUTDOWN_TIMEOUT_SECONDS: float = 120.0  # running jobs still unfinished after this are marked failed
+    INGEST_CLAIM_LEASE_SECONDS: float = 600.0  # per-document ingestion claim; renewed per page and batch
+    
+    # Embedding model ("sentence-transformers" or "onnx")
+    EMBEDDING_BACKEND: str = "sentence-transformers"
+    EMBEDDING_MODEL: str = "intfloat/e5-base-v2"
+    EMBEDDING_ONNX_PATH: str = "models/e5-base-v2-onnx/model_quantized.onnx"
+    EMBEDDING_THREADS: int = 0  # 0 = library default
+    EMBEDDING_DIM: int = 768
+    EMBEDDING_WARMUP: bool = True  # run one encode at startup
+    
+    # Embedding cache (memory-mapped vectors + LRU index)
+    EMBEDDING_CACHE_ENABLED: bool = True
+    EMBEDDING_CACHE_DIR: str = "data/embedding_cache"
+    EMBEDDING_CACHE_CAPACITY: int = 100000
+    EMBEDDING_CACHE_DTYPE: str = "float16"
+    
+    # Document registry (fingerprints of ingested PDFs)
+    DOCUMENT_REGISTRY_PATH: str = "data/documents.db"
+    
+    # Retrieval caches
+    QUERY_EMBEDDING_CACHE_SIZE: int = 2048
+    RAG_RESULT_CACHE_SIZE: int = 4096
+    INDEX_GENERATION_TTL_SECONDS: float = 1.0  # uploads/deletes in other workers invalidate caches within this
+    
+    # Retrieval mode ("hybrid" = dense + BM25 sparse fused with RRF, or "dense")
+    RAG_RETRIEVAL_MODE: str = "hybrid"
+    RAG_HYBRID_PREFETCH: int = 20
+    RAG_RRF_K: int = 60
+    SPARSE_BM25_K1: float = 1.2
+    SPARSE_BM25_B: float = 0.75
+    SPARSE_AVG_DOC_TOKENS: float = 200.0
+    
+    # Vector store backend: "qdrant" (server) or "embedded" (in-process NumPy + memmap files;
+    # single process only, so run one uvicorn worker with it)
+    VECTOR_STORE_BACKEND: str = "qdrant"
+    EMBEDDED_STORE_DIR: str = "data/vector_store"
+    EMBEDDED_STORE_RESIDENT: bool = True  # keep a float32 copy in RAM for faster search
+    
     # Qdrant
     QDRANT_HOST: str = "localhost"
     QDRANT_PORT: int = 6333
+    QDRANT_GRPC_PORT: int = 6334
+    QDRANT_PREFER_GRPC: bool = False
+    
+    # Collection storage: quantization ("none", "scalar" int8, "binary"), on-disk data, HNSW.
+    # Existing collections are updated with `python -m RAG.collection_config apply`.
+    QDRANT_QUANTIZATION: str = "none"
+    QDRANT_QUANTIZATION_ALWAYS_RAM: bool = True
+    QDRANT_QUANTIZATION_RESCORE: bool = True
+    QDRANT_QUANTIZATION_OVERSAMPLING: float = 2.0
+    QDRANT_SCALAR_QUANTILE: float = 0.99
+    QDRANT_VECTORS_ON_DISK: bool = False
+    QDRANT_PAYLOAD_ON_DISK: bool = False
+    QDRANT_HNSW_M: int = 16
+    QDRANT_HNSW_EF_CONSTRUCT: int = 100
+    QDRANT_HNSW_ON_DISK: bool = False
+    QDRANT_SEARCH_EF: int = 0  # 0 = Qdrant default
     
     # External APIs
     WEATHER_API_KEY: str
     TAVILY_API_KEY: str
     
+    # Weather cache / client
+    WEATHER_CACHE_TTL_SECONDS: int = 600
+    WEATHER_CACHE_SIZE: int = 1024
+    WEATHER_HTTP2: bool = True
+    
+    # Web search cache
+    WEB_SEARCH_CACHE_TTL_SECONDS: int = 900
+    WEB_SEARCH_CACHE_SIZE: int = 1024
+    
     # Webhook
     WEBHOOK_URL: str
+    WEBHOOK_OUTBOX_PATH: str = "data/webhook_outbox.db"
+    WEBHOOK_BATCH_SIZE: int = 1  # >1 posts {"events": [...]} batches
+    WEBHOOK_MAX_ATTEMPTS: int = 8
+    WEBHOOK_BASE_BACKOFF_SECONDS: float = 2.0
+    WEBHOOK_MAX_BACKOFF_SECONDS: float = 300.0
+    WEBHOOK_TIMEOUT_SECONDS: float = 10.0
+    WEBHOOK_POLL_INTERVAL_SECONDS: float = 1.0
+    WEBHOOK_LEASE_SECONDS: float = 60.0  # claimed events return to the queue if not settled by then
+    
+    # Semantic answer cache
+    ANSWER_CACHE_ENABLED: bool = True
+    ANSWER_CACHE_SIMILARITY: float = 0.95
+    ANSWER_CACHE_MAX_ENTRIES_PER_USER: int = 256
+    ANSWER_CACHE_TTL_SECONDS: int = 86400
+    ANSWER_CACHE_VOLATILE_TTL_SECONDS: int = 600  # answers that used web_search / get_weather
+    
+    # Tool execution
+    TOOL_TIMEOUT_SECONDS: float = 30.0
+    TOOL_TIMEOUTS: Dict[str, float] = {}  # per-tool overrides, e.g. {"web_search": 15}
+    
+    # Context budget for tool results fed back to Gemini (estimated tokens)
+    CONTEXT_BUDGET_ENABLED: bool = True
+    CONTEXT_TOKEN_BUDGET: int = 1500  # per tool turn, split across that turn's calls
+    CONTEXT_MAX_TOKENS_PER_RESULT: int = 250
+    CONTEXT_MIN_TOKENS_PER_RESULT: int = 40
+    CONTEXT_MIN_RELATIVE_SCORE: float = 0.9  # rag_search: drop hits scoring below this fraction of the best
+    CONTEXT_WEB_MIN_RELATIVE_SCORE: float = 0.3  # web_search: same cut, for Tavily's wider score spread
+    CONTEXT_DEDUPE_OVERLAP: float = 0.6  # shingle overlap at which a chunk counts as a duplicate
+    
+    # Logging: records are queued and written by a background thread
+    LOG_LEVEL: str = "INFO"
+    LOG_FORMAT: str = "json"  # "json" (one object per line) or "text"
+    LOG_FILE: str = "rag_gemini_sdk.log"  # empty to log to stderr only
+    LOG_QUEUE_SIZE: int = 10000  # records beyond this are dropped (and counted) instead of blocking
+    LOG_SAMPLE_EVERY: int = 100  # per-chunk DEBUG logs: emit 1 in N
     
     class Config:
         env_file = ".env"
@@ -3,25 +3,49 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse, FileResponse
 from fastapi.exceptions import HTTPException as FastAPIHTTPException
 from api.exceptions import global_exception_handler, http_exception_handler
-from api.routes import health, chat, pdf, get_pdfs, delete_pdfs
+from api.routes import health, chat, pdf, get_pdfs, delete_pdfs, ingest_jobs, metrics
+from services.ingestion_jobs import ingestion_jobs as ingestion_job_queue
+from services.lifecycle import initialize_resources
+from services.http_clients import close_http_clients
+from services.webhook_outbox import get_webhook_outbox
+from RAG.embedding_and_store import close_vector_store
+from src.logging_setup import correlation_id, setup_logging, shutdown_logging
+from src.metrics import MULTIPROC_DIR_ENV, mark_worker_dead, prepare_multiprocess_dir
+from config import settings
+from contextlib import asynccontextmanager
+import asyncio
 import logging
+import os
+import time
+import uuid
 
-# Enhanced logging configuration
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(),
-        logging.FileHandler('rag_gemini_sdk.log', mode='a')
-    ]
-)
+# Queue-backed logging: the event loop only enqueues records, a background thread writes them
+setup_logging()
 logger = logging.getLogger(__name__)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Load the embedding model, connect to Qdrant, etc. before serving traffic
+    start = time.perf_counter()
+    await asyncio.to_thread(initialize_resources)
+    logger.info(f"Startup completed in {time.perf_counter() - start:.2f}s")
+    get_webhook_outbox().start()
+    yield
+    # Stop accepting ingestion work on shutdown and let running jobs finish
+    await asyncio.to_thread(ingestion_job_queue.shutdown, settings.INGEST_SHUTDOWN_TIMEOUT_SECONDS)
+    await get_webhook_outbox().stop()
+    await close_vector_store()
+    await close_http_clients()
+    mark_worker_dead()
+    shutdown_logging()
+
+
 # Create FastAPI app
 app = FastAPI(
     title="AI Agent Backend API",
     description="Production-grade FastAPI backend with Gemini function calling, RAG, and tool integrations",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # CORS configuration
@@ -33,6 +57,18 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def correlation_id_middleware(request: Request, call_next):
+    """Tag every log record for this request with its X-Request-ID (generated if absent)."""
+    request_id = request.headers.get("X-Request-ID") or uuid.uuid4().hex
+    token = correlation_id.set(request_id)
+    try:
+        response = await call_next(request)
+    finally:
+        correlation_id.reset(token)
+    response.headers["X-Request-ID"] = request_id
+    return response
+
 # Global exception handlers
 app.add_exception_handler(Exception, global_exception_handler)
 app.add_exception_handler(FastAPIHTTPException, http_exception_handler)
@@ -43,7 +79,14 @@ app.include_router(chat.router, prefix="/v1", tags=["Chat"])
 app.include_router(pdf.router, prefix="/v1", tags=["PDF"])
 app.include_router(delete_pdfs.router, prefix="/v1", tags=["PDF"])
 app.include_router(get_pdfs.router, prefix="/v1", tags=["PDF"])
+app.include_router(ingest_jobs.router, prefix="/v1", tags=["PDF"])
+# Unversioned, at the path Prometheus scrapes by default
+app.include_router(metrics.router, tags=["Metrics"])
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    if settings.API_WORKERS > 1 and not os.environ.get(MULTIPROC_DIR_ENV):
+        # Workers inherit the variable, so /metrics aggregates all of them
+        prepare_multiprocess_dir(settings.METRICS_MULTIPROC_DIR)
+    # Several workers need the import string; the Gemini rate limiter splits its quota by API_WORKERS
+    uvicorn.run("main:app", host="0.0.0.0", port=8000, workers=settings.API_WORKERS)
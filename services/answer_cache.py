@@ -0,0 +1,207 @@
+import asyncio
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Any, FrozenSet, List, Optional
+
+import numpy as np
+
+from config import settings
+from services.rag_service import embed_query
+from RAG.sparse import tokenize
+from src.metrics import ANSWER_CACHE_RESULTS, ANSWER_CACHE_SKIPPED
+
+logger = logging.getLogger(__name__)
+
+# Answers built from these tools go stale on their own and get the short TTL
+VOLATILE_TOOLS = {"web_search", "get_weather"}
+# Answers involving side effects must be re-executed every time
+UNCACHEABLE_TOOLS = {"send_webhook_event"}
+# Words that change how a question is phrased, not what it asks about
+_PHRASING_WORDS = frozenset(
+    "please tell show give explain describe summarize summarise summary list about like know "
+    "can could would should there any me us today now current currently".split()
+)
+
+
+def content_terms(question: str) -> FrozenSet[str]:
+    """
+    Tokens that decide what a question asks about: every number (years included)
+    and every non-stopword word other than phrasing words, lowercased.
+    """
+    return frozenset(
+        token for token in tokenize(question)
+        if token not in _PHRASING_WORDS and (len(token) > 1 or token.isdigit())
+    )
+
+
+@dataclass
+class CachedAnswer:
+    question: str
+    terms: FrozenSet[str]
+    embedding: np.ndarray
+    response: Dict[str, Any]
+    generation: int
+    expires_at: float
+
+
+class SemanticAnswerCache:
+    """
+    Per-user cache of final chat answers, matched by question similarity.
+
+    An incoming message is embedded with the e5 model and compared (cosine)
+    against the user's previous questions. A match above the threshold returns
+    the stored answer, so paraphrases ("what's in my resume" / "summarize my
+    resume") share one entry. Embeddings of "weather in Paris" and "weather in
+    London", or "revenue in 2023" and "revenue in 2024", are just as close, so
+    both questions must also have the same content terms (content_terms():
+    numbers and non-stopword words, ignoring phrasing words like "summarize").
+
+    Entries are tagged with the user's index generation as of the start of the
+    request that produced them, and are dropped when it changes (upload/delete)
+    or their TTL expires. Answers that used web_search or
+    get_weather get a shorter TTL, and answers that triggered a webhook are never
+    cached.
+    """
+
+    def __init__(
+        self,
+        threshold: float,
+        max_entries_per_user: int,
+        ttl_seconds: float,
+        volatile_ttl_seconds: float
+    ):
+        self.threshold = threshold
+        self.max_entries_per_user = max(1, max_entries_per_user)
+        self.ttl_seconds = ttl_seconds
+        self.volatile_ttl_seconds = volatile_ttl_seconds
+        self._entries: Dict[str, List[CachedAnswer]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.skipped = 0
+
+    async def embed(self, message: str) -> Optional[np.ndarray]:
+        """Normalized embedding of the message, or None if the model is unavailable."""
+        try:
+            vector = np.asarray(await asyncio.to_thread(embed_query, message), dtype=np.float32)
+        except Exception as e:
+            logger.error(f"Answer cache could not embed message: {e}")
+            return None
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _miss(self):
+        self.misses += 1
+        ANSWER_CACHE_RESULTS["miss"].inc()
+
+    def lookup(
+        self,
+        user_id: str,
+        question: str,
+        embedding: Optional[np.ndarray],
+        generation: int
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Cached answer for a similar question, if any.
+
+        Args:
+            user_id: User whose answers are searched
+            question: The incoming message
+            embedding: Its normalized embedding (from embed())
+            generation: The user's index generation, read when the request started
+        """
+        if embedding is None:
+            self._miss()
+            return None
+
+        now = time.time()
+        terms = content_terms(question)
+        with self._lock:
+            entries = [
+                e for e in self._entries.get(user_id, [])
+                if e.generation == generation and e.expires_at > now
+            ]
+            self._entries[user_id] = entries
+            if not entries:
+                self._miss()
+                return None
+
+            candidates = [e for e in entries if e.terms == terms]
+            if not candidates:
+                self._miss()
+                return None
+
+            similarities = np.stack([e.embedding for e in candidates]) @ embedding
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.threshold:
+                self._miss()
+                return None
+
+            self.hits += 1
+            ANSWER_CACHE_RESULTS["hit"].inc()
+            entry = candidates[best]
+
+        logger.info(f"Answer cache hit for user {user_id} (similarity {similarities[best]:.3f} to '{entry.question[:60]}')")
+        return entry.response
+
+    def store(
+        self,
+        user_id: str,
+        question: str,
+        embedding: Optional[np.ndarray],
+        response: Dict[str, Any],
+        generation: int
+    ):
+        """Cache an answer under the index generation read when its request started (see lookup())."""
+        tools_used = {call.get("tool") for call in response.get("tool_calls", [])}
+        has_error = any(
+            isinstance(call.get("result"), dict) and call["result"].get("error")
+            for call in response.get("tool_calls", [])
+        )
+        if embedding is None or has_error or tools_used & UNCACHEABLE_TOOLS:
+            self.skipped += 1
+            ANSWER_CACHE_SKIPPED.inc()
+            return
+
+        ttl = self.volatile_ttl_seconds if tools_used & VOLATILE_TOOLS else self.ttl_seconds
+        entry = CachedAnswer(
+            question=question,
+            terms=content_terms(question),
+            embedding=embedding,
+            response=response,
+            generation=generation,
+            expires_at=time.time() + ttl
+        )
+        with self._lock:
+            entries = self._entries.setdefault(user_id, [])
+            entries.append(entry)
+            del entries[:-self.max_entries_per_user]
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "skipped": self.skipped,
+            "hit_rate": self.hits / total if total else 0.0,
+            "users": len(self._entries),
+            "entries": sum(len(entries) for entries in self._entries.values())
+        }
+
+
+_answer_cache: Optional[SemanticAnswerCache] = None
+
+
+def get_answer_cache() -> SemanticAnswerCache:
+    """Return the shared SemanticAnswerCache, creating it on first use."""
+    global _answer_cache
+    if _answer_cache is None:
+        _answer_cache = SemanticAnswerCache(
+            threshold=settings.ANSWER_CACHE_SIMILARITY,
+            max_entries_per_user=settings.ANSWER_CACHE_MAX_ENTRIES_PER_USER,
+            ttl_seconds=settings.ANSWER_CACHE_TTL_SECONDS,
+            volatile_ttl_seconds=settings.ANSWER_CACHE_VOLATILE_TTL_SECONDS
+        )
+    return _answer_cache
@@ -0,0 +1,206 @@
+"""
+Token-budgeted context assembly for tool results fed back to Gemini.
+
+Tool outputs are measured in estimated model tokens and trimmed to fit
+CONTEXT_TOKEN_BUDGET per tool turn. The estimate is a chars-per-token ratio
+calibrated against the prompt_token_count Gemini reports for every turn (see
+calibrate()), so it tracks the real tokenizer without an extra count request.
+Results are trimmed as follows: low-score hits are dropped, chunks that
+overlap an already-kept chunk are removed, and long passages are cut down to
+the sentences that share the most terms with the query. The caller still
+returns the untrimmed results to the client; only what Gemini sees shrinks.
+"""
+import json
+import logging
+import re
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from config import settings
+from RAG.sparse import tokenize
+
+logger = logging.getLogger(__name__)
+
+# Tools whose results are passages worth trimming, and the field holding the text
+PASSAGE_FIELDS = {"rag_search": "text", "web_search": "content"}
+# Bulky fields the model never needs
+DROPPED_FIELDS = {"web_search": ("raw_content", "images")}
+
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+|\n+")
+_SHINGLE_SIZE = 5
+
+# Chars per model token: starts at the usual ~4 and follows Gemini's reported counts
+_chars_per_token = 4.0
+# Weight of each new measurement in the moving average, and the range a measurement is clamped to
+_CALIBRATION_WEIGHT = 0.2
+_CHARS_PER_TOKEN_RANGE = (1.0, 8.0)
+
+
+def calibrate(prompt_chars: int, prompt_tokens: Optional[int]):
+    """
+    Fold one turn's measured chars-per-token into the estimate.
+
+    Args:
+        prompt_chars: Characters of everything Gemini counted in prompt_tokens
+            (contents and tool declarations)
+        prompt_tokens: usage_metadata.prompt_token_count of that turn
+    """
+    global _chars_per_token
+    if prompt_chars <= 0 or not prompt_tokens:
+        return
+    low, high = _CHARS_PER_TOKEN_RANGE
+    measured = min(high, max(low, prompt_chars / prompt_tokens))
+    _chars_per_token += _CALIBRATION_WEIGHT * (measured - _chars_per_token)
+
+
+def chars_to_tokens(chars: int) -> int:
+    return max(1, round(chars / _chars_per_token)) if chars else 0
+
+
+def estimate_tokens(value: Any) -> int:
+    """Model-token count of a string or JSON-able value, using the calibrated chars-per-token ratio."""
+    text = value if isinstance(value, str) else json.dumps(value, ensure_ascii=False, default=str)
+    return chars_to_tokens(len(text))
+
+
+def _shingles(text: str) -> Set[Tuple[str, ...]]:
+    words = text.lower().split()
+    if len(words) < _SHINGLE_SIZE:
+        return {tuple(words)} if words else set()
+    return {tuple(words[i:i + _SHINGLE_SIZE]) for i in range(len(words) - _SHINGLE_SIZE + 1)}
+
+
+def _is_exact_match(item: Dict[str, Any]) -> bool:
+    # Hybrid RAG results matching an identifier in the query are kept regardless of dense score
+    return bool(item.get("exact_match"))
+
+
+def _min_relative_score(tool_name: str) -> float:
+    # Tavily scores spread far wider than RAG similarities, so web results get a much lower cut
+    if tool_name == "web_search":
+        return settings.CONTEXT_WEB_MIN_RELATIVE_SCORE
+    return settings.CONTEXT_MIN_RELATIVE_SCORE
+
+
+def _drop_low_scores(items: List[Dict[str, Any]], min_relative_score: float) -> List[Dict[str, Any]]:
+    scores = [item["score"] for item in items if isinstance(item.get("score"), (int, float))]
+    if not scores:
+        return items
+    floor = max(scores) * min_relative_score
+    return [
+        item for item in items
+        if _is_exact_match(item) or not isinstance(item.get("score"), (int, float)) or item["score"] >= floor
+    ]
+
+
+def _dedupe(items: List[Dict[str, Any]], field: str) -> List[Dict[str, Any]]:
+    """Drop items whose text mostly repeats a higher-ranked item (chunk overlap, mirrored pages)."""
+    kept: List[Dict[str, Any]] = []
+    seen: List[Set[Tuple[str, ...]]] = []
+    for item in items:
+        shingles = _shingles(item.get(field) or "")
+        if shingles and any(
+            len(shingles & other) / len(shingles) >= settings.CONTEXT_DEDUPE_OVERLAP for other in seen
+        ):
+            continue
+        kept.append(item)
+        seen.append(shingles)
+    return kept
+
+
+def _relevant_excerpt(text: str, query_terms: Set[str], max_tokens: int) -> str:
+    """Keep the sentences sharing the most terms with the query, in their original order."""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+
+    # Repeated sentences (headers, footers, boilerplate) are kept once
+    sentences = list(dict.fromkeys(s.strip() for s in _SENTENCE_RE.split(text) if s.strip()))
+    ranked = sorted(
+        range(len(sentences)),
+        key=lambda i: (-len(query_terms.intersection(tokenize(sentences[i]))), i)
+    )
+
+    chosen, used = [], 0
+    for i in ranked:
+        cost = estimate_tokens(sentences[i]) + 1
+        if used + cost > max_tokens:
+            continue
+        chosen.append(i)
+        used += cost
+
+    if not chosen:
+        # A single sentence longer than the cap: hard-truncate it
+        return sentences[ranked[0]][:int(max_tokens * _chars_per_token)].rstrip() + " …"
+    return " … ".join(sentences[i] for i in sorted(chosen))
+
+
+def fit_tool_result(tool_name: str, args: Dict[str, Any], result: Any, budget: int) -> Tuple[Any, int, int]:
+    """
+    Trim one tool result to roughly `budget` tokens.
+
+    Args:
+        tool_name: Name of the tool that produced the result
+        args: Arguments Gemini called the tool with (the query guides sentence selection)
+        result: Raw tool result
+        budget: Token budget for this result
+
+    Returns:
+        (trimmed result, tokens before, tokens after)
+    """
+    tokens_before = estimate_tokens(result)
+    field = PASSAGE_FIELDS.get(tool_name)
+    if not field or not isinstance(result, dict) or not isinstance(result.get("results"), list):
+        return result, tokens_before, tokens_before
+
+    items = [item for item in result["results"] if isinstance(item, dict)]
+    items = _dedupe(_drop_low_scores(items, _min_relative_score(tool_name)), field)
+
+    trimmed = {k: v for k, v in result.items() if k not in ("results", "count")}
+    remaining = budget - estimate_tokens(trimmed)
+    query_terms = set(tokenize(str(args.get("query", ""))))
+    per_item_cap = settings.CONTEXT_MAX_TOKENS_PER_RESULT
+
+    kept = []
+    for item in items:
+        item = {k: v for k, v in item.items() if k not in DROPPED_FIELDS.get(tool_name, ())}
+        overhead = estimate_tokens({k: v for k, v in item.items() if k != field})
+        allowance = min(per_item_cap, remaining - overhead)
+        if allowance < settings.CONTEXT_MIN_TOKENS_PER_RESULT:
+            break
+        item[field] = _relevant_excerpt(item.get(field) or "", query_terms, allowance)
+        kept.append(item)
+        remaining -= estimate_tokens(item)
+
+    trimmed["results"] = kept
+    if "count" in result:
+        trimmed["count"] = len(kept)
+    tokens_after = estimate_tokens(trimmed)
+    return trimmed, tokens_before, tokens_after
+
+
+def fit_tool_results(
+    executed: List[Tuple[str, Dict[str, Any], Any]],
+    token_tracker: Dict[str, int]
+) -> List[Any]:
+    """
+    Trim one turn's tool results so together they fit CONTEXT_TOKEN_BUDGET.
+
+    The budget is split evenly across the turn's calls. Tokens before/after
+    (calibrated estimates) are added to token_tracker as context_tokens_in /
+    context_tokens_saved.
+
+    Returns:
+        The model-facing results, in the same order as `executed`
+    """
+    if not settings.CONTEXT_BUDGET_ENABLED or not executed:
+        return [tool_result for _, _, tool_result in executed]
+
+    budget = max(settings.CONTEXT_MIN_TOKENS_PER_RESULT, settings.CONTEXT_TOKEN_BUDGET // len(executed))
+    fitted = []
+    for tool_name, args, tool_result in executed:
+        trimmed, before, after = fit_tool_result(tool_name, args or {}, tool_result, budget)
+        token_tracker["context_tokens_in"] = token_tracker.get("context_tokens_in", 0) + after
+        token_tracker["context_tokens_saved"] = token_tracker.get("context_tokens_saved", 0) + max(0, before - after)
+        if before != after:
+            logger.info(f"Context budget: {tool_name} result trimmed from ~{before} to ~{after} tokens")
+        fitted.append(trimmed)
+    return fitted
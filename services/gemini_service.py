@@ -1,5 +1,8 @@
+import asyncio
 import logging
-from typing import Dict, Any, List, Optional
+import inspect
+import time
+from typing import Dict, Any, AsyncIterator, Awaitable, Callable, List, Optional
 
 from google import genai
 from google.genai import types
@@ -11,9 +14,19 @@ from services.rag_service import rag_search
 from services.tavily_service import web_search
 from services.weather_service import get_weather
 from services.webhook_service import send_webhook_event
+from services.answer_cache import get_answer_cache
+from services.rate_limiter import gemini_rate_limiter
+from services.context_budget import calibrate, chars_to_tokens, fit_tool_results
+from src.cache import index_generations
+from src.metrics import TOOL_SECONDS
 
 logger = logging.getLogger(__name__)
 
+NO_RESPONSE_TEXT = "No response."
+LOOP_EXCEEDED_TEXT = "Tool call loop exceeded."
+# Fallback answers that must never be cached
+INCOMPLETE_ANSWERS = {NO_RESPONSE_TEXT, LOOP_EXCEEDED_TEXT}
+
 
 class GeminiService:
     """
@@ -29,6 +42,10 @@ class GeminiService:
         self.client = genai.Client(api_key=settings.GOOGLE_API_KEY)
         self.model = settings.GEMINI_MODEL or "gemini-2.0-flash"
         self.tools = get_tool_configs()
+        # Metric label values are limited to declared tools; the model may call any name
+        self._tool_names = {decl.name for tool in self.tools for decl in tool.function_declarations or []}
+        # Tool declarations are part of every prompt Gemini counts
+        self._tool_chars = sum(len(tool.model_dump_json(exclude_none=True)) for tool in self.tools)
 
     # -------------------------------------------------------------------------
     # Executes backend Python tools when Gemini requests them
@@ -76,17 +93,35 @@ class GeminiService:
 
 
     # -------------------------------------------------------------------------
-    # Main chat method — function-calling loop
+    # Runs one Gemini function call with its configured timeout
     # -------------------------------------------------------------------------
-    async def chat(
-        self,
-        user_message: str,
-        user_id: str = "anonymous"
-    ) -> Dict[str, Any]:
+    async def _run_tool_call(self, fc: FunctionCall, user_id: str, token_tracker: Dict[str, int]):
+        tool_name = fc.name
+        args = dict(fc.args.items()) if hasattr(fc.args, "items") else fc.args
 
-        # -----------------------------------------------
-        # Build conversation with system instruction + user message
-        # -----------------------------------------------
+        logger.info(f"Gemini requesting tool '{tool_name}' with args={args}")
+
+        timeout = settings.TOOL_TIMEOUTS.get(tool_name, settings.TOOL_TIMEOUT_SECONDS)
+        start_time = time.perf_counter()
+        try:
+            tool_result = await asyncio.wait_for(
+                self.execute_tool(tool_name, args, user_id, token_tracker),
+                timeout=timeout
+            )
+            status = "error" if isinstance(tool_result, dict) and "error" in tool_result else "ok"
+        except asyncio.TimeoutError:
+            logger.error(f"Tool '{tool_name}' timed out after {timeout}s")
+            tool_result = {"error": f"Tool '{tool_name}' timed out after {timeout}s"}
+            status = "timeout"
+        tool_label = tool_name if tool_name in self._tool_names else "unknown"
+        TOOL_SECONDS.labels(tool_label, status).observe(time.perf_counter() - start_time)
+
+        return tool_name, args, tool_result
+
+    # -------------------------------------------------------------------------
+    # Prompt construction shared by chat() and chat_stream()
+    # -------------------------------------------------------------------------
+    def _initial_contents(self, user_message: str) -> List[Content]:
         system_instruction = """You are an Intelligent AI assistant Who is an Orchaestrator. So you first
         analyses the user query and decide what to reply. The reply should be from your general knowledge or
         from the tools you have. You have five different tools as below:
@@ -99,19 +134,149 @@ class GeminiService:
 
         Be concise. No tool explanations."""
 
-        contents: List[Content] = [
+        return [
             Content(
                 role="user",
                 parts=[types.Part(text=f"{system_instruction}\n\nUser Query: {user_message}")]
             )
         ]
 
+    def _generation_config(self) -> types.GenerateContentConfig:
+        return types.GenerateContentConfig(
+            temperature=0.2,
+            tools=self.tools
+        )
+
+    # -------------------------------------------------------------------------
+    # Calls Gemini through the shared rate limiter (admission + jittered retries)
+    # -------------------------------------------------------------------------
+    def _prompt_chars(self, contents: List[Content]) -> int:
+        chars = self._tool_chars
+        for content in contents:
+            for part in content.parts or []:
+                if part.text:
+                    chars += len(part.text)
+                elif part.function_call:
+                    chars += len(part.function_call.name or "") + len(str(part.function_call.args))
+                elif part.function_response:
+                    chars += len(str(part.function_response.response))
+        return chars
+
+    def _estimate_tokens(self, contents: List[Content]) -> int:
+        # Reserves TPM budget up front; same calibrated ratio as the context budget
+        return max(1, chars_to_tokens(self._prompt_chars(contents)))
+
+    async def _call_gemini(self, contents: List[Content], make_call: Callable[[], Awaitable[Any]]) -> Any:
+        return await gemini_rate_limiter.call(make_call, estimated_tokens=self._estimate_tokens(contents))
+
+    async def _generate(self, contents: List[Content]):
+        return await self._call_gemini(contents, lambda: self.client.aio.models.generate_content(
+            model=self.model,
+            contents=contents,
+            config=self._generation_config()
+        ))
+
+    def _stream(self, contents: List[Content]) -> AsyncIterator[Any]:
+        """Stream chunks; the rate limiter holds the call's concurrency slot until the stream is closed."""
+        async def open_stream():
+            stream = self.client.aio.models.generate_content_stream(
+                model=self.model,
+                contents=contents,
+                config=self._generation_config()
+            )
+            # Older SDKs return the async iterator directly, newer ones a coroutine
+            if inspect.isawaitable(stream):
+                stream = await stream
+            return stream
+
+        return gemini_rate_limiter.stream(open_stream, estimated_tokens=self._estimate_tokens(contents))
+
+    # -------------------------------------------------------------------------
+    # Semantic answer cache around chat() and chat_stream()
+    # -------------------------------------------------------------------------
+    async def _cache_lookup(self, user_message: str, user_id: str):
+        """
+        Returns (cache key, cached response or None).
+
+        The key carries the embedding and the index generation as of now, so an
+        answer computed while an upload/delete finishes is stored under the
+        generation it was built from and never served as fresh.
+        """
+        if not settings.ANSWER_CACHE_ENABLED:
+            return None, None
+        generation = await index_generations.aget(user_id)
+        answer_cache = get_answer_cache()
+        embedding = await answer_cache.embed(user_message)
+        cached = answer_cache.lookup(user_id, user_message, embedding, generation)
+        if cached is None:
+            return (embedding, generation), None
+        # Served from cache: no model or embedding tokens were spent on this request
+        return (embedding, generation), dict(cached, usage={"total_tokens": 0, "embedding_tokens": 0, "context_tokens_in": 0, "context_tokens_saved": 0}, cached=True)
+
+    def _cache_store(self, user_message: str, user_id: str, cache_key, response: Dict[str, Any]):
+        if cache_key is None:
+            return
+        if settings.ANSWER_CACHE_ENABLED and response.get("text") and response["text"] not in INCOMPLETE_ANSWERS:
+            embedding, generation = cache_key
+            get_answer_cache().store(user_id, user_message, embedding, response, generation)
+
+    async def chat(
+        self,
+        user_message: str,
+        user_id: str = "anonymous"
+    ) -> Dict[str, Any]:
+        cache_key, cached = await self._cache_lookup(user_message, user_id)
+        if cached is not None:
+            return cached
+
+        response = await self._chat(user_message, user_id)
+        self._cache_store(user_message, user_id, cache_key, response)
+        return response
+
+    async def chat_stream(
+        self,
+        user_message: str,
+        user_id: str = "anonymous"
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Run the function-calling loop on the streaming Gemini API.
+
+        Yields dicts of the form {"event": name, "data": {...}}:
+        - "token": a text delta of the model's answer
+        - "tool_call_start" / "tool_call_end": around every tool execution
+        - "done": the final text, tool calls and usage (same shape as chat())
+        """
+        cache_key, cached = await self._cache_lookup(user_message, user_id)
+        if cached is not None:
+            yield {"event": "token", "data": {"text": cached["text"]}}
+            yield {"event": "done", "data": cached}
+            return
+
+        async for item in self._chat_stream(user_message, user_id):
+            if item["event"] == "done":
+                self._cache_store(user_message, user_id, cache_key, item["data"])
+            yield item
+
+    # -------------------------------------------------------------------------
+    # Main chat method — function-calling loop
+    # -------------------------------------------------------------------------
+    async def _chat(
+        self,
+        user_message: str,
+        user_id: str = "anonymous"
+    ) -> Dict[str, Any]:
+
+        # -----------------------------------------------
+        # Build conversation with system instruction + user message
+        # -----------------------------------------------
+        contents = self._initial_contents(user_message)
+
         tool_results = []
         max_iterations = 3
         iteration = 0
         
         # Initialize token tracker
-        token_tracker = {"total_tokens": 0, "embedding_tokens": 0}
+        token_tracker = {"total_tokens": 0, "embedding_tokens": 0, "context_tokens_in": 0, "context_tokens_saved": 0}
 
         # -----------------------------------------------
         # Tool-calling loop
@@ -119,49 +284,17 @@ class GeminiService:
         while iteration < max_iterations:
             iteration += 1
 
-            # Retry logic for rate limits
-            max_retries = 3
-            retry_count = 0
-            
-            while retry_count < max_retries:
-                try:
-                    response = await self.client.aio.models.generate_content(
-                        model=self.model,
-                        contents=contents,
-                        config=types.GenerateContentConfig(
-                            temperature=0.2,
-                            tools=self.tools
-                        )
-                    )
-                    
-                    # Track token usage
-                    if hasattr(response, 'usage_metadata') and response.usage_metadata:
-                        token_tracker["total_tokens"] += response.usage_metadata.total_token_count
-                        logger.info(f"Gemini API tokens used: {response.usage_metadata.total_token_count}")
-                    
-                    break  # Success, exit retry loop
-                    
-                except Exception as e:
-                    error_str = str(e)
-                    
-                    # Check if it's a rate limit error
-                    if "429" in error_str or "RESOURCE_EXHAUSTED" in error_str:
-                        retry_count += 1
-                        if retry_count < max_retries:
-                            wait_time = 2 ** retry_count  # Exponential backoff: 2, 4, 8 seconds
-                            logger.warning(f"Rate limit hit. Retrying in {wait_time}s... (attempt {retry_count}/{max_retries})")
-                            import asyncio
-                            await asyncio.sleep(wait_time)
-                        else:
-                            logger.error(f"Rate limit exceeded after {max_retries} retries")
-                            raise  # Re-raise after all retries exhausted
-                    else:
-                        # Not a rate limit error, raise immediately
-                        raise
+            response = await self._generate(contents)
+
+            # Track token usage
+            if hasattr(response, 'usage_metadata') and response.usage_metadata:
+                token_tracker["total_tokens"] += response.usage_metadata.total_token_count
+                logger.info(f"Gemini API tokens used: {response.usage_metadata.total_token_count}")
+                calibrate(self._prompt_chars(contents), response.usage_metadata.prompt_token_count)
 
             candidate = response.candidates[0] if response.candidates else None
             if not candidate:
-                return {"text": "No response.", "tool_calls": tool_results}
+                return {"text": NO_RESPONSE_TEXT, "tool_calls": tool_results}
 
             tool_calls: List[FunctionCall] = []
             response_text = ""
@@ -181,10 +314,7 @@ class GeminiService:
                 return {
                     "text": response_text, 
                     "tool_calls": tool_results,
-                    "usage": {
-                        "total_tokens": token_tracker["total_tokens"],
-                        "embedding_tokens": token_tracker["embedding_tokens"]
-                    }
+                    "usage": dict(token_tracker)
                 }
 
             # -----------------------------------------------
@@ -192,14 +322,15 @@ class GeminiService:
             # -----------------------------------------------
             function_response_parts: List[Part] = []
 
-            for fc in tool_calls:
-                tool_name = fc.name
-                args = dict(fc.args.items()) if hasattr(fc.args, "items") else fc.args
+            # Run all tool calls of this turn concurrently; gather keeps call order
+            executed = await asyncio.gather(*(
+                self._run_tool_call(fc, user_id, token_tracker) for fc in tool_calls
+            ))
 
-                logger.info(f"Gemini requesting tool '{tool_name}' with args={args}")
-
-                tool_result = await self.execute_tool(tool_name, args, user_id, token_tracker)
+            # Gemini gets budget-trimmed results; the client still sees the full ones
+            model_results = fit_tool_results(executed, token_tracker)
 
+            for (tool_name, args, tool_result), model_result in zip(executed, model_results):
                 tool_results.append({
                     "tool": tool_name,
                     "args": args,
@@ -210,7 +341,7 @@ class GeminiService:
                     types.Part(
                     function_response=types.FunctionResponse(
                         name=tool_name,
-                        response=tool_result
+                        response=model_result
                     )
                 )
             )
@@ -227,14 +358,107 @@ class GeminiService:
 
         # Exceeded tool loop
         return {
-            "text": "Tool call loop exceeded.",
+            "text": LOOP_EXCEEDED_TEXT,
             "tool_calls": tool_results,
-            "usage": {
-                "total_tokens": token_tracker["total_tokens"],
-                "embedding_tokens": token_tracker["embedding_tokens"]
-            }
+            "usage": dict(token_tracker)
         }
 
+    # -------------------------------------------------------------------------
+    # Streaming chat — same loop, yielding events as they happen
+    # -------------------------------------------------------------------------
+    async def _chat_stream(
+        self,
+        user_message: str,
+        user_id: str = "anonymous"
+    ) -> AsyncIterator[Dict[str, Any]]:
+        contents = self._initial_contents(user_message)
+
+        tool_results = []
+        max_iterations = 3
+        token_tracker = {"total_tokens": 0, "embedding_tokens": 0, "context_tokens_in": 0, "context_tokens_saved": 0}
+
+        for _ in range(max_iterations):
+            tool_calls: List[FunctionCall] = []
+            response_text = ""
+            usage = None
+
+            stream = self._stream(contents)
+            try:
+                async for chunk in stream:
+                    if getattr(chunk, "usage_metadata", None):
+                        usage = chunk.usage_metadata
+                    candidate = chunk.candidates[0] if chunk.candidates else None
+                    if not candidate or not candidate.content or not candidate.content.parts:
+                        continue
+                    for part in candidate.content.parts:
+                        if part.function_call:
+                            tool_calls.append(part.function_call)
+                        elif part.text:
+                            response_text += part.text
+                            yield {"event": "token", "data": {"text": part.text}}
+            finally:
+                # Frees the rate limiter slot promptly if the client disconnects mid-stream
+                await stream.aclose()
+
+            # Usage metadata is cumulative per stream; count the last one
+            if usage and usage.total_token_count:
+                token_tracker["total_tokens"] += usage.total_token_count
+                logger.info(f"Gemini API tokens used: {usage.total_token_count}")
+                calibrate(self._prompt_chars(contents), usage.prompt_token_count)
+
+            if not tool_calls:
+                yield {"event": "done", "data": {
+                    "text": response_text,
+                    "tool_calls": tool_results,
+                    "usage": dict(token_tracker)
+                }}
+                return
+
+            # Start every tool at once and report each as it finishes
+            async def run_indexed(index: int, fc: FunctionCall):
+                return index, await self._run_tool_call(fc, user_id, token_tracker)
+
+            tasks = []
+            for index, fc in enumerate(tool_calls):
+                args = dict(fc.args.items()) if hasattr(fc.args, "items") else fc.args
+                yield {"event": "tool_call_start", "data": {"index": index, "tool": fc.name, "args": args}}
+                tasks.append(asyncio.create_task(run_indexed(index, fc)))
+
+            try:
+                for finished in asyncio.as_completed(tasks):
+                    index, (tool_name, _, tool_result) = await finished
+                    yield {"event": "tool_call_end", "data": {"index": index, "tool": tool_name, "result": tool_result}}
+            finally:
+                # No-op when all finished; stops orphaned tools if the client disconnects
+                for task in tasks:
+                    task.cancel()
+
+            # Feed results back in the original call order
+            executed = [task.result()[1] for task in tasks]
+            model_results = fit_tool_results(executed, token_tracker)
+
+            function_response_parts: List[Part] = []
+            for (tool_name, args, tool_result), model_result in zip(executed, model_results):
+                tool_results.append({"tool": tool_name, "args": args, "result": tool_result})
+                function_response_parts.append(types.Part(
+                    function_response=types.FunctionResponse(name=tool_name, response=model_result)
+                ))
+
+            contents.append(types.Content(role="user", parts=function_response_parts))
+
+        yield {"event": "done", "data": {
+            "text": LOOP_EXCEEDED_TEXT,
+            "tool_calls": tool_results,
+            "usage": dict(token_tracker)
+        }}
+
+
+_gemini_service: Optional[GeminiService] = None
+
 
-# Singleton instance
-gemini_service = GeminiService()
+def get_gemini_service() -> GeminiService:
+    """Return the shared GeminiService, creating it on first use."""
+    global _gemini_service
+    if _gemini_service is None:
+        _gemini_service = GeminiService()
+    return _gemini_service
@@ -0,0 +1,33 @@
+import logging
+from typing import Dict
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# One pooled AsyncClient per upstream service, kept for the app's lifetime
+_clients: Dict[str, httpx.AsyncClient] = {}
+
+
+def get_http_client(name: str, **kwargs) -> httpx.AsyncClient:
+    """
+    Return the shared keep-alive client registered under `name`, creating it on
+    first use with `kwargs` (e.g. base_url, timeout, http2).
+    """
+    client = _clients.get(name)
+    if client is None or client.is_closed:
+        kwargs.setdefault("timeout", httpx.Timeout(30.0, connect=5.0))
+        kwargs.setdefault("limits", httpx.Limits(max_connections=50, max_keepalive_connections=20))
+        client = httpx.AsyncClient(**kwargs)
+        _clients[name] = client
+    return client
+
+
+async def close_http_clients():
+    """Close every shared client; called from the app lifespan on shutdown."""
+    for name, client in list(_clients.items()):
+        try:
+            await client.aclose()
+        except Exception as e:
+            logger.warning(f"Error closing HTTP client '{name}': {e}")
+    _clients.clear()
@@ -0,0 +1,346 @@
+import contextvars
+import json
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import closing
+from dataclasses import dataclass, field
+from typing import Dict, Any, List, Optional, Tuple
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.utils import IngestionStats
+from RAG.pipeline import ingest_pdf
+from RAG.parsing_and_chunking import shutdown_extract_pool
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+PROGRESS_FIELDS = ("total_pages", "pages_parsed", "chunks_embedded", "points_upserted")
+
+
+@dataclass
+class IngestionJob:
+    id: str
+    filename: str
+    user_id: str
+    status: str = "queued"  # queued -> running -> completed | failed
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    progress: Dict[str, int] = field(default_factory=lambda: dict.fromkeys(PROGRESS_FIELDS, 0))
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+
+    @classmethod
+    def from_row(cls, row: sqlite3.Row) -> "IngestionJob":
+        return cls(
+            id=row["id"],
+            filename=row["filename"],
+            user_id=row["user_id"],
+            status=row["status"],
+            created_at=row["created_at"],
+            started_at=row["started_at"],
+            finished_at=row["finished_at"],
+            progress={name: row[name] for name in PROGRESS_FIELDS},
+            result=json.loads(row["result"]) if row["result"] else None,
+            error=row["error"]
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "filename": self.filename,
+            "user_id": self.user_id,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "progress": dict(self.progress),
+            "result": self.result,
+            "error": self.error
+        }
+
+
+class IngestionJobQueue:
+    """
+    Runs PDF ingestion off the event loop in a bounded worker pool.
+
+    pdfplumber extraction, the GIL-bound part, always runs in the shared
+    extraction process pool (see get_extract_pool); the job threads keep the
+    chunking, embedding and upserts, which mostly release the GIL or wait on I/O.
+
+    Job rows live in SQLite next to the document registry, so any uvicorn worker
+    can report a job's progress. Every worker runs its own thread pool, but a job
+    only starts once it holds one of INGEST_MAX_CONCURRENCY slots claimed in the
+    shared table (oldest queued job first), so the limit is global. The owning
+    worker writes progress and renews a lease on its jobs; a job whose lease
+    expires (its worker died) is marked failed. Finished jobs are pruned after
+    INGEST_JOB_TTL_SECONDS. At shutdown, jobs that have not started are marked
+    failed and their uploads removed; running jobs keep their lease renewed while
+    they drain, and any still running after the timeout are marked failed.
+    """
+
+    def __init__(self, path: str, max_concurrency: int, job_ttl_seconds: float):
+        self.path = path
+        self.max_concurrency = max(1, max_concurrency)
+        self.job_ttl_seconds = job_ttl_seconds
+        self._executor: Optional[ThreadPoolExecutor] = None
+        # Jobs owned by this process: job ID -> live stats, for progress heartbeats
+        self._owned: Dict[str, IngestionStats] = {}
+        # Jobs not yet picked up by a worker: job ID -> (future, upload path)
+        self._queued: Dict[str, Tuple[Future, str]] = {}
+        self._lock = threading.Lock()
+        # Notified whenever a job leaves _owned, so shutdown can wait for running jobs
+        self._drained = threading.Condition(self._lock)
+        self._initialized = False
+        # Set at shutdown: no new slots are claimed. The heartbeat stops separately,
+        # once running jobs have drained.
+        self._stopping = threading.Event()
+        self._heartbeat_stop = threading.Event()
+        self._heartbeat: Optional[threading.Thread] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _ensure_started(self):
+        """Create the jobs table, thread pool and heartbeat thread on first use."""
+        with self._lock:
+            if self._initialized:
+                return
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with closing(self._connect()) as conn, conn:
+                conn.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS ingest_jobs (
+                        id TEXT PRIMARY KEY,
+                        filename TEXT NOT NULL,
+                        user_id TEXT NOT NULL,
+                        status TEXT NOT NULL DEFAULT 'queued',
+                        created_at REAL NOT NULL,
+                        started_at REAL,
+                        finished_at REAL,
+                        lease_until REAL,
+                        total_pages INTEGER NOT NULL DEFAULT 0,
+                        pages_parsed INTEGER NOT NULL DEFAULT 0,
+                        chunks_embedded INTEGER NOT NULL DEFAULT 0,
+                        points_upserted INTEGER NOT NULL DEFAULT 0,
+                        result TEXT,
+                        error TEXT
+                    )
+                    """
+                )
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_ingest_jobs_status ON ingest_jobs (status, created_at)")
+            self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="ingest")
+            self._heartbeat = threading.Thread(target=self._heartbeat_forever, name="ingest-heartbeat", daemon=True)
+            self._heartbeat.start()
+            self._initialized = True
+
+    def submit(self, path: str, filename: str, user_id: str) -> IngestionJob:
+        """Enqueue ingestion of a PDF already saved at `path`. The file is removed when the job ends."""
+        self._ensure_started()
+        job = IngestionJob(id=uuid.uuid4().hex, filename=filename, user_id=user_id)
+
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "DELETE FROM ingest_jobs WHERE finished_at IS NOT NULL AND finished_at < ?",
+                (time.time() - self.job_ttl_seconds,)
+            )
+            conn.execute(
+                "INSERT INTO ingest_jobs (id, filename, user_id, status, created_at, lease_until) "
+                "VALUES (?, ?, ?, 'queued', ?, ?)",
+                (job.id, filename, user_id, job.created_at, job.created_at + settings.INGEST_JOB_LEASE_SECONDS)
+            )
+
+        # Run in a copy of the caller's context so the job logs under the upload's correlation ID
+        with self._lock:
+            self._owned[job.id] = IngestionStats(filename=filename, user_id=user_id)
+            future = self._executor.submit(contextvars.copy_context().run, self._run, job.id, path)
+            self._queued[job.id] = (future, path)
+        logger.info(f"Queued ingestion job {job.id} for '{filename}' (user_id: {user_id})")
+        return job
+
+    def get(self, job_id: str) -> Optional[IngestionJob]:
+        self._ensure_started()
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT * FROM ingest_jobs WHERE id = ?", (job_id,)).fetchone()
+        return IngestionJob.from_row(row) if row else None
+
+    def shutdown(self, timeout: float = 0.0):
+        """
+        Stop taking work: jobs that have not started are marked failed and their uploads
+        removed, then running jobs get up to `timeout` seconds to finish. Leases are
+        renewed while they drain; jobs still running afterwards are marked failed.
+        """
+        if not self._initialized:
+            shutdown_extract_pool()
+            return
+        self._stopping.set()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        with self._lock:
+            queued, self._queued = self._queued, {}
+        cancelled = []
+        for job_id, (future, path) in queued.items():
+            if not future.cancelled():
+                continue
+            cancelled.append(job_id)
+            with self._lock:
+                self._owned.pop(job_id, None)
+            if os.path.exists(path):
+                os.unlink(path)
+        self._mark_failed(cancelled, "Server shut down before the job started")
+
+        with self._drained:
+            self._drained.wait_for(lambda: not self._owned, timeout=timeout)
+            unfinished = list(self._owned)
+        if unfinished:
+            logger.warning(f"Shutting down with {len(unfinished)} ingestion job(s) still running; marking them failed")
+            self._mark_failed(unfinished, "Server shut down while the job was running")
+        self._heartbeat_stop.set()
+        shutdown_extract_pool()
+
+    def _mark_failed(self, job_ids: List[str], error: str):
+        if not job_ids:
+            return
+        with closing(self._connect()) as conn, conn:
+            conn.executemany(
+                "UPDATE ingest_jobs SET status = 'failed', error = ?, finished_at = ?, lease_until = NULL "
+                "WHERE id = ? AND status IN ('queued', 'running')",
+                [(error, time.time(), job_id) for job_id in job_ids]
+            )
+
+    # -------------------------------------------------------------------------
+    # Job execution
+    # -------------------------------------------------------------------------
+    def _claim_slot(self, job_id: str) -> bool:
+        """Mark the job running if it is among the oldest queued jobs that fit in the free global slots."""
+        now = time.time()
+        with closing(self._connect()) as conn:
+            # IMMEDIATE takes the write lock up front, so two workers cannot both take the last slot
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Jobs whose worker stopped renewing the lease will never finish; free their slots
+                conn.execute(
+                    "UPDATE ingest_jobs SET status = 'failed', error = ?, finished_at = ?, lease_until = NULL "
+                    "WHERE status IN ('queued', 'running') AND lease_until < ?",
+                    ("Worker stopped before the job finished", now, now)
+                )
+                running = conn.execute("SELECT COUNT(*) FROM ingest_jobs WHERE status = 'running'").fetchone()[0]
+                free = self.max_concurrency - running
+                next_ids = [
+                    row["id"] for row in conn.execute(
+                        "SELECT id FROM ingest_jobs WHERE status = 'queued' ORDER BY created_at, id LIMIT ?",
+                        (max(0, free),)
+                    )
+                ]
+                claimed = job_id in next_ids
+                if claimed:
+                    conn.execute(
+                        "UPDATE ingest_jobs SET status = 'running', started_at = ?, lease_until = ? WHERE id = ?",
+                        (now, now + settings.INGEST_JOB_LEASE_SECONDS, job_id)
+                    )
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+        return claimed
+
+    def _finish(self, job_id: str, stats: IngestionStats, result: Optional[Dict[str, Any]], error: Optional[str]):
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                """
+                UPDATE ingest_jobs SET status = ?, finished_at = ?, lease_until = NULL, result = ?, error = ?,
+                    total_pages = ?, pages_parsed = ?, chunks_embedded = ?, points_upserted = ?
+                WHERE id = ?
+                """,
+                (
+                    "failed" if error is not None else "completed",
+                    time.time(),
+                    json.dumps(result) if result is not None else None,
+                    error,
+                    *(getattr(stats, name) for name in PROGRESS_FIELDS),
+                    job_id
+                )
+            )
+
+    def _run(self, job_id: str, path: str):
+        with self._lock:
+            self._queued.pop(job_id, None)
+            stats = self._owned[job_id]
+        result = None
+        error = None
+        try:
+            while not self._claim_slot(job_id):
+                if self._stopping.wait(settings.INGEST_POLL_INTERVAL_SECONDS):
+                    raise RuntimeError("Server shut down before the job started")
+            stats = ingest_pdf(path, stats.filename, stats.user_id, stats=stats)
+            result = {
+                "message": (
+                    f"PDF already ingested as '{stats.duplicate_of}', skipped"
+                    if stats.skipped else "PDF processed successfully"
+                ),
+                "skipped": stats.skipped,
+                "doc_hash": stats.doc_hash,
+                "chunks_stored": stats.points_upserted,
+                "pages_parsed": stats.pages_parsed,
+                "filename": stats.filename,
+                "user_id": stats.user_id,
+                "embedding_cache": {
+                    "hits": stats.embedding_cache_hits,
+                    "misses": stats.embedding_cache_misses,
+                    "hit_rate": round(stats.embedding_cache_hit_rate, 4)
+                },
+                "elapsed_seconds": round(stats.elapsed_seconds, 3)
+            }
+        except Exception as e:
+            logger.exception(f"Ingestion job {job_id} failed")
+            error = str(e)
+        finally:
+            try:
+                self._finish(job_id, stats, result, error)
+            finally:
+                with self._drained:
+                    self._owned.pop(job_id, None)
+                    self._drained.notify_all()
+                if os.path.exists(path):
+                    os.unlink(path)
+
+    def _heartbeat_forever(self):
+        """Write progress and renew the lease of this process's jobs until shutdown."""
+        while not self._heartbeat_stop.wait(settings.INGEST_POLL_INTERVAL_SECONDS):
+            with self._lock:
+                owned = list(self._owned.items())
+            if not owned:
+                continue
+            lease_until = time.time() + settings.INGEST_JOB_LEASE_SECONDS
+            try:
+                with closing(self._connect()) as conn, conn:
+                    conn.executemany(
+                        """
+                        UPDATE ingest_jobs SET lease_until = ?,
+                            total_pages = ?, pages_parsed = ?, chunks_embedded = ?, points_upserted = ?
+                        WHERE id = ? AND status IN ('queued', 'running')
+                        """,
+                        [
+                            (lease_until, *(getattr(stats, name) for name in PROGRESS_FIELDS), job_id)
+                            for job_id, stats in owned
+                        ]
+                    )
+            except sqlite3.Error as e:
+                logger.warning(f"Failed to record ingestion job progress: {e}")
+
+
+# Singleton instance
+ingestion_jobs = IngestionJobQueue(
+    path=settings.DOCUMENT_REGISTRY_PATH,
+    max_concurrency=settings.INGEST_MAX_CONCURRENCY,
+    job_ttl_seconds=settings.INGEST_JOB_TTL_SECONDS
+)
@@ -0,0 +1,54 @@
+import logging
+import os
+import sys
+import time
+from typing import Any, Callable, Dict
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import settings
+from RAG.document_registry import get_document_registry
+from RAG.embedding_and_store import get_embed_model, get_vector_store
+from services.gemini_service import get_gemini_service
+from services.webhook_outbox import get_webhook_outbox
+from services.tavily_service import get_tavily_client
+from services.weather_service import get_weather_client
+
+logger = logging.getLogger(__name__)
+
+# Resource name -> {"status": "ok" | "error", "seconds": float, "error": str}
+startup_timings: Dict[str, Dict[str, Any]] = {}
+
+
+def _timed(name: str, init: Callable[[], Any]):
+    start = time.perf_counter()
+    try:
+        init()
+        startup_timings[name] = {"status": "ok", "seconds": round(time.perf_counter() - start, 3)}
+        logger.info(f"Initialized {name} in {startup_timings[name]['seconds']:.3f}s")
+    except Exception as e:
+        # Startup continues; the accessor retries on first use
+        startup_timings[name] = {
+            "status": "error",
+            "seconds": round(time.perf_counter() - start, 3),
+            "error": str(e)
+        }
+        logger.error(f"Failed to initialize {name}: {e}")
+
+
+def initialize_resources() -> Dict[str, Dict[str, Any]]:
+    """
+    Eagerly create the lazily initialized resources, timing each one.
+
+    A failing resource (e.g. Qdrant being down) is recorded but does not abort
+    startup.
+    """
+    _timed("vector_store", lambda: get_vector_store().open())
+    _timed("embedding_model", get_embed_model)
+    if settings.EMBEDDING_WARMUP and startup_timings["embedding_model"]["status"] == "ok":
+        _timed("embedding_warmup", lambda: get_embed_model().encode("query: warmup"))
+    _timed("document_registry", get_document_registry)
+    _timed("webhook_outbox", get_webhook_outbox)
+    _timed("gemini", get_gemini_service)
+    _timed("tavily", get_tavily_client)
+    _timed("weather", get_weather_client)
+    return startup_timings
@@ -1,20 +1,41 @@
+import asyncio
 import logging
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 import sys
 import os
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from qdrant_client.http.models import Filter, FieldCondition, MatchValue
-from RAG.embedding_and_store import client as qdrant_client, embed_model
+from RAG.embedding_and_store import get_embed_model, get_vector_store
 from config import settings
+from src.cache import LRUCache, index_generations
+from RAG.sparse import encode_query as encode_sparse_query, identifier_terms, tokenize
 
 logger = logging.getLogger(__name__)
 
+# Query text -> embedding, shared across users
+query_embedding_cache = LRUCache(settings.QUERY_EMBEDDING_CACHE_SIZE)
+# (user_id, query, top_k, index generation) -> rag_search result
+rag_result_cache = LRUCache(settings.RAG_RESULT_CACHE_SIZE)
+# Whether the vector store supports hybrid (dense + BM25) retrieval; detected lazily
+_hybrid_enabled: Optional[bool] = None
+
+
+def embed_query(query: str) -> List[float]:
+    """Embed query text, reusing cached embeddings for repeated queries."""
+    embedding = query_embedding_cache.get(query)
+    if embedding is None:
+        embedding = get_embed_model().encode(query).tolist()
+        query_embedding_cache.set(query, embedding)
+    return embedding
+
 
 async def rag_search(query: str, top_k: int = 5, user_id: str = "anonymous") -> Dict[str, Any]:
     """
     Search RAG collection for relevant chunks.
     
+    Results are cached per (user_id, query, top_k) until the user's index
+    generation changes (on upload or delete).
+    
     Args:
         query: Search query
         top_k: Number of results to return
@@ -23,132 +44,166 @@ async def rag_search(query: str, top_k: int = 5, user_id: str = "anonymous") ->
     Returns:
         Dictionary with 'results', 'count', 'query', and 'embedding_tokens'
     """
+    cache_key = (user_id, query, top_k, await index_generations.aget(user_id))
+    cached = rag_result_cache.get(cache_key)
+    if cached is not None:
+        logger.debug(f"RAG result cache hit for query: '{query}' (user_id: {user_id})")
+        return dict(cached, embedding_tokens=0)
+
     try:
-        logger.info(f"Starting RAG search for query: '{query}' (user_id: {user_id})")
-        
-        # Generate query embedding and track tokens (rough estimation)
-        query_embedding = embed_model.encode(query).tolist()
-        # Estimate embedding tokens (rough calculation: ~4 chars per token)
-        embedding_tokens = max(1, len(query) // 4)
-        logger.info(f"Generated query embedding with {len(query_embedding)} dimensions (estimated {embedding_tokens} tokens)")
-        
-        # First try without user_id filter to see if any documents exist
-        logger.info("Attempting search without user_id filter to check document availability...")
-        import asyncio
-        loop = asyncio.get_event_loop()
-        all_results = await loop.run_in_executor(
-            None,
-            lambda: qdrant_client.search(
-                collection_name="KnowMe_chunks",
-                query_vector=query_embedding,
-                limit=top_k
-            )
+        result = await _search(query, top_k, user_id)
+    except Exception as e:
+        logger.error(f"Error in RAG search: {e}")
+        return _empty_result(query)
+
+    rag_result_cache.set(cache_key, result)
+    return result
+
+
+async def _search(query: str, top_k: int, user_id: str):
+    """Embed the query and search the vector store. Raises on failure so errors are never cached."""
+    # Generate query embedding off the event loop (the model runs on a cache miss)
+    query_embedding = await asyncio.to_thread(embed_query, query)
+    # Estimate embedding tokens (rough calculation: ~4 chars per token)
+    embedding_tokens = max(1, len(query) // 4)
+    
+    # Single tenant-scoped search: the user_id payload index keeps this
+    # proportional to the user's own data rather than the whole collection
+    search_filter = {"user_id": user_id}
+    
+    if settings.RAG_RETRIEVAL_MODE == "hybrid" and await _hybrid_available():
+        formatted_results = await _hybrid_search(query, query_embedding, search_filter, top_k)
+    else:
+        formatted_results = await _dense_search(query_embedding, search_filter, top_k)
+    
+    if len(formatted_results) == 0:
+        logger.warning(f"No documents found in RAG for user_id: '{user_id}'")
+        return _empty_result(query, embedding_tokens)
+    
+    if logger.isEnabledFor(logging.DEBUG):
+        top = formatted_results[0]
+        logger.debug(
+            f"Top result for '{query}': score={top['score']:.4f} source={top['source']} "
+            f"preview={top['text'][:100]}..."
         )
-        
-        logger.info(f"Found {len(all_results)} total results without user filter")
-        
-        # If no results at all, the collection might be empty or query issue
-        if len(all_results) == 0:
-            logger.warning("No results found in RAG collection at all - collection might be empty")
-            return []
-        
-        # Try with user_id filter
-        search_filter = Filter(
-            must=[FieldCondition(key="user_id", match=MatchValue(value=user_id))]
+
+    # Filter by minimum score threshold; exact-term (sparse) matches bypass the
+    # dense cut-off so IDs and names are not thrown away
+    MIN_RAG_SCORE = 0.75  # Increased threshold for better relevance
+    filtered_results = [
+        r for r in formatted_results
+        if r["score"] >= MIN_RAG_SCORE or r.get("exact_match")
+    ]
+    has_exact_match = any(r.get("exact_match") for r in filtered_results)
+    
+    # Additional check: if the best dense score is below 0.80, likely not relevant.
+    # Hybrid results are ordered by fused rank, so the first one need not be the strongest
+    top_score = max((r["score"] for r in filtered_results), default=0.0)
+    if filtered_results and not has_exact_match and top_score < 0.80:
+        # Return empty results to force web_search
+        logger.warning(
+            f"Top RAG score ({top_score:.4f}) is below confidence threshold; returning no results"
         )
-        
-        logger.info(f"Searching RAG with user_id filter: '{user_id}'")
-        
-        # Qdrant search is synchronous, but we're in async context
-        filtered_results = await loop.run_in_executor(
-            None,
-            lambda: qdrant_client.search(
-                collection_name="KnowMe_chunks",
-                query_vector=query_embedding,
-                query_filter=search_filter,
-                limit=top_k
-            )
+        return _empty_result(query, embedding_tokens)
+    
+    # Check if results are generic/unhelpful content
+    if filtered_results:
+        top_result_text = filtered_results[0]["text"].lower().strip()
+        query_lower = query.lower()
+        
+        # Only filter out generic content
+        is_generic_content = (
+            len(top_result_text) < 20 or 
+            top_result_text in ["table:", "contact", "summary", "experience", "education"] or
+            top_result_text.startswith("table:")
         )
         
-        logger.info(f"Found {len(filtered_results)} results with user_id filter")
-        
-        # If filtered results are much fewer, log the available user_ids
-        if len(filtered_results) < len(all_results):
-            logger.warning(f"User filter reduced results from {len(all_results)} to {len(filtered_results)}")
-            # Log sample user_ids from available documents
-            sample_user_ids = set()
-            for result in all_results[:5]:
-                uid = result.payload.get("user_id", "no_user_id")
-                sample_user_ids.add(uid)
-            logger.warning(f"Available user_ids in sample: {sample_user_ids}")
-        
-        # Use filtered results if available, otherwise use all results
-        results_to_use = filtered_results if len(filtered_results) > 0 else all_results
-        logger.info(f"Using {len(results_to_use)} results for processing")
-        
-        # Format results
-        formatted_results = []
-        for result in results_to_use:
-            formatted_results.append({
-                "text": result.payload.get("text", ""),
-                "page": result.payload.get("page", 1),
-                "source": result.payload.get("source", "unknown"),
-                "type": result.payload.get("type", "text"),
-                "score": float(result.score)
-            })
-        
-        logger.info(f"RAG search returned {len(formatted_results)} results for query: '{query}' (user_id: {user_id})")
-        
-        if len(formatted_results) == 0:
-            logger.warning(f"No results found in RAG for query: '{query}' with user_id: '{user_id}'")
-        else:
-            logger.info(f"Top result score: {formatted_results[0]['score']:.4f}")
-            logger.info(f"Top result source: {formatted_results[0]['source']}")
-            logger.info(f"Top result preview: {formatted_results[0]['text'][:100]}...")
-
-        # Filter by minimum score threshold
-        MIN_RAG_SCORE = 0.75  # Increased threshold for better relevance
-        filtered_results = [r for r in formatted_results if r["score"] >= MIN_RAG_SCORE]
-        
-        # Additional check: if top score is below 0.80, likely not relevant
-        if filtered_results and filtered_results[0]["score"] < 0.80:
-            logger.warning(f"Top RAG score ({filtered_results[0]['score']:.4f}) is below confidence threshold. Results may not be relevant.")
-            # Return empty results to force web_search
-            logger.info("Returning empty results due to low relevance score")
-            return []
-        
-        # Check if results are generic/unhelpful content
-        if filtered_results:
-            top_result_text = filtered_results[0]["text"].lower().strip()
-            query_lower = query.lower()
-            
-            # Only filter out generic content
-            is_generic_content = (
-                len(top_result_text) < 20 or 
-                top_result_text in ["table:", "contact", "summary", "experience", "education"] or
-                top_result_text.startswith("table:")
-            )
-            
-            if is_generic_content:
-                logger.warning(f"RAG results contain generic/unhelpful content: '{top_result_text[:50]}...'")
-                logger.info("Returning empty results due to generic content")
-                return []
-        
-        logger.info(f"Filtered results: {len(filtered_results)} (from {len(formatted_results)} total)")
-        
-        return {
-            "results": filtered_results,
-            "count": len(filtered_results),
-            "query": query,
-            "embedding_tokens": embedding_tokens
-        }
+        if is_generic_content:
+            logger.warning(f"RAG results contain generic/unhelpful content: '{top_result_text[:50]}...'; returning no results")
+            return _empty_result(query, embedding_tokens)
     
-    except Exception as e:
-        logger.error(f"Error in RAG search: {e}")
-        return {
-            "results": [],
-            "count": 0,
-            "query": query,
-            "embedding_tokens": 0
-        }
+    # One summary line per query at INFO; details above are DEBUG
+    logger.info(
+        f"RAG search kept {len(filtered_results)} of {len(formatted_results)} results (user_id: {user_id})",
+        extra={"user_id": user_id, "results": len(formatted_results), "kept": len(filtered_results)}
+    )
+    
+    return {
+        "results": filtered_results,
+        "count": len(filtered_results),
+        "query": query,
+        "embedding_tokens": embedding_tokens
+    }
+
+
+def _empty_result(query: str, embedding_tokens: int = 0) -> Dict[str, Any]:
+    """No relevant chunks; same shape as a normal result so callers never special-case it."""
+    return {
+        "results": [],
+        "count": 0,
+        "query": query,
+        "embedding_tokens": embedding_tokens
+    }
+
+
+def _format_hit(hit) -> Dict[str, Any]:
+    return {
+        "text": hit.payload.get("text", ""),
+        "page": hit.payload.get("page", 1),
+        "source": hit.payload.get("source", "unknown"),
+        "type": hit.payload.get("type", "text"),
+        "score": float(hit.score)
+    }
+
+
+async def _dense_search(query_embedding: List[float], search_filter: Dict[str, Any], top_k: int) -> List[Dict[str, Any]]:
+    hits = await get_vector_store().asearch(query_embedding, search_filter, top_k)
+    return [_format_hit(hit) for hit in hits]
+
+
+async def _hybrid_available() -> bool:
+    """Whether the vector store has BM25 sparse vectors (checked once per process)."""
+    global _hybrid_enabled
+    if _hybrid_enabled is None:
+        _hybrid_enabled = await get_vector_store().asupports_sparse()
+        if not _hybrid_enabled:
+            logger.warning("Hybrid retrieval unavailable (no sparse vectors); using dense search")
+    return _hybrid_enabled
+
+
+async def _hybrid_search(query: str, query_embedding: List[float], search_filter: Dict[str, Any], top_k: int) -> List[Dict[str, Any]]:
+    """
+    Dense and BM25 searches in one batched round trip, merged with reciprocal-rank fusion.
+
+    "score" stays the dense cosine (0.0 for sparse-only hits) so relevance
+    thresholds keep their meaning; "rrf_score" orders the results and "matched"
+    lists which retrievers found each chunk. "exact_match" is set only when a
+    top-ranked term hit contains one of the query's identifier or name terms
+    (e.g. an invoice number or "Acme"); a shared common word is not enough to
+    bypass the dense relevance checks.
+    """
+    prefetch = max(top_k, settings.RAG_HYBRID_PREFETCH)
+    hit_lists = await get_vector_store().asearch_hybrid(
+        query_embedding, encode_sparse_query(query), search_filter, prefetch
+    )
+
+    query_identifiers = identifier_terms(query)
+    fused: Dict[Any, Dict[str, Any]] = {}
+    for retriever, hits in zip(("dense", "sparse"), hit_lists):
+        for rank, hit in enumerate(hits):
+            entry = fused.get(hit.id)
+            if entry is None:
+                entry = _format_hit(hit)
+                entry.update(score=0.0, rrf_score=0.0, matched=[], exact_match=False)
+                fused[hit.id] = entry
+            entry["rrf_score"] += 1.0 / (settings.RAG_RRF_K + rank + 1)
+            if retriever == "dense":
+                entry["score"] = float(hit.score)
+            # Only top-ranked term matches count as exact matches
+            if retriever == "dense" or rank < top_k:
+                entry["matched"].append(retriever)
+            if retriever == "sparse" and rank < top_k and query_identifiers:
+                entry["exact_match"] = not query_identifiers.isdisjoint(tokenize(entry["text"]))
 
+    ranked = sorted(fused.values(), key=lambda r: r["rrf_score"], reverse=True)
+    return ranked[:top_k]
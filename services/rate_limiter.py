@@ -0,0 +1,270 @@
+import asyncio
+import logging
+import random
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict
+
+from config import settings
+from src.metrics import (
+    GEMINI_ADMISSION_SECONDS, GEMINI_CALL_OUTCOMES, GEMINI_RATE_LIMITED, GEMINI_RETRIES, GEMINI_TOKENS
+)
+
+logger = logging.getLogger(__name__)
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    error_str = str(error)
+    return "429" in error_str or "RESOURCE_EXHAUSTED" in error_str
+
+
+class TokenBucket:
+    """Async token bucket refilled continuously at `per_minute` units per minute. 0 disables it."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.tokens = self.capacity
+        self.rate = self.capacity / 60.0
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount: float = 1.0):
+        if self.capacity <= 0:
+            return
+        amount = min(amount, self.capacity)
+        # Waiters queue on the lock, so capacity is handed out in FIFO order
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+
+    def debit(self, amount: float):
+        """Charge usage after the fact (e.g. actual tokens above the estimate); may go negative."""
+        if self.capacity <= 0:
+            return
+        self._refill()
+        self.tokens -= amount
+
+
+class AdaptiveConcurrency:
+    """
+    AIMD concurrency cap: grows by ~1 per `limit` successes, halves on a rate-limit
+    response, and stays within [minimum, maximum].
+    """
+
+    def __init__(self, initial: int, minimum: int, maximum: int):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.limit = float(min(max(initial, self.minimum), self.maximum))
+        self.in_flight = 0
+        self._condition = asyncio.Condition()
+
+    async def acquire(self):
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+
+    async def release(self, rate_limited: bool = False):
+        async with self._condition:
+            self.in_flight -= 1
+            if rate_limited:
+                self.limit = max(float(self.minimum), self.limit / 2)
+            else:
+                self.limit = min(float(self.maximum), self.limit + 1.0 / self.limit)
+            self._condition.notify_all()
+
+
+class GeminiRateLimiter:
+    """
+    Client-side admission control in front of Gemini generate_content calls.
+
+    Each call waits for a concurrency slot, one request from the RPM bucket and
+    its estimated prompt tokens from the TPM bucket before it is sent. 429 /
+    RESOURCE_EXHAUSTED responses shrink the concurrency cap and are retried with
+    jittered exponential backoff, so concurrent requests do not retry in lockstep.
+
+    The buckets and the concurrency cap live in each process. With several
+    uvicorn workers, pass `workers` (API_WORKERS) and each process gets an even
+    share of RPM, TPM and max concurrency, so together they stay within quota.
+    """
+
+    def __init__(
+        self,
+        rpm: int,
+        tpm: int,
+        max_concurrency: int,
+        min_concurrency: int,
+        max_retries: int,
+        retry_base_seconds: float,
+        workers: int = 1
+    ):
+        workers = max(1, workers)
+        self.requests = TokenBucket(rpm / workers)
+        self.tokens = TokenBucket(tpm / workers)
+        max_concurrency = max(1, max_concurrency // workers)
+        self.concurrency = AdaptiveConcurrency(max_concurrency, min(min_concurrency, max_concurrency), max_concurrency)
+        self.max_retries = max_retries
+        self.retry_base_seconds = retry_base_seconds
+
+        self.calls = 0
+        self.retries = 0
+        self.rate_limited = 0
+        self.waiting = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    async def _admit(self, estimated_tokens: int):
+        start = time.perf_counter()
+        self.waiting += 1
+        try:
+            await self.concurrency.acquire()
+            try:
+                await self.requests.acquire(1)
+                await self.tokens.acquire(estimated_tokens)
+            except BaseException:
+                await self.concurrency.release()
+                raise
+        finally:
+            self.waiting -= 1
+        waited = time.perf_counter() - start
+        GEMINI_ADMISSION_SECONDS.observe(waited)
+        self.total_wait_seconds += waited
+        self.max_wait_seconds = max(self.max_wait_seconds, waited)
+        if waited > 1.0:
+            logger.info(f"Gemini call waited {waited:.2f}s for rate limiter admission")
+
+    def _settle(self, usage: Any, estimated_tokens: int):
+        """Reconcile the TPM bucket with the reported prompt tokens when they exceed the estimate."""
+        total = getattr(usage, "total_token_count", None) if usage else None
+        if total:
+            GEMINI_TOKENS.inc(total)
+        # GEMINI_TPM and the estimate both count prompt tokens; output tokens are not charged
+        prompt = getattr(usage, "prompt_token_count", None) if usage else None
+        if prompt and prompt > estimated_tokens:
+            self.tokens.debit(prompt - estimated_tokens)
+
+    async def _back_off(self, attempt: int, error: Exception):
+        """Sleep before retry `attempt`, or re-raise `error` once retries are exhausted."""
+        self.rate_limited += 1
+        GEMINI_RATE_LIMITED.inc()
+        if attempt > self.max_retries:
+            logger.error(f"Rate limit exceeded after {self.max_retries} retries")
+            raise error
+
+        # Full jitter spreads out the retries of concurrent requests
+        wait_time = random.uniform(0, self.retry_base_seconds * 2 ** attempt)
+        self.retries += 1
+        GEMINI_RETRIES.inc()
+        logger.warning(
+            f"Rate limit hit. Retrying in {wait_time:.2f}s... (attempt {attempt}/{self.max_retries}, "
+            f"concurrency cap now {int(self.concurrency.limit)})"
+        )
+        await asyncio.sleep(wait_time)
+
+    async def call(self, make_call: Callable[[], Awaitable[Any]], estimated_tokens: int = 0) -> Any:
+        attempt = 0
+        while True:
+            await self._admit(estimated_tokens)
+            self.calls += 1
+            call_start = time.perf_counter()
+            rate_limited = False
+            try:
+                result = await make_call()
+            except Exception as e:
+                rate_limited = is_rate_limit_error(e)
+                GEMINI_CALL_OUTCOMES["rate_limited" if rate_limited else "error"].observe(
+                    time.perf_counter() - call_start
+                )
+                if not rate_limited:
+                    raise
+                error = e
+            else:
+                GEMINI_CALL_OUTCOMES["ok"].observe(time.perf_counter() - call_start)
+            finally:
+                # Also on cancellation (client disconnect, tool/request timeout)
+                await self.concurrency.release(rate_limited=rate_limited)
+
+            if rate_limited:
+                attempt += 1
+                await self._back_off(attempt, error)
+                continue
+
+            self._settle(getattr(result, "usage_metadata", None), estimated_tokens)
+            return result
+
+    async def stream(
+        self,
+        open_stream: Callable[[], Awaitable[AsyncIterator[Any]]],
+        estimated_tokens: int = 0
+    ) -> AsyncIterator[Any]:
+        """
+        Like call(), for streaming responses: yields the stream's chunks.
+
+        The concurrency slot is held until the stream is exhausted or closed, and the
+        TPM bucket is reconciled with the last usage_metadata seen. Rate limits are
+        retried only before the first chunk; later errors propagate.
+        """
+        attempt = 0
+        while True:
+            await self._admit(estimated_tokens)
+            self.calls += 1
+            call_start = time.perf_counter()
+            rate_limited = False
+            started = False
+            usage = None
+            try:
+                stream = await open_stream()
+                async for chunk in stream:
+                    started = True
+                    # Usage metadata is cumulative per stream; keep the last one
+                    usage = getattr(chunk, "usage_metadata", None) or usage
+                    yield chunk
+            except Exception as e:
+                rate_limited = is_rate_limit_error(e)
+                GEMINI_CALL_OUTCOMES["rate_limited" if rate_limited else "error"].observe(
+                    time.perf_counter() - call_start
+                )
+                if not rate_limited or started:
+                    raise
+                error = e
+            else:
+                GEMINI_CALL_OUTCOMES["ok"].observe(time.perf_counter() - call_start)
+            finally:
+                await self.concurrency.release(rate_limited=rate_limited)
+                self._settle(usage, estimated_tokens)
+
+            if not rate_limited:
+                return
+            attempt += 1
+            await self._back_off(attempt, error)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "retries": self.retries,
+            "rate_limited": self.rate_limited,
+            "waiting": self.waiting,
+            "in_flight": self.concurrency.in_flight,
+            "concurrency_limit": int(self.concurrency.limit),
+            "avg_wait_seconds": round(self.total_wait_seconds / self.calls, 4) if self.calls else 0.0,
+            "max_wait_seconds": round(self.max_wait_seconds, 4)
+        }
+
+
+# Singleton instance shared by every GeminiService call
+gemini_rate_limiter = GeminiRateLimiter(
+    rpm=settings.GEMINI_RPM,
+    tpm=settings.GEMINI_TPM,
+    max_concurrency=settings.GEMINI_MAX_CONCURRENCY,
+    min_concurrency=settings.GEMINI_MIN_CONCURRENCY,
+    max_retries=settings.GEMINI_MAX_RETRIES,
+    retry_base_seconds=settings.GEMINI_RETRY_BASE_SECONDS,
+    workers=settings.API_WORKERS
+)
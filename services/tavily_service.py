@@ -1,17 +1,61 @@
 import logging
+import re
+import time
 from typing import Dict
-from tavily import TavilyClient
+
+import httpx
+
 from config import settings
+from services.http_clients import get_http_client
+from src.cache import TTLCache, SingleFlight
 
 logger = logging.getLogger(__name__)
 
-# Initialize Tavily client
-tavily_client = TavilyClient(api_key=settings.TAVILY_API_KEY)
+TAVILY_API_URL = "https://api.tavily.com"
+
+# (normalized query, depth) -> search result
+web_search_cache = TTLCache(settings.WEB_SEARCH_CACHE_SIZE, settings.WEB_SEARCH_CACHE_TTL_SECONDS)
+_web_search_flight = SingleFlight()
+
+
+def get_tavily_client() -> httpx.AsyncClient:
+    """Return the pooled HTTP client used for Tavily requests."""
+    return get_http_client("tavily", base_url=TAVILY_API_URL, timeout=httpx.Timeout(30.0, connect=5.0))
+
+
+def normalize_query(query: str) -> str:
+    return re.sub(r"\s+", " ", query.strip().lower())
+
+
+async def _tavily_search(query: str, search_depth: str) -> Dict:
+    start = time.perf_counter()
+    response = await get_tavily_client().post(
+        "/search",
+        json={
+            "api_key": settings.TAVILY_API_KEY,
+            "query": query,
+            "search_depth": search_depth,
+            "max_results": 5,
+        },
+        headers={"Authorization": f"Bearer {settings.TAVILY_API_KEY}"},
+    )
+    response.raise_for_status()
+    data = response.json()
+
+    return {
+        "query": query,
+        "results": data.get("results", []),
+        "answer": data.get("answer", ""),
+        "response_time": data.get("response_time", round(time.perf_counter() - start, 3)),
+    }
 
 
 async def web_search(query: str, depth: str = "basic") -> Dict:
     """
-    Perform Tavily web search without caching.
+    Perform Tavily web search over a pooled async HTTP client.
+
+    Results are cached per (normalized query, depth) for WEB_SEARCH_CACHE_TTL_SECONDS,
+    and concurrent identical searches share a single upstream request.
 
     Args:
         query: Search keyword
@@ -23,22 +67,22 @@ async def web_search(query: str, depth: str = "basic") -> Dict:
 
     try:
         search_depth = "advanced" if depth == "advanced" else "basic"
+        key = (normalize_query(query), search_depth)
 
-        response = tavily_client.search(
-            query=query,
-            search_depth=search_depth,
-            max_results=5,
-        )
+        cached = web_search_cache.get(key)
+        if cached is not None:
+            logger.info(f"Tavily cache hit for: {query}")
+            return dict(cached, query=query)
 
-        result = {
-            "query": query,
-            "results": response.get("results", []),
-            "answer": response.get("answer", ""),
-            "response_time": response.get("response_time", 0),
-        }
+        async def fetch():
+            result = await _tavily_search(query, search_depth)
+            web_search_cache.set(key, result)
+            return result
+
+        result = await _web_search_flight.do(key, fetch)
 
         logger.info(f"Tavily search completed for: {query}")
-        return result
+        return dict(result, query=query)
 
     except Exception as e:
         logger.error(f"Error in Tavily search: {e}")
@@ -47,4 +91,6 @@ async def web_search(query: str, depth: str = "basic") -> Dict:
             "results": [],
             "answer": f"Error performing search: {str(e)}",
             "response_time": 0,
+            # Marks the result as failed for tool metrics and the answer cache, like the other tools
+            "error": str(e),
         }
@@ -1,15 +1,62 @@
 import logging
+import re
 from typing import Dict
 import httpx
 from config import settings
+from services.http_clients import get_http_client
+from src.cache import TTLCache, SingleFlight
 
 logger = logging.getLogger(__name__)
 
+OPENWEATHERMAP_API_URL = "https://api.openweathermap.org"
+
+# (normalized location, unit) -> weather result
+weather_cache = TTLCache(settings.WEATHER_CACHE_SIZE, settings.WEATHER_CACHE_TTL_SECONDS)
+_weather_flight = SingleFlight()
+
+
+def get_weather_client() -> httpx.AsyncClient:
+    """Return the app-lifetime keep-alive (HTTP/2) client for OpenWeatherMap."""
+    return get_http_client(
+        "openweathermap",
+        base_url=OPENWEATHERMAP_API_URL,
+        http2=settings.WEATHER_HTTP2,
+        timeout=httpx.Timeout(10.0, connect=5.0)
+    )
+
+
+def normalize_location(location: str) -> str:
+    return re.sub(r"\s*,\s*", ",", re.sub(r"\s+", " ", location.strip().lower()))
+
+
+async def _fetch_weather(location: str, unit: str) -> Dict:
+    params = {
+        "q": location,
+        "appid": settings.WEATHER_API_KEY,
+        "units": unit
+    }
+    
+    response = await get_weather_client().get("/data/2.5/weather", params=params)
+    response.raise_for_status()
+    data = response.json()
+    
+    return {
+        "location": location,
+        "temperature": data["main"]["temp"],
+        "description": data["weather"][0]["description"],
+        "humidity": data["main"]["humidity"],
+        "wind_speed": data.get("wind", {}).get("speed", 0),
+        "unit": unit
+    }
+
 
 async def get_weather(location: str, unit: str = "metric") -> Dict:
     """
     Get weather data using OpenWeatherMap API.
     
+    Results are cached per (normalized location, unit) for WEATHER_CACHE_TTL_SECONDS
+    and concurrent identical lookups share one upstream request.
+    
     Args:
         location: City name or location
         unit: Temperature unit ("metric" for Celsius, "imperial" for Fahrenheit)
@@ -18,29 +65,22 @@ async def get_weather(location: str, unit: str = "metric") -> Dict:
         Dictionary with weather data
     """
     try:
-        async with httpx.AsyncClient() as client:
-            url = "https://api.openweathermap.org/data/2.5/weather"
-            params = {
-                "q": location,
-                "appid": settings.WEATHER_API_KEY,
-                "units": unit
-            }
-            
-            response = await client.get(url, params=params, timeout=10.0)
-            response.raise_for_status()
-            data = response.json()
-            
-            result = {
-                "location": location,
-                "temperature": data["main"]["temp"],
-                "description": data["weather"][0]["description"],
-                "humidity": data["main"]["humidity"],
-                "wind_speed": data.get("wind", {}).get("speed", 0),
-                "unit": unit
-            }
-            
-            logger.info(f"Weather fetched for: {location}")
+        key = (normalize_location(location), unit)
+        
+        cached = weather_cache.get(key)
+        if cached is not None:
+            logger.info(f"Weather cache hit for: {location}")
+            return dict(cached, location=location)
+        
+        async def fetch():
+            result = await _fetch_weather(location, unit)
+            weather_cache.set(key, result)
             return result
+        
+        result = await _weather_flight.do(key, fetch)
+        
+        logger.info(f"Weather fetched for: {location}")
+        return dict(result, location=location)
     
     except Exception as e:
         logger.error(f"Error fetching weather: {e}")
@@ -48,4 +88,3 @@ async def get_weather(location: str, unit: str = "metric") -> Dict:
             "location": location,
             "error": f"Failed to fetch weather: {str(e)}"
         }
-
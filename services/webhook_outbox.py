@@ -0,0 +1,279 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+
+import httpx
+
+from config import settings
+from services.http_clients import get_http_client
+from src.metrics import WEBHOOK_DELIVERY_LAG_SECONDS, WEBHOOK_QUEUE_DEPTH
+
+logger = logging.getLogger(__name__)
+
+
+class PermanentDeliveryError(Exception):
+    """The endpoint rejected the request in a way retrying will not fix (e.g. 404)."""
+
+
+class WebhookOutbox:
+    """
+    Durable outbox for webhook events.
+
+    Events are appended to a SQLite spool and acknowledged immediately; a
+    background dispatcher delivers them over a pooled HTTP client, retrying with
+    jittered exponential backoff. Delivered events are removed from the spool;
+    events that fail permanently or exhaust WEBHOOK_MAX_ATTEMPTS are kept with
+    status 'dead' for inspection. Pending events survive restarts.
+
+    Every worker process runs a dispatcher against the same spool, so events are
+    claimed (status 'sending' with a lease) before they are posted; a claim whose
+    worker died expires after WEBHOOK_LEASE_SECONDS and the event is retried.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS events (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    event_type TEXT NOT NULL,
+                    body TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    next_attempt_at REAL NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    last_error TEXT,
+                    lease_until REAL
+                )
+                """
+            )
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(events)")}
+            if "lease_until" not in columns:
+                # Spools created before delivery leases existed
+                conn.execute("ALTER TABLE events ADD COLUMN lease_until REAL")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_events_due ON events (status, next_attempt_at)")
+
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self.delivered = 0
+        self.failed_attempts = 0
+        self.last_delivery_lag_seconds = 0.0
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    # -------------------------------------------------------------------------
+    # Spool operations (synchronous; called via asyncio.to_thread)
+    # -------------------------------------------------------------------------
+    def _append(self, event_type: str, body: Dict[str, Any]) -> int:
+        now = time.time()
+        with closing(self._connect()) as conn, conn:
+            cursor = conn.execute(
+                "INSERT INTO events (event_type, body, created_at, next_attempt_at) VALUES (?, ?, ?, ?)",
+                (event_type, json.dumps(body, default=str), now, now)
+            )
+        return cursor.lastrowid
+
+    def _claim_due(self, limit: int) -> List[Dict[str, Any]]:
+        """Atomically claim up to `limit` due events (or events whose lease expired) for this dispatcher."""
+        now = time.time()
+        with closing(self._connect()) as conn:
+            # IMMEDIATE takes the write lock up front, so two dispatchers cannot claim the same rows
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = conn.execute(
+                    """
+                    SELECT * FROM events
+                    WHERE (status = 'pending' AND next_attempt_at <= ?)
+                       OR (status = 'sending' AND lease_until <= ?)
+                    ORDER BY id LIMIT ?
+                    """,
+                    (now, now, limit)
+                ).fetchall()
+                conn.executemany(
+                    "UPDATE events SET status = 'sending', lease_until = ? WHERE id = ?",
+                    [(now + settings.WEBHOOK_LEASE_SECONDS, row["id"]) for row in rows]
+                )
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+        return [dict(row) for row in rows]
+
+    def _mark_delivered(self, ids: List[int]):
+        with closing(self._connect()) as conn, conn:
+            conn.executemany("DELETE FROM events WHERE id = ?", [(i,) for i in ids])
+
+    def _mark_failed(self, events: List[Dict[str, Any]], error: str, permanent: bool):
+        now = time.time()
+        updates = []
+        for event in events:
+            attempts = event["attempts"] + 1
+            dead = permanent or attempts >= settings.WEBHOOK_MAX_ATTEMPTS
+            backoff = min(settings.WEBHOOK_MAX_BACKOFF_SECONDS, settings.WEBHOOK_BASE_BACKOFF_SECONDS * 2 ** (attempts - 1))
+            next_attempt = now + backoff * random.uniform(0.5, 1.5)
+            updates.append(("dead" if dead else "pending", attempts, next_attempt, error, event["id"]))
+        with closing(self._connect()) as conn, conn:
+            conn.executemany(
+                "UPDATE events SET status = ?, attempts = ?, next_attempt_at = ?, last_error = ?, lease_until = NULL "
+                "WHERE id = ?",
+                updates
+            )
+
+    def _counts(self) -> Dict[str, Any]:
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                "SELECT status, COUNT(*) AS n, MIN(created_at) AS oldest FROM events GROUP BY status"
+            ).fetchall()
+        return {row["status"]: {"count": row["n"], "oldest": row["oldest"]} for row in rows}
+
+    def update_queue_depth_metric(self):
+        """Read the pending count from the shared spool into the queue-depth gauge (called per scrape)."""
+        try:
+            with closing(self._connect()) as conn:
+                depth = conn.execute("SELECT COUNT(*) FROM events WHERE status = 'pending'").fetchone()[0]
+        except sqlite3.Error as e:
+            logger.warning(f"Could not read webhook queue depth: {e}")
+            return
+        WEBHOOK_QUEUE_DEPTH.set(depth)
+
+    # -------------------------------------------------------------------------
+    # Public API
+    # -------------------------------------------------------------------------
+    async def enqueue(self, event_type: str, body: Dict[str, Any]) -> int:
+        """Persist an event for delivery and wake the dispatcher."""
+        event_id = await asyncio.to_thread(self._append, event_type, body)
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return event_id
+
+    def start(self):
+        """Start the background dispatcher on the running loop."""
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._dispatch_forever())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        counts = self._counts()
+        pending = counts.get("pending", {})
+        oldest = pending.get("oldest")
+        return {
+            "queue_depth": pending.get("count", 0),
+            "sending": counts.get("sending", {}).get("count", 0),
+            "dead_letters": counts.get("dead", {}).get("count", 0),
+            "oldest_pending_age_seconds": round(time.time() - oldest, 3) if oldest else 0.0,
+            "delivered": self.delivered,
+            "failed_attempts": self.failed_attempts,
+            "last_delivery_lag_seconds": round(self.last_delivery_lag_seconds, 3)
+        }
+
+    # -------------------------------------------------------------------------
+    # Dispatcher
+    # -------------------------------------------------------------------------
+    async def _dispatch_forever(self):
+        logger.info("Webhook outbox dispatcher started")
+        while True:
+            # Cleared before the query, so an event enqueued during it still wakes the next wait
+            self._wakeup.clear()
+            try:
+                events = await asyncio.to_thread(self._claim_due, max(1, settings.WEBHOOK_BATCH_SIZE))
+                if events:
+                    await self._deliver(events)
+                    continue
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Webhook outbox dispatcher error: {e}")
+
+            # Sleep until a new event arrives or retries may be due
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=settings.WEBHOOK_POLL_INTERVAL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _deliver(self, events: List[Dict[str, Any]]):
+        ids = [event["id"] for event in events]
+
+        try:
+            bodies = [json.loads(event["body"]) for event in events]
+            # A single event keeps the original request shape; batches are wrapped
+            request_body = bodies[0] if len(bodies) == 1 else {"events": bodies}
+            response = await get_http_client("webhook").post(
+                settings.WEBHOOK_URL,
+                json=request_body,
+                timeout=settings.WEBHOOK_TIMEOUT_SECONDS
+            )
+            if 400 <= response.status_code < 500 and response.status_code not in (408, 429):
+                raise PermanentDeliveryError(f"Webhook returned {response.status_code} error")
+            response.raise_for_status()
+
+        except PermanentDeliveryError as e:
+            self.failed_attempts += len(events)
+            logger.error(f"Webhook events {ids} rejected permanently: {e}")
+            await asyncio.to_thread(self._mark_failed, events, str(e), True)
+            return
+        except (httpx.HTTPError, OSError) as e:
+            self.failed_attempts += len(events)
+            logger.warning(f"Webhook delivery failed for events {ids}, will retry: {e}")
+            await asyncio.to_thread(self._mark_failed, events, str(e), False)
+            return
+        except Exception as e:
+            # Anything else (bad body, bad URL, ...) must still count as an attempt, or the
+            # claimed events would be reclaimed after every lease and never reach dead-letter
+            self.failed_attempts += len(events)
+            logger.exception(f"Webhook delivery failed unexpectedly for events {ids}")
+            await asyncio.to_thread(self._mark_failed, events, f"{type(e).__name__}: {e}", False)
+            return
+
+        await asyncio.to_thread(self._mark_delivered, ids)
+        self.delivered += len(events)
+        now = time.time()
+        for event in events:
+            WEBHOOK_DELIVERY_LAG_SECONDS.observe(now - event["created_at"])
+        self.last_delivery_lag_seconds = now - min(event["created_at"] for event in events)
+        logger.info(f"Delivered {len(events)} webhook event(s) - Status: {response.status_code}")
+
+
+def build_event_body(event_type: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "event_type": event_type,
+        "payload": payload or {"source": "RAG-GEMINI-SDK"},
+        "timestamp": datetime.utcnow().isoformat()
+    }
+
+
+_webhook_outbox: Optional[WebhookOutbox] = None
+_outbox_lock = threading.Lock()
+
+
+def get_webhook_outbox() -> WebhookOutbox:
+    """Return the shared WebhookOutbox, creating its SQLite spool on first use."""
+    global _webhook_outbox
+    if _webhook_outbox is None:
+        with _outbox_lock:
+            if _webhook_outbox is None:
+                _webhook_outbox = WebhookOutbox(settings.WEBHOOK_OUTBOX_PATH)
+    return _webhook_outbox
@@ -1,21 +1,24 @@
 import logging
 from typing import Dict, Any, Optional
-import httpx
 from config import settings
+from services.webhook_outbox import build_event_body, get_webhook_outbox
 
 logger = logging.getLogger(__name__)
 
 
 async def send_webhook_event(event_type: str = "user_action", payload: Optional[Dict[str, Any]] = None) -> Dict:
     """
-    Send webhook event to configured webhook URL (e.g., n8n).
+    Queue a webhook event for the configured webhook URL (e.g., n8n).
+    
+    The event is written to the durable outbox and acknowledged immediately;
+    delivery and retries happen in the background dispatcher.
     
     Args:
         event_type: Type of event (default: "user_action")
         payload: Event payload dictionary (default: empty dict)
     
     Returns:
-        Dictionary with webhook response status
+        Dictionary with queueing status and event id
     """
     logger.info(f"send_webhook_event called with event_type='{event_type}', payload={payload}")
     
@@ -41,52 +44,23 @@ async def send_webhook_event(event_type: str = "user_action", payload: Optional[
         }
     
     try:
-        from datetime import datetime
-        webhook_payload = {
-            "event_type": event_type,
-            "payload": payload or {"source": "RAG-GEMINI-SDK"},
-            "timestamp": datetime.utcnow().isoformat()
-        }
-        
-        logger.info(f"Attempting to send webhook to: {settings.WEBHOOK_URL}")
-        logger.info(f"Webhook payload: {webhook_payload}")
+        webhook_payload = build_event_body(event_type, payload)
         
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                settings.WEBHOOK_URL,
-                json=webhook_payload,
-                timeout=10.0
-            )
-            response.raise_for_status()
-            
-            logger.info(f"Webhook sent successfully: {event_type} - Status: {response.status_code}")
-            return {
-                "success": True,
-                "event_type": event_type,
-                "status_code": response.status_code,
-                "message": "Webhook sent successfully"
-            }
-    
-    except httpx.HTTPStatusError as e:
-        error_msg = f"Webhook returned {e.response.status_code} error"
-        if e.response.status_code == 404:
-            error_msg = "Webhook URL not found (404). Please verify the webhook URL is correct and the n8n workflow is active."
-        elif e.response.status_code == 401 or e.response.status_code == 403:
-            error_msg = "Webhook authentication failed. Check if the webhook requires authentication."
-        
-        logger.error(f"Webhook HTTP error: {error_msg}")
+        # Persist to the outbox and acknowledge; the dispatcher delivers it
+        event_id = await get_webhook_outbox().enqueue(event_type, webhook_payload)
+        logger.info(f"Webhook event {event_id} queued: {event_type}")
         return {
-            "success": False,
+            "success": True,
+            "queued": True,
+            "event_id": event_id,
             "event_type": event_type,
-            "error": error_msg,
-            "status_code": e.response.status_code
+            "message": "Webhook event queued for delivery"
         }
     
     except Exception as e:
-        logger.error(f"Error sending webhook: {e}")
+        logger.error(f"Error queueing webhook: {e}")
         return {
             "success": False,
             "event_type": event_type,
-            "error": f"Failed to send webhook: {str(e)}"
+            "error": f"Failed to queue webhook: {str(e)}"
         }
-
@@ -0,0 +1,170 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+from config import settings
+
+
+class LRUCache:
+    """Thread-safe in-process LRU cache with hit/miss counters."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = max(0, maxsize)
+        self._data: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key: Hashable, value: Any):
+        if self.maxsize == 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0
+        }
+
+
+class IndexGenerations:
+    """
+    Per-user counters that change whenever a user's indexed documents change.
+
+    Caches include the current generation in their keys, so bumping it on upload
+    or delete makes every older entry for that user unreachable. The counters are
+    stored in the document registry's SQLite file, so a bump in one process (an
+    upload handled by another uvicorn worker) is seen by every process's caches.
+
+    Reads are served from an in-process copy for `ttl_seconds`, so cache hits
+    cost no SQLite read or thread hop; a bump in this process updates the copy
+    at once, and a bump in another worker is seen within `ttl_seconds`.
+    """
+
+    def __init__(self, ttl_seconds: float = 1.0, maxsize: int = 10000):
+        self._local = TTLCache(maxsize, ttl_seconds)
+
+    @staticmethod
+    def _registry():
+        from RAG.document_registry import get_document_registry
+        return get_document_registry()
+
+    def get(self, user_id: str) -> int:
+        generation = self._local.get(user_id)
+        if generation is None:
+            generation = self._registry().get_generation(user_id)
+            self._local.set(user_id, generation)
+        return generation
+
+    async def aget(self, user_id: str) -> int:
+        """get() for use on the event loop; only a miss on the local copy goes to a worker thread."""
+        generation = self._local.get(user_id)
+        if generation is None:
+            generation = await asyncio.to_thread(self.get, user_id)
+        return generation
+
+    def bump(self, user_id: str) -> int:
+        generation = self._registry().bump_generation(user_id)
+        self._local.set(user_id, generation)
+        return generation
+
+
+class TTLCache:
+    """In-process LRU cache whose entries expire after a fixed time-to-live."""
+
+    def __init__(self, maxsize: int, ttl_seconds: float):
+        self.maxsize = max(0, maxsize)
+        self.ttl_seconds = ttl_seconds
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None and item[0] > time.monotonic():
+                self._data.move_to_end(key)
+                self.hits += 1
+                return item[1]
+            if item is not None:
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key: Hashable, value: Any):
+        if self.maxsize == 0 or self.ttl_seconds <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0
+        }
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent async calls with the same key into one execution.
+
+    The call runs in its own task owned by the flight; every caller, including
+    the first, awaits it through asyncio.shield, so a caller that is cancelled
+    (e.g. by its own timeout) does not cancel the call for the others.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, "asyncio.Task"] = {}
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+        return await asyncio.shield(task)
+
+    def _finish(self, key: Hashable, task: "asyncio.Task"):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Mark retrieved so a failure nobody awaited any more does not log a warning
+        if not task.cancelled():
+            task.exception()
+
+
+# Singleton instance (defined after TTLCache, which it uses)
+index_generations = IndexGenerations(ttl_seconds=settings.INDEX_GENERATION_TTL_SECONDS)
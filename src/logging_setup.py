@@ -0,0 +1,196 @@
+"""
+Queue-backed, structured logging.
+
+Callers only format the message and enqueue the record; a QueueListener thread
+does the JSON/text formatting and the stream/file I/O, so the event loop never
+blocks on disk. The queue is bounded: when the writer falls behind, records are
+dropped and counted instead of stalling requests.
+
+Every record carries the current correlation ID (one per HTTP request or
+ingestion job, see `correlation_id`). Per-item DEBUG logs (one per chunk) go
+through a `LogSampler`, so even with DEBUG enabled only 1 in N is emitted.
+"""
+import contextvars
+import itertools
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+from datetime import datetime, timezone
+from typing import Optional
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import settings
+
+# Request / job ID attached to every log record; "-" outside any request
+correlation_id: contextvars.ContextVar[str] = contextvars.ContextVar("correlation_id", default="-")
+
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - [%(correlation_id)s] %(message)s"
+
+# Attributes every LogRecord has; anything else was passed via `extra=` and is emitted as a field
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "correlation_id"}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_queue_handler: Optional["DroppingQueueHandler"] = None
+
+
+class CorrelationIdFilter(logging.Filter):
+    """Stamp records with the caller's correlation ID (runs in the calling thread, where the context is set)."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not hasattr(record, "correlation_id"):
+            record.correlation_id = correlation_id.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, correlation_id, message, plus any `extra=` fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "correlation_id": getattr(record, "correlation_id", "-"),
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that never blocks: records that do not fit in the bounded queue are counted and dropped."""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Resolve args and the traceback now (they may not be picklable or stay valid),
+        # but leave formatting to the writer thread
+        record = logging.makeLogRecord(vars(record))
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class LogSampler:
+    """
+    Emit 1 in `every` calls, and only when DEBUG is enabled for the logger.
+
+    Guard per-item log lines with it so the f-string is not even built otherwise:
+
+        if chunk_log_sampler.should_log(logger):
+            logger.debug(f"Created chunk ...")
+    """
+
+    def __init__(self, every: int):
+        self.every = max(1, every)
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+
+    def should_log(self, logger: logging.Logger) -> bool:
+        if not logger.isEnabledFor(logging.DEBUG):
+            return False
+        with self._lock:
+            return next(self._counter) % self.every == 0
+
+
+def _formatter() -> logging.Formatter:
+    if settings.LOG_FORMAT.lower() == "json":
+        return JsonFormatter()
+    return logging.Formatter(TEXT_FORMAT)
+
+
+def _output_handlers() -> list:
+    handlers = [logging.StreamHandler()]
+    if settings.LOG_FILE:
+        handlers.append(logging.FileHandler(settings.LOG_FILE, mode="a", encoding="utf-8"))
+    formatter = _formatter()
+    for handler in handlers:
+        handler.setFormatter(formatter)
+        handler.addFilter(CorrelationIdFilter())
+    return handlers
+
+
+def setup_logging():
+    """
+    Route the root logger through a bounded queue to a background writer thread.
+
+    Idempotent; call once at startup and `shutdown_logging()` on exit to flush.
+    """
+    global _listener, _queue_handler
+    if _listener is not None:
+        return
+
+    root = logging.getLogger()
+    root.setLevel(settings.LOG_LEVEL.upper())
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+
+    _queue_handler = DroppingQueueHandler(queue.Queue(maxsize=max(1, settings.LOG_QUEUE_SIZE)))
+    _queue_handler.addFilter(CorrelationIdFilter())
+    root.addHandler(_queue_handler)
+
+    _listener = logging.handlers.QueueListener(_queue_handler.queue, *_output_handlers(), respect_handler_level=True)
+    _listener.start()
+
+
+def shutdown_logging():
+    """Stop the writer thread after it drains the queue."""
+    global _listener
+    if _listener is None:
+        return
+    if _queue_handler.dropped:
+        logging.getLogger(__name__).warning(f"{_queue_handler.dropped} log records were dropped (queue full)")
+    _listener.stop()
+    for handler in _listener.handlers:
+        handler.close()
+    _listener = None
+    # Nothing reads the queue any more; late records fall back to logging.lastResort
+    logging.getLogger().removeHandler(_queue_handler)
+
+
+def setup_worker_logging(parent_correlation_id: str = "-"):
+    """
+    ProcessPoolExecutor initializer: log directly to stderr under the parent's correlation ID.
+
+    Pool workers have no writer thread of their own, so a queue handler (inherited
+    on fork) would collect records nobody reads. Long-lived pools set the
+    correlation ID per task instead.
+    """
+    correlation_id.set(parent_correlation_id)
+    root = logging.getLogger()
+    root.setLevel(settings.LOG_LEVEL.upper())
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    handler = logging.StreamHandler()
+    handler.setFormatter(_formatter())
+    handler.addFilter(CorrelationIdFilter())
+    root.addHandler(handler)
+
+
+def dropped_records() -> int:
+    return _queue_handler.dropped if _queue_handler is not None else 0
+
+
+# Shared sampler for per-chunk DEBUG logs during ingestion
+chunk_log_sampler = LogSampler(settings.LOG_SAMPLE_EVERY)
@@ -0,0 +1,165 @@
+"""
+Prometheus metrics for each pipeline stage, served on /metrics.
+
+Label children for fixed label values are bound once at import, so the hot path
+is a dict lookup plus Histogram.observe(). Extraction runs in worker processes,
+so page timings travel back with the results and are observed in the parent
+(see RAG.parsing_and_chunking).
+
+With several uvicorn workers each process has its own values, so metrics use
+prometheus_client's multiprocess mode: PROMETHEUS_MULTIPROC_DIR must name an
+empty directory before the workers start (main.py sets it up when API_WORKERS
+> 1), and /metrics aggregates every worker's files (see metrics_registry()).
+"""
+import os
+import shutil
+import time
+from typing import Any, Dict, Iterable, Iterator, TypeVar
+
+from prometheus_client import REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, multiprocess
+
+MULTIPROC_DIR_ENV = "PROMETHEUS_MULTIPROC_DIR"
+
+T = TypeVar("T")
+
+# Sub-millisecond to multi-second stages share one bucket layout
+_LATENCY_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0
+)
+
+# === Ingestion ===
+EXTRACT_SECONDS = Histogram(
+    "knowme_extract_seconds", "Per-page extraction time by step",
+    ["step"], buckets=_LATENCY_BUCKETS
+)
+EXTRACT_STEPS = {step: EXTRACT_SECONDS.labels(step) for step in ("text", "ocr", "tables", "page")}
+EXTRACTED_PAGES = Counter("knowme_extracted_pages_total", "Pages extracted, by method", ["method"])
+
+CHUNKING_SECONDS = Histogram(
+    "knowme_chunking_seconds", "Chunker time per document, excluding time waiting on extraction",
+    buckets=_LATENCY_BUCKETS
+)
+CHUNKS_CREATED = Counter("knowme_chunks_created_total", "Chunks produced by the chunker")
+
+EMBED_BATCH_SECONDS = Histogram(
+    "knowme_embed_batch_seconds", "Embedding model time per encode batch",
+    buckets=_LATENCY_BUCKETS
+)
+EMBEDDED_VECTORS = Counter("knowme_embedded_vectors_total", "Vectors computed by the embedding model")
+EMBEDDING_CACHE_LOOKUPS = Counter("knowme_embedding_cache_lookups_total", "Embedding cache lookups", ["result"])
+
+# === Vector store ===
+VECTOR_STORE_SECONDS = Histogram(
+    "knowme_vector_store_seconds", "Vector store operation latency",
+    ["backend", "operation"], buckets=_LATENCY_BUCKETS
+)
+VECTOR_STORE_POINTS = Counter("knowme_vector_store_upserted_points_total", "Points upserted", ["backend"])
+
+# === Gemini and tools ===
+GEMINI_CALL_SECONDS = Histogram(
+    "knowme_gemini_call_seconds", "Duration of each generate_content attempt",
+    ["outcome"], buckets=_LATENCY_BUCKETS
+)
+GEMINI_CALL_OUTCOMES = {o: GEMINI_CALL_SECONDS.labels(o) for o in ("ok", "rate_limited", "error")}
+GEMINI_ADMISSION_SECONDS = Histogram(
+    "knowme_gemini_admission_wait_seconds", "Time waiting for rate limiter admission",
+    buckets=_LATENCY_BUCKETS
+)
+GEMINI_RETRIES = Counter("knowme_gemini_retries_total", "Gemini calls retried after a rate limit")
+GEMINI_RATE_LIMITED = Counter("knowme_gemini_rate_limited_total", "Gemini 429 / RESOURCE_EXHAUSTED responses")
+GEMINI_TOKENS = Counter("knowme_gemini_tokens_total", "Tokens reported by Gemini usage metadata")
+
+# === Webhook outbox ===
+# Every worker reads the same spool, so the most recent reading is the answer
+WEBHOOK_QUEUE_DEPTH = Gauge(
+    "knowme_webhook_queue_depth", "Webhook events waiting for delivery (shared spool)",
+    multiprocess_mode="mostrecent"
+)
+WEBHOOK_DELIVERY_LAG_SECONDS = Histogram(
+    "knowme_webhook_delivery_lag_seconds", "Time from enqueue to successful delivery, per event",
+    # Retries back off for minutes, so the tail runs far past the request-latency buckets
+    buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0, 3600.0)
+)
+
+# === Chat caches ===
+ANSWER_CACHE_LOOKUPS = Counter("knowme_answer_cache_lookups_total", "Semantic answer cache lookups", ["result"])
+ANSWER_CACHE_RESULTS = {r: ANSWER_CACHE_LOOKUPS.labels(r) for r in ("hit", "miss")}
+ANSWER_CACHE_SKIPPED = Counter(
+    "knowme_answer_cache_skipped_total", "Answers not cached (tool errors, webhooks, no embedding)"
+)
+
+TOOL_SECONDS = Histogram(
+    "knowme_tool_seconds", "Tool execution time by tool and status",
+    ["tool", "status"], buckets=_LATENCY_BUCKETS
+)
+
+
+def prepare_multiprocess_dir(path: str):
+    """Point worker processes at a fresh multiprocess directory; call before they start."""
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path, exist_ok=True)
+    os.environ[MULTIPROC_DIR_ENV] = path
+
+
+def metrics_registry() -> CollectorRegistry:
+    """Registry to scrape: all workers' values in multiprocess mode, else this process's."""
+    if not os.environ.get(MULTIPROC_DIR_ENV):
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+def mark_worker_dead():
+    """Drop this worker's live gauge values at shutdown (multiprocess mode only)."""
+    if os.environ.get(MULTIPROC_DIR_ENV):
+        multiprocess.mark_process_dead(os.getpid())
+
+
+def observe_extract_timings(timings: Dict[str, Any]):
+    """Record one page's step timings (seconds per step) and its "method" (pdfplumber, ocr:plumber, ...)."""
+    for step, child in EXTRACT_STEPS.items():
+        seconds = timings.get(step)
+        if seconds is not None:
+            child.observe(seconds)
+    EXTRACTED_PAGES.labels(timings.get("method") or "empty").inc()
+
+
+class StageTimer:
+    """
+    Time spent inside a generator stage, excluding time spent pulling its input.
+
+    Wrap the stage's input with `input()` and its output with `output()`;
+    `seconds` is then the stage's own processing time.
+    """
+
+    def __init__(self):
+        self._output_seconds = 0.0
+        self._input_seconds = 0.0
+
+    @staticmethod
+    def _timed(items: Iterable[T], add) -> Iterator[T]:
+        iterator = iter(items)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                add(time.perf_counter() - start)
+                return
+            add(time.perf_counter() - start)
+            yield item
+
+    def input(self, items: Iterable[T]) -> Iterator[T]:
+        def add(seconds: float):
+            self._input_seconds += seconds
+        return self._timed(items, add)
+
+    def output(self, items: Iterable[T]) -> Iterator[T]:
+        def add(seconds: float):
+            self._output_seconds += seconds
+        return self._timed(items, add)
+
+    @property
+    def seconds(self) -> float:
+        return max(0.0, self._output_seconds - self._input_seconds)
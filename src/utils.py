@@ -1,5 +1,17 @@
+import os
+import re
 from dataclasses import dataclass
-from typing import List
+from typing import List, Optional
+
+
+def normalize_content(content: str) -> str:
+    """Normalize content for deduplication by removing extra whitespace and converting to lowercase."""
+    return re.sub(r'\s+', ' ', content.strip().lower())
+
+
+def source_name(filename: str) -> str:
+    """The document name stored as `source` in the catalog and chunk payloads: the bare filename."""
+    return os.path.basename(filename.strip())
 
 
 @dataclass
@@ -12,3 +24,33 @@ class PageText:
 @dataclass
 class PdfExtractionResult:
     pages: List[PageText]
+    total_pages: int = 0
+    elapsed_seconds: float = 0.0
+
+    @property
+    def pages_per_second(self) -> float:
+        if self.elapsed_seconds <= 0:
+            return 0.0
+        return self.total_pages / self.elapsed_seconds
+
+
+@dataclass
+class IngestionStats:
+    filename: str
+    user_id: str
+    doc_hash: str = ""
+    skipped: bool = False
+    duplicate_of: Optional[str] = None
+    total_pages: int = 0
+    pages_parsed: int = 0
+    chunks_created: int = 0
+    chunks_embedded: int = 0
+    points_upserted: int = 0
+    embedding_cache_hits: int = 0
+    embedding_cache_misses: int = 0
+    elapsed_seconds: float = 0.0
+
+    @property
+    def embedding_cache_hit_rate(self) -> float:
+        total = self.embedding_cache_hits + self.embedding_cache_misses
+        return self.embedding_cache_hits / total if total else 0.0
@@ -0,0 +1,8 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# config.Settings requires these; tests never call the real services
+for _name in ("GOOGLE_API_KEY", "LLAMAPARSE_API_KEY", "WEATHER_API_KEY", "TAVILY_API_KEY", "WEBHOOK_URL"):
+    os.environ.setdefault(_name, "test")
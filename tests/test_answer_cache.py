@@ -0,0 +1,46 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("pydantic_settings")
+pytest.importorskip("qdrant_client")
+
+from services.answer_cache import SemanticAnswerCache
+
+EMBEDDING = np.ones(4, dtype=np.float32) / 2  # every question embeds identically
+
+
+def _cache() -> SemanticAnswerCache:
+    return SemanticAnswerCache(threshold=0.95, max_entries_per_user=16, ttl_seconds=60, volatile_ttl_seconds=60)
+
+
+def _answer(text: str, tool_calls=()):
+    return {"response": text, "tool_calls": list(tool_calls)}
+
+
+def test_paraphrase_hits():
+    cache = _cache()
+    cache.store("u", "What's in my resume?", EMBEDDING, _answer("resume"), generation=0)
+    assert cache.lookup("u", "summarize my resume", EMBEDDING, generation=0) == _answer("resume")
+
+
+@pytest.mark.parametrize("cached, asked", [
+    ("what was revenue in 2023", "what was revenue in 2024"),
+    ("weather in paris", "weather in london"),
+    ("price of the basic plan", "price of the premium plan"),
+])
+def test_different_content_terms_miss(cached, asked):
+    cache = _cache()
+    cache.store("u", cached, EMBEDDING, _answer("cached"), generation=0)
+    assert cache.lookup("u", asked, EMBEDDING, generation=0) is None
+
+
+def test_failed_web_search_is_not_cached():
+    cache = _cache()
+    failed = {"results": [], "answer": "Error performing search: timeout", "error": "timeout"}
+    cache.store(
+        "u", "latest python release", EMBEDDING,
+        _answer("unknown", [{"tool": "web_search", "args": {"query": "python"}, "result": failed}]),
+        generation=0
+    )
+    assert cache.lookup("u", "latest python release", EMBEDDING, generation=0) is None
+    assert cache.skipped == 1
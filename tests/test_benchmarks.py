@@ -0,0 +1,21 @@
+import pytest
+
+pytest.importorskip("pdfplumber")
+pytest.importorskip("pydantic_settings")
+pytest.importorskip("llama_parse")
+pytest.importorskip("qdrant_client")
+
+from benchmarks.run import bench_chunking
+from benchmarks.synthetic_pdf import write_pdf
+from RAG.parsing_and_chunking import extract
+
+
+def test_bench_chunking_runs_on_a_tiny_pdf(tmp_path):
+    path = str(tmp_path / "tiny.pdf")
+    write_pdf(path, ["text", "text"], seed=1)
+    pages = extract(path, workers=0).pages
+
+    report, chunks = bench_chunking(pages, repeat=1)
+
+    assert report["pages"] == len(pages) > 0
+    assert report["chunks"] == len(chunks) > 0
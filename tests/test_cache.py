@@ -0,0 +1,46 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("pydantic_settings")
+
+from src.cache import IndexGenerations
+
+
+class FakeRegistry:
+    def __init__(self):
+        self.generation = 0
+        self.reads = 0
+
+    def get_generation(self, user_id):
+        self.reads += 1
+        return self.generation
+
+    def bump_generation(self, user_id):
+        self.generation += 1
+        return self.generation
+
+
+def test_generation_reads_are_local_until_ttl_and_follow_local_bumps(monkeypatch):
+    registry = FakeRegistry()
+    generations = IndexGenerations(ttl_seconds=60)
+    monkeypatch.setattr(generations, "_registry", lambda: registry)
+
+    assert asyncio.run(generations.aget("u")) == 0
+    assert asyncio.run(generations.aget("u")) == 0
+    assert registry.reads == 1
+
+    assert generations.bump("u") == 1
+    assert asyncio.run(generations.aget("u")) == 1
+    assert registry.reads == 1
+
+
+def test_bumps_from_other_workers_are_seen_after_ttl(monkeypatch):
+    registry = FakeRegistry()
+    generations = IndexGenerations(ttl_seconds=0.01)
+    monkeypatch.setattr(generations, "_registry", lambda: registry)
+
+    assert generations.get("u") == 0
+    registry.generation = 5  # bumped by another process
+    asyncio.run(asyncio.sleep(0.02))
+    assert generations.get("u") == 5
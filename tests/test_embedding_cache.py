@@ -0,0 +1,30 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from RAG.embedding_cache import EmbeddingCache
+
+
+def _vec(value: float):
+    return np.full(4, value, dtype=np.float32)
+
+
+def test_insert_after_failed_put_fills_hole_without_overwriting(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), "model", dim=4, capacity=8, dtype="float32")
+    cache.put_many({"a": _vec(1), "b": _vec(2), "c": _vec(3)})
+
+    # "a" is rewritten in place, then the bad vector aborts the put; its slot is dropped
+    with pytest.raises(ValueError):
+        cache.put_many({"a": _vec(9), "bad": np.zeros(3, dtype=np.float32)})
+    assert len(cache) == 2
+
+    new = {f"new{i}": _vec(10 + i) for i in range(5)}
+    cache.put_many(new)
+
+    assert len(cache) == 7
+    found = cache.get_many(["b", "c", *new])
+    assert set(found) == {"b", "c", *new}
+    assert np.array_equal(found["b"], _vec(2))
+    assert np.array_equal(found["c"], _vec(3))
+    for key, vector in new.items():
+        assert np.array_equal(found[key], vector)
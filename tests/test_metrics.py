@@ -0,0 +1,30 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+pytest.importorskip("prometheus_client")
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _run(code: str, multiproc_dir: str) -> str:
+    env = dict(os.environ, PROMETHEUS_MULTIPROC_DIR=multiproc_dir)
+    return subprocess.run(
+        [sys.executable, "-c", code], cwd=ROOT, env=env, capture_output=True, text=True, check=True
+    ).stdout
+
+
+def test_metrics_aggregate_across_worker_processes(tmp_path):
+    # Each process stands in for one uvicorn worker
+    for _ in range(2):
+        _run("from src.metrics import ANSWER_CACHE_RESULTS; ANSWER_CACHE_RESULTS['hit'].inc(3)", str(tmp_path))
+
+    output = _run(
+        "from prometheus_client import generate_latest; from src.metrics import metrics_registry; "
+        "print(generate_latest(metrics_registry()).decode())",
+        str(tmp_path)
+    )
+
+    assert 'knowme_answer_cache_lookups_total{result="hit"} 6.0' in output
@@ -0,0 +1,42 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("pydantic_settings")
+pytest.importorskip("qdrant_client")
+
+from config import settings
+from services import rag_service
+
+TEXT = "Quarterly revenue grew in the northern region according to the finance report."
+
+
+def _hit(point_id: str, score: float):
+    return SimpleNamespace(id=point_id, score=score, payload={"text": f"{TEXT} ({point_id})", "source": "r.pdf", "page": 1})
+
+
+class FakeHybridStore:
+    def __init__(self, dense, sparse):
+        self.hit_lists = [dense, sparse]
+
+    async def asupports_sparse(self):
+        return True
+
+    async def asearch_hybrid(self, dense_vector, sparse_vector, search_filter, limit):
+        return self.hit_lists
+
+
+def test_sparse_hit_ranked_first_does_not_reject_strong_dense_hit(monkeypatch):
+    # "a" leads the fused ranking on its BM25 rank but has a weak dense score; "c" is
+    # sparse-only (dense score 0.0); "b" is the strong dense hit
+    store = FakeHybridStore(dense=[_hit("b", 0.91), _hit("a", 0.76)], sparse=[_hit("c", 9.0), _hit("a", 8.0)])
+    monkeypatch.setattr(rag_service, "get_vector_store", lambda: store)
+    monkeypatch.setattr(rag_service, "embed_query", lambda query: [0.0])
+    monkeypatch.setattr(rag_service, "_hybrid_enabled", None)
+    monkeypatch.setattr(settings, "RAG_RETRIEVAL_MODE", "hybrid")
+
+    result = asyncio.run(rag_service._search("how did revenue grow", 5, "u"))
+
+    assert result["results"][0]["text"].endswith("(a)")
+    assert [r["text"][-3:] for r in result["results"]] == ["(a)", "(b)"]
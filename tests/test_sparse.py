@@ -0,0 +1,10 @@
+from RAG.sparse import identifier_terms
+
+
+def test_long_digit_runs_are_identifiers():
+    assert identifier_terms("invoice 20240042") == {"20240042"}
+    assert "4471932" in identifier_terms("show me PO 4471932")
+
+
+def test_years_are_not_identifiers():
+    assert identifier_terms("report for 2024") == set()